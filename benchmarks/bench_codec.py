@@ -0,0 +1,72 @@
+# benchmarks/bench_codec.py
+"""
+JSON 코덱 마이크로 벤치마크
+
+KIS 응답 형태의 페이로드로 도구별 디코딩(KIS 응답) + 인코딩(MCP 결과) 시간을
+표준 라이브러리 경로(json.loads + FastMCP 기본 pydantic 직렬화)와 비교합니다.
+
+    uv run python benchmarks/bench_codec.py
+"""
+import json
+import timeit
+
+import pydantic_core
+
+from kis_mcp_server_adk import server
+
+def price_payload() -> bytes:
+    output = {f"field_{i:02d}": str(70000 + i) for i in range(80)}
+    output.update({"stck_prpr": "71000", "prdy_vrss": "500", "prdy_ctrt": "0.71", "acml_vol": "12345678"})
+    return json.dumps({"rt_cd": "0", "msg_cd": "MCA00000", "msg1": "정상처리 되었습니다.",
+                       "output": output}, ensure_ascii=False).encode()
+
+def balance_payload(holdings: int = 50) -> bytes:
+    output1 = [{
+        "pdno": f"{i:06d}", "prdt_name": f"종목{i}", "trad_dvsn_name": "현금", "bfdy_buy_qty": "0",
+        "bfdy_sll_qty": "0", "thdt_buyqty": "0", "thdt_sll_qty": "0", "hldg_qty": str(10 + i),
+        "ord_psbl_qty": str(10 + i), "pchs_avg_pric": "70000.0000", "pchs_amt": str(700000 * (i + 1)),
+        "prpr": "71000", "evlu_amt": str(710000 * (i + 1)), "evlu_pfls_amt": str(10000 * (i + 1)),
+        "evlu_pfls_rt": "1.43", "evlu_erng_rt": "0.00000000", "loan_dt": "", "loan_amt": "0",
+        "stln_slng_chgs": "0", "expd_dt": "", "fltt_rt": "0.71000000", "bfdy_cprs_icdc": "500",
+        "item_mgna_rt_name": "20%", "grta_rt_name": "", "sbst_pric": "56800", "stck_loan_unpr": "0.0000",
+    } for i in range(holdings)]
+    output2 = [{f"field_{i:02d}": str(1000000 + i) for i in range(25)}]
+    return json.dumps({"ctx_area_fk100": "", "ctx_area_nk100": "", "output1": output1, "output2": output2,
+                       "rt_cd": "0", "msg_cd": "20310000", "msg1": "모의투자 조회가 완료되었습니다."},
+                      ensure_ascii=False).encode()
+
+def history_payload(bars: int = 100) -> bytes:
+    output2 = [{
+        "stck_bsop_date": f"2026{(i % 12) + 1:02d}{(i % 28) + 1:02d}", "stck_clpr": str(70000 + i),
+        "stck_oprc": str(69500 + i), "stck_hgpr": str(71000 + i), "stck_lwpr": str(69000 + i),
+        "acml_vol": str(10000000 + i), "acml_tr_pbmn": str(700000000000 + i), "flng_cls_code": "00",
+        "prtt_rate": "0.00", "mod_yn": "N", "prdy_vrss_sign": "2", "prdy_vrss": "500", "revl_issu_reas": "",
+    } for i in range(bars)]
+    output1 = {f"field_{i:02d}": str(i) for i in range(40)}
+    return json.dumps({"output1": output1, "output2": output2, "rt_cd": "0", "msg_cd": "MCA00000",
+                       "msg1": "정상처리 되었습니다."}, ensure_ascii=False).encode()
+
+def stdlib_round_trip(payload: bytes):
+    return pydantic_core.to_json(json.loads(payload), fallback=str, indent=2).decode()
+
+def codec_round_trip(payload: bytes, schema=None):
+    return server.json_dumps(server.json_loads(payload, schema))
+
+def bench(func, *args, number: int = 2000) -> float:
+    return min(timeit.repeat(lambda: func(*args), number=number, repeat=5)) / number * 1e6
+
+def main():
+    cases = [
+        ("inquery-stock-price", price_payload(), None),
+        ("inquery-balance (50 holdings)", balance_payload(), None),
+        ("inquery-stock-history (100 bars)", history_payload(), server.STOCK_HISTORY_SCHEMA),
+    ]
+    print(f"codec: {server.JSON_CODEC}")
+    print(f"{'tool':<36}{'stdlib (us)':>14}{'codec (us)':>14}{'speedup':>10}")
+    for name, payload, schema in cases:
+        baseline = bench(stdlib_round_trip, payload)
+        fast = bench(codec_round_trip, payload, schema)
+        print(f"{name:<36}{baseline:>14.1f}{fast:>14.1f}{baseline / fast:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
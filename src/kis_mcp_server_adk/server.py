@@ -1,13 +1,37 @@
+import asyncio
+import contextlib
+import functools
+import hashlib
+import hmac
 import json
 import logging
+import math
+import operator
 import os
+import re
+import sqlite3
 import sys
+import threading
+import time
+import uuid
+import zlib
+from base64 import b64decode
+from collections import OrderedDict, deque
 from dotenv import load_dotenv
 from pathlib import Path
 from datetime import datetime, timedelta
+from typing import TypedDict
 
 import httpx
-from mcp.server.fastmcp.server import FastMCP
+import pydantic_core
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import unpad
+from websockets.asyncio.client import connect
+from mcp.server.fastmcp.server import Context, FastMCP
+from mcp.server.lowlevel.server import request_ctx
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
 
 # 로깅 설정: 반드시 stderr로 출력
 logging.basicConfig(
@@ -19,9 +43,346 @@ logging.basicConfig(
 )
 
 logger = logging.getLogger("mcp-server")
+# mcp 내부 DEBUG 로그는 수신 메시지(도구 인자) 전체를 출력하므로 INFO 이상만 기록
+logging.getLogger("mcp").setLevel(logging.INFO)
+
+# JSON 코덱: orjson / msgspec 설치 시 사용, 없으면 표준 json 사용
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _select_json_codec() -> str:
+    requested = os.environ.get("KIS_JSON_CODEC", "").lower()
+    available = [name for name, module in (("msgspec", msgspec), ("orjson", orjson)) if module is not None]
+    if requested in available or requested == "json":
+        return requested
+    return available[0] if available else "json"
+
+JSON_CODEC = _select_json_codec()
+
+def json_loads(data: bytes | str, schema=None):
+    """
+    Decode JSON with the fastest available codec
+    
+    Args:
+        data: JSON document
+        schema: Optional msgspec type to decode into (used only with msgspec)
+    """
+    if JSON_CODEC == "msgspec":
+        return msgspec.json.decode(data, type=schema) if schema is not None else msgspec.json.decode(data)
+    if JSON_CODEC == "orjson":
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _json_default(obj):
+    if msgspec is not None and isinstance(obj, msgspec.Struct):
+        return {k: v for k, v in msgspec.structs.asdict(obj).items() if v is not msgspec.UNSET}
+    return str(obj)
+
+def json_dumps(obj) -> str:
+    """Encode JSON (compact, non-ASCII preserved) with the fastest available codec"""
+    if JSON_CODEC == "msgspec":
+        return msgspec.json.encode(obj, enc_hook=str).decode()
+    if JSON_CODEC == "orjson":
+        return orjson.dumps(obj, default=_json_default).decode()
+    # FastMCP 기본 직렬화와 동일한 pydantic_core 사용 (들여쓰기 없이)
+    return pydantic_core.to_json(obj, fallback=_json_default).decode()
+
+def decode_response(response: httpx.Response, schema=None):
+    """
+    Decode a KIS response body (optionally into a typed msgspec schema)
+    
+    Bodies that do not fit the schema (e.g. a number where a string is
+    expected) are decoded untyped, so the codec never changes the result.
+    """
+    if schema is not None and msgspec is not None:
+        try:
+            return json_loads(response.content, schema)
+        except msgspec.ValidationError:
+            return json_loads(response.content)
+    return json_loads(response.content, schema)
+
+# KIS 응답 스키마 (msgspec 설치 시 __slots__ 기반 Struct로 직접 디코딩)
+# 코덱에 따라 결과가 달라지지 않도록 null은 None으로 유지하고, 누락 필드는 UNSET으로 두어 인코딩 시 생략
+if msgspec is not None:
+    class DailyBar(msgspec.Struct):
+        """Daily bar (output2 of inquire-daily-itemchartprice)"""
+        stck_bsop_date: str | None | msgspec.UnsetType = msgspec.UNSET  # 영업일자
+        stck_clpr: str | None | msgspec.UnsetType = msgspec.UNSET  # 종가
+        stck_oprc: str | None | msgspec.UnsetType = msgspec.UNSET  # 시가
+        stck_hgpr: str | None | msgspec.UnsetType = msgspec.UNSET  # 고가
+        stck_lwpr: str | None | msgspec.UnsetType = msgspec.UNSET  # 저가
+        acml_vol: str | None | msgspec.UnsetType = msgspec.UNSET  # 누적거래량
+        acml_tr_pbmn: str | None | msgspec.UnsetType = msgspec.UNSET  # 누적거래대금
+        flng_cls_code: str | None | msgspec.UnsetType = msgspec.UNSET  # 락구분코드
+        prtt_rate: str | None | msgspec.UnsetType = msgspec.UNSET  # 분할비율
+        mod_yn: str | None | msgspec.UnsetType = msgspec.UNSET  # 분할변경여부
+        prdy_vrss_sign: str | None | msgspec.UnsetType = msgspec.UNSET  # 전일대비부호
+        prdy_vrss: str | None | msgspec.UnsetType = msgspec.UNSET  # 전일대비
+        revl_issu_reas: str | None | msgspec.UnsetType = msgspec.UNSET  # 재평가사유코드
+    
+    class StockHistoryResponse(TypedDict, total=False):
+        rt_cd: str | None
+        msg_cd: str | None
+        msg1: str | None
+        output1: dict | None
+        output2: list[DailyBar] | None
+    
+    STOCK_HISTORY_SCHEMA = StockHistoryResponse
+else:
+    STOCK_HISTORY_SCHEMA = None
+
+# HTTP 응답 압축 (streamable-http) / 대용량 결과 분할 설정
+HTTP_COMPRESSION = os.environ.get("KIS_HTTP_COMPRESSION", "on").lower() not in ("off", "0", "false")
+COMPRESSION_MIN_BYTES = 1024  # 이보다 작은 단일 응답은 압축하지 않음
+LARGE_RESULT_BYTES = int(os.environ.get("KIS_LARGE_RESULT_BYTES", "262144"))  # 이보다 큰 도구 결과는 NDJSON 리소스로 분할 (0: 사용 안 함)
+RESULT_PAGE_BYTES = 65536  # NDJSON 리소스 페이지 크기
+RESULT_STORE_MAX_BYTES = 64 * 1024 * 1024  # 분할 결과 보관 최대 크기
+RESULT_RETENTION_SECONDS = 600.0  # 분할 결과 보관 시간(초)
+RESULT_URI_TEMPLATE = "kis://results/{result_id}/{page}"
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+class StreamCompressor:
+    """Incremental gzip/zstd compressor that flushes every chunk (so SSE events are not held back)"""
+    
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=3).compressobj()
+        else:
+            self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip 헤더
+    
+    def compress(self, data: bytes, final: bool) -> bytes:
+        output = self._compressor.compress(data)
+        if final:
+            return output + self._compressor.flush()
+        if self.encoding == "zstd":
+            return output + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return output + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+def accepted_encoding(accept_encoding: str) -> str | None:
+    """Pick zstd (if zstandard is installed) or gzip from an Accept-Encoding header"""
+    accepted = set()
+    for token in accept_encoding.lower().split(","):
+        name, _, params = token.strip().partition(";")
+        if params.strip().replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(name.strip())
+    if zstandard is not None and "zstd" in accepted:
+        return "zstd"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing HTTP responses with zstd or gzip
+    
+    Streamed responses (SSE from the streamable-http transport) are compressed
+    chunk by chunk with a flush after each chunk, so clients still receive
+    each event as soon as it is sent.
+    """
+    
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = accepted_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        
+        start_message = None
+        compressor = None
+        
+        async def compressed_send(message):
+            nonlocal start_message, compressor
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start_message is not None:
+                headers = MutableHeaders(scope=start_message)
+                skip = ("content-encoding" in headers
+                        or start_message["status"] in (204, 304)
+                        or (not more_body and len(body) < self.minimum_size))
+                if not skip:
+                    compressor = StreamCompressor(encoding)
+                    headers["Content-Encoding"] = encoding
+                    headers.add_vary_header("Accept-Encoding")
+                    if "content-length" in headers:
+                        del headers["content-length"]
+                await send(start_message)
+                start_message = None
+            
+            if compressor is None:
+                await send(message)
+                return
+            await send({
+                "type": "http.response.body",
+                "body": compressor.compress(body, final=not more_body),
+                "more_body": more_body,
+            })
+        
+        await self.app(scope, receive, compressed_send)
+
+class ResultStore:
+    """
+    Bounded store of large tool results split into NDJSON pages
+    
+    The first line of a result holds its small non-list fields ("meta"), the
+    number of rows of each list field ("fields") and the number of entries of
+    each dict field too large for one page ("maps"); every following line is
+    one list row ({"field", "index", "row"}) or dict entry ({"field", "key",
+    "row"}). Only the top level is split, so a single row larger than a page
+    still gets a page of its own. Pages are kept for RESULT_RETENTION_SECONDS,
+    and the oldest results are dropped beyond RESULT_STORE_MAX_BYTES.
+    """
+    
+    def __init__(self, max_bytes: int = RESULT_STORE_MAX_BYTES, retention: float = RESULT_RETENTION_SECONDS,
+                 page_bytes: int = RESULT_PAGE_BYTES):
+        self.max_bytes = max_bytes
+        self.retention = retention
+        self.page_bytes = page_bytes
+        self._results: OrderedDict[str, tuple[float, list[str]]] = OrderedDict()
+        self._bytes = 0
+    
+    def lines(self, result) -> list[str]:
+        """Split a tool result into NDJSON lines"""
+        fields = result if isinstance(result, dict) else {"items": result}
+        rows = {key: value for key, value in fields.items() if isinstance(value, list)}
+        maps = {key: value for key, value in fields.items()
+                if isinstance(value, dict) and len(json_dumps(value)) > self.page_bytes}
+        meta = {key: value for key, value in fields.items() if key not in rows and key not in maps}
+        header = {"meta": meta, "fields": {key: len(value) for key, value in rows.items()}}
+        if maps:
+            header["maps"] = {key: len(value) for key, value in maps.items()}
+        lines = [json_dumps(header)]
+        for key, values in rows.items():
+            lines.extend(json_dumps({"field": key, "index": i, "row": row}) for i, row in enumerate(values))
+        for key, values in maps.items():
+            lines.extend(json_dumps({"field": key, "key": k, "row": row}) for k, row in values.items())
+        return lines
+    
+    def put(self, tool: str, result, size: int) -> dict:
+        """Store a result and return the stub sent to the client in its place"""
+        self._evict()
+        pages = []
+        page = []
+        page_size = 0
+        lines = self.lines(result)
+        for line in lines:
+            if page and page_size + len(line) + 1 > self.page_bytes:
+                pages.append("".join(page))
+                page, page_size = [], 0
+            page.append(line + "\n")
+            page_size += len(line) + 1
+        if page:
+            pages.append("".join(page))
+        
+        result_id = uuid.uuid4().hex
+        self._results[result_id] = (time.monotonic(), pages)
+        self._bytes += sum(len(p) for p in pages)
+        while self._bytes > self.max_bytes and len(self._results) > 1:
+            self._drop(next(iter(self._results)))
+        
+        return {
+            "large_result": True,
+            "tool": tool,
+            "bytes": size,
+            "rows": len(lines) - 1,
+            "pages": len(pages),
+            "uri_template": RESULT_URI_TEMPLATE.replace("{result_id}", result_id),
+            "first_page": RESULT_URI_TEMPLATE.format(result_id=result_id, page=0),
+            "mime_type": "application/x-ndjson",
+            "expires_in": self.retention,
+        }
+    
+    def page(self, result_id: str, page: int) -> str:
+        self._evict()
+        entry = self._results.get(result_id)
+        if entry is None:
+            raise ValueError(f"Unknown or expired result: {result_id}")
+        pages = entry[1]
+        if not 0 <= page < len(pages):
+            raise ValueError(f"Page {page} out of range (result has {len(pages)} pages)")
+        return pages[page]
+    
+    def _drop(self, result_id: str):
+        _, pages = self._results.pop(result_id)
+        self._bytes -= sum(len(p) for p in pages)
+    
+    def _evict(self):
+        now = time.monotonic()
+        while self._results:
+            result_id, (created, _) = next(iter(self._results.items()))
+            if now - created <= self.retention:
+                break
+            self._drop(result_id)
+
+result_store = ResultStore()
+
+class KisMCP(FastMCP):
+    """
+    FastMCP that encodes tool results with the fast JSON codec
+    
+    Results larger than KIS_LARGE_RESULT_BYTES are returned as a stub pointing
+    to paged NDJSON resources, and the streamable-http app compresses responses.
+    """
+    
+    def add_tool(self, fn, *args, **kwargs):
+        # 도구 등록 인자는 그대로 FastMCP에 전달 (버전별 시그니처 차이 대응)
+        name = kwargs.get("name") or (args[0] if args else None)
+        
+        @functools.wraps(fn)
+        async def encoded(*args, **kwargs):
+            result = await fn(*args, **kwargs)
+            if isinstance(result, str):
+                return result
+            text = json_dumps(result)
+            if LARGE_RESULT_BYTES and len(text) > LARGE_RESULT_BYTES:
+                return json_dumps(result_store.put(name or fn.__name__, result, len(text)))
+            return text
+        
+        super().add_tool(encoded, *args, **kwargs)
+    
+    def streamable_http_app(self):
+        app = super().streamable_http_app()
+        session_lifespan = app.router.lifespan_context
+        
+        @contextlib.asynccontextmanager
+        async def lifespan(starlette_app):
+            # 첫 주문보다 먼저 체결통보 구독을 시작해 초기 체결이 누락되지 않도록 함
+            async with session_lifespan(starlette_app):
+                await start_background_services()
+                try:
+                    yield
+                finally:
+                    await stop_background_services()
+        
+        app.router.lifespan_context = lifespan
+        return CompressionMiddleware(app) if HTTP_COMPRESSION else app
 
 # Create MCP instance
-mcp = FastMCP(
+mcp = KisMCP(
     "KIS MCP Server", 
     dependencies=["httpx", "xmltodict"],
     host="0.0.0.0",  # <- 추가
@@ -33,18 +394,22 @@ load_dotenv()
 # Global strings for API endpoints and paths
 DOMAIN = "https://openapi.koreainvestment.com:9443"
 VIRTUAL_DOMAIN = "https://openapivts.koreainvestment.com:29443"  # 모의투자
+WS_DOMAIN = "ws://ops.koreainvestment.com:21000"  # 실시간 웹소켓
+VIRTUAL_WS_DOMAIN = "ws://ops.koreainvestment.com:31000"  # 실시간 웹소켓 (모의투자)
 
 # API paths
 STOCK_PRICE_PATH = "/uapi/domestic-stock/v1/quotations/inquire-price"  # 현재가조회
 BALANCE_PATH = "/uapi/domestic-stock/v1/trading/inquire-balance"  # 잔고조회
 TOKEN_PATH = "/oauth2/tokenP"  # 토큰발급
 HASHKEY_PATH = "/uapi/hashkey"  # 해시키발급
+APPROVAL_PATH = "/oauth2/Approval"  # 웹소켓 접속키발급
 ORDER_PATH = "/uapi/domestic-stock/v1/trading/order-cash"  # 현금주문
 ORDER_LIST_PATH = "/uapi/domestic-stock/v1/trading/inquire-daily-ccld"  # 일별주문체결조회
 ORDER_DETAIL_PATH = "/uapi/domestic-stock/v1/trading/inquire-ccnl"  # 주문체결내역조회
 STOCK_INFO_PATH = "/uapi/domestic-stock/v1/quotations/inquire-daily-price"  # 일별주가조회
 STOCK_HISTORY_PATH = "/uapi/domestic-stock/v1/quotations/inquire-daily-itemchartprice"  # 주식일별주가조회
 STOCK_ASK_PATH = "/uapi/domestic-stock/v1/quotations/inquire-asking-price-exp-ccn"  # 주식호가조회
+MINUTE_CHART_PATH = "/uapi/domestic-stock/v1/quotations/inquire-time-itemchartprice"  # 주식당일분봉조회
 
 # 해외주식 API 경로
 OVERSEAS_STOCK_PRICE_PATH = "/uapi/overseas-price/v1/quotations/price"
@@ -56,6 +421,62 @@ OVERSEAS_ORDER_LIST_PATH = "/uapi/overseas-stock/v1/trading/inquire-daily-ccld"
 CONTENT_TYPE = "application/json"
 AUTH_TYPE = "Bearer"
 
+# 시세 캐시 / 동시 요청 설정
+QUOTE_CACHE_TTL = float(os.environ.get("KIS_QUOTE_CACHE_TTL", "1.0"))  # 현재가 캐시 유효시간(초)
+MAX_CONCURRENT_REQUESTS = int(os.environ.get("KIS_MAX_CONCURRENT_REQUESTS", "5"))  # KIS 동시 요청 수 상한
+MAX_REQUESTS_PER_SECOND = float(os.environ.get(
+    "KIS_MAX_REQUESTS_PER_SECOND",
+    "18" if os.environ.get("KIS_ACCOUNT_TYPE", "REAL").upper() == "REAL" else "2"
+))  # KIS 초당 요청 수 상한
+QUOTE_QUEUE_DEADLINE = float(os.environ.get("KIS_QUOTE_QUEUE_DEADLINE", "5.0"))  # 시세 요청 최대 대기시간(초, 초과 시 폐기)
+MAX_CONTINUATION_PAGES = 20  # 연속조회 최대 페이지 수
+JOB_RETENTION_SECONDS = float(os.environ.get("KIS_JOB_RETENTION_SECONDS", "3600"))  # 완료된 작업 보관 시간(초)
+MAX_EXPORT_PAGES = 200  # 주문내역 내보내기 최대 페이지 수
+SCREEN_CONCURRENCY = max(MAX_CONCURRENT_REQUESTS // 2, 1)  # 스크리닝/일괄 시세 동시 조회 수
+ORDER_BOOK_LEVELS = range(1, 11)  # 호가 단계 (1~10)
+ORDER_BOOK_HISTORY = 32  # 종목별 보관할 호가 스냅샷 버전 수
+LEDGER_RECONCILE_INTERVAL = float(os.environ.get("KIS_LEDGER_RECONCILE_SECONDS", "300"))  # 잔고 원장 재동기화 주기(초)
+NOTICE_SUBSCRIBE_TIMEOUT = 3.0  # 주문 전 체결통보 구독 완료를 기다리는 최대 시간(초)
+HISTORY_SOFT_TTL = float(os.environ.get("KIS_HISTORY_SOFT_TTL", "60"))  # 일별 시세 캐시를 백그라운드로 갱신하기 시작하는 시간(초)
+HISTORY_HARD_TTL = float(os.environ.get("KIS_HISTORY_HARD_TTL", "900"))  # 일별 시세 캐시를 더 이상 사용하지 않는 시간(초)
+CLOSED_HISTORY_TTL = 86400.0  # 오늘이 포함되지 않은(변하지 않는) 일별 시세 캐시 유효시간(초)
+
+# 요청 스케줄러 우선순위 클래스 (숫자가 작을수록 먼저 처리)
+PRIORITY_CLASSES = {
+    "order": 0,    # 주문/취소
+    "account": 1,  # 잔고/체결
+    "quote": 2,    # 시세
+    "bulk": 3,     # 기간별 시세 등 대량조회
+}
+
+# 우선순위 클래스별 동시 요청 수 상한
+SCHEDULER_CLASS_LIMITS = {
+    "order": MAX_CONCURRENT_REQUESTS,
+    "account": max(MAX_CONCURRENT_REQUESTS // 2, 1),
+    "quote": max(MAX_CONCURRENT_REQUESTS // 2, 1),
+    "bulk": max(MAX_CONCURRENT_REQUESTS // 3, 1),
+}
+
+# API 경로별 우선순위 클래스 (미등록 경로는 bulk)
+REQUEST_PRIORITY_CLASSES = {
+    TOKEN_PATH: "order",
+    APPROVAL_PATH: "order",
+    HASHKEY_PATH: "order",
+    ORDER_PATH: "order",
+    OVERSEAS_ORDER_PATH: "order",
+    BALANCE_PATH: "account",
+    ORDER_LIST_PATH: "account",
+    ORDER_DETAIL_PATH: "account",
+    OVERSEAS_BALANCE_PATH: "account",
+    OVERSEAS_ORDER_LIST_PATH: "account",
+    STOCK_PRICE_PATH: "quote",
+    STOCK_ASK_PATH: "quote",
+    OVERSEAS_STOCK_PRICE_PATH: "quote",
+    STOCK_INFO_PATH: "bulk",
+    STOCK_HISTORY_PATH: "bulk",
+    MINUTE_CHART_PATH: "bulk",
+}
+
 # Market codes for overseas stock
 MARKET_CODES = {
     "NASD": "나스닥",
@@ -69,6 +490,32 @@ MARKET_CODES = {
     "VNSE": "베트남 호치민"
 }
 
+# 해외주식 시세조회용 거래소코드 (EXCD)
+PRICE_EXCHANGE_CODES = {
+    "NASD": "NAS",
+    "NYSE": "NYS",
+    "AMEX": "AMS",
+    "SEHK": "HKS",
+    "SHAA": "SHS",
+    "SZAA": "SZS",
+    "TKSE": "TSE",
+    "HASE": "HNX",
+    "VNSE": "HSX"
+}
+
+# 거래소별 거래통화
+MARKET_CURRENCIES = {
+    "NASD": "USD",
+    "NYSE": "USD",
+    "AMEX": "USD",
+    "SEHK": "HKD",
+    "SHAA": "CNY",
+    "SZAA": "CNY",
+    "TKSE": "JPY",
+    "HASE": "VND",
+    "VNSE": "VND"
+}
+
 class TrIdManager:
     """Transaction ID manager for Korea Investment & Securities API"""
     
@@ -83,7 +530,9 @@ class TrIdManager:
         "order_detail": "TTTC8036R",  # 주문체결내역조회
         "stock_info": "FHKST01010400",  # 일별주가조회
         "stock_history": "FHKST03010200",  # 주식일별주가조회
+        "minute_chart": "FHKST03010200",  # 주식당일분봉조회
         "stock_ask": "FHKST01010200",  # 주식호가조회
+        "execution_notice": "H0STCNI0",  # 실시간 체결통보
         
         # 해외주식
         "us_buy": "TTTT1002U",      # 미국 매수 주문
@@ -98,6 +547,9 @@ class TrIdManager:
         "sz_sell": "TTTS0304U",     # 심천 매도 주문
         "vn_buy": "TTTS0311U",      # 베트남 매수 주문
         "vn_sell": "TTTS0310U",     # 베트남 매도 주문
+        "overseas_price": "HHDFS00000300",  # 해외주식 현재가
+        "overseas_balance": "TTTS3012R",    # 해외주식 잔고
+        "overseas_order_list": "TTTS3035R", # 해외주식 주문체결내역
     }
     
     # 모의계좌용 TR_ID
@@ -111,7 +563,9 @@ class TrIdManager:
         "order_detail": "VTTC8036R",  # 주문체결내역조회
         "stock_info": "FHKST01010400",  # 일별주가조회
         "stock_history": "FHKST03010200",  # 주식일별주가조회
+        "minute_chart": "FHKST03010200",  # 주식당일분봉조회
         "stock_ask": "FHKST01010200",  # 주식호가조회
+        "execution_notice": "H0STCNI9",  # 실시간 체결통보
         
         # 해외주식
         "us_buy": "VTTT1002U",      # 미국 매수 주문
@@ -126,6 +580,9 @@ class TrIdManager:
         "sz_sell": "VTTS0304U",     # 심천 매도 주문
         "vn_buy": "VTTS0311U",      # 베트남 매수 주문
         "vn_sell": "VTTS0310U",     # 베트남 매도 주문
+        "overseas_price": "HHDFS00000300",  # 해외주식 현재가
+        "overseas_balance": "VTTS3012R",    # 해외주식 잔고
+        "overseas_order_list": "VTTS3035R", # 해외주식 주문체결내역
     }
     
     @classmethod
@@ -161,17 +618,333 @@ class TrIdManager:
             return DOMAIN if is_real_account else VIRTUAL_DOMAIN
             
         # 조회 API는 실전/모의 동일한 도메인 사용
-        if operation in ["price", "stock_info", "stock_history", "stock_ask"]:
+        if operation in ["price", "stock_info", "stock_history", "stock_ask", "minute_chart"]:
             return DOMAIN
             
         # 거래 API는 계좌 타입에 따라 다른 도메인 사용
         return DOMAIN if is_real_account else VIRTUAL_DOMAIN
 
+# 공유 캐시 설정 (memory: 프로세스 내 / sqlite: 같은 호스트의 모든 프로세스가 공유)
+CACHE_BACKEND = os.environ.get("KIS_CACHE_BACKEND", "memory").lower()
+CACHE_PATH = Path(os.environ.get("KIS_CACHE_PATH", Path(__file__).resolve().parent / "cache.sqlite3"))
+CACHE_MAX_ENTRIES = int(os.environ.get("KIS_CACHE_MAX_ENTRIES", "10000"))  # 최대 캐시 항목 수
+CACHE_LOCK_TIMEOUT = 10.0  # 프로세스 간 조회 잠금 유효시간(초)
+CACHE_BUSY_TIMEOUT = 0.05  # sqlite 잠금 대기 시간(초), 이벤트 루프를 막지 않도록 짧게 유지
+CACHE_STATS_PUBLISH_INTERVAL = 10.0  # 적중률 통계 공유 주기(초)
+QUOTE_CACHE_RETENTION = 60.0  # 현재가 캐시 보관 시간(초)
+TOKEN_TTL = timedelta(hours=23)  # 접근토큰 유효시간
+
+class MemoryCacheBackend:
+    """In-process cache backend (LRU eviction, TTL expiry)"""
+    
+    shared = False
+    
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple[str, str], tuple[object, float, float]] = OrderedDict()
+    
+    def get(self, namespace: str, key: str) -> tuple[object, float] | None:
+        entry = self._entries.get((namespace, key))
+        if entry is None:
+            return None
+        value, stored_at, expires_at = entry
+        if time.time() > expires_at:
+            del self._entries[(namespace, key)]
+            return None
+        self._entries.move_to_end((namespace, key))
+        return value, stored_at
+    
+    def set(self, namespace: str, key: str, value, ttl: float):
+        now = time.time()
+        self._entries[(namespace, key)] = (value, now, now + ttl)
+        self._entries.move_to_end((namespace, key))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def delete(self, namespace: str, key: str):
+        self._entries.pop((namespace, key), None)
+    
+    def acquire_lock(self, namespace: str, key: str, ttl: float) -> bool:
+        # 프로세스 내 병합은 SharedCache가 처리
+        return True
+    
+    def release_lock(self, namespace: str, key: str):
+        pass
+    
+    def publish_stats(self, stats: dict):
+        pass
+    
+    def collect_stats(self) -> dict:
+        return {}
+
+class SQLiteCacheBackend:
+    """
+    SQLite (WAL mode) cache backend shared by all server processes on one host
+    
+    Values are stored as JSON. Fetch locks coalesce upstream calls across
+    processes, and each process publishes its hit/miss counters.
+    """
+    
+    shared = True
+    
+    def __init__(self, path: Path, max_entries: int = CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._writes = 0
+        self._conn = sqlite3.connect(path, timeout=CACHE_BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS cache (
+                namespace TEXT, key TEXT, value TEXT, stored_at REAL, expires_at REAL,
+                PRIMARY KEY (namespace, key)
+            );
+            CREATE INDEX IF NOT EXISTS cache_stored_at ON cache (stored_at);
+            CREATE TABLE IF NOT EXISTS locks (
+                namespace TEXT, key TEXT, expires_at REAL, PRIMARY KEY (namespace, key)
+            );
+            CREATE TABLE IF NOT EXISTS stats (
+                pid INTEGER, namespace TEXT, hits INTEGER, misses INTEGER, coalesced INTEGER,
+                updated_at REAL, PRIMARY KEY (pid, namespace)
+            );
+        """)
+    
+    def get(self, namespace: str, key: str) -> tuple[object, float] | None:
+        row = self._conn.execute(
+            "SELECT value, stored_at FROM cache WHERE namespace = ? AND key = ? AND expires_at > ?",
+            (namespace, key, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        return json_loads(row[0]), row[1]
+    
+    def set(self, namespace: str, key: str, value, ttl: float):
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)",
+            (namespace, key, json_dumps(value), now, now + ttl)
+        )
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self.evict()
+    
+    def delete(self, namespace: str, key: str):
+        self._conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key))
+    
+    def evict(self):
+        """Remove expired entries and the oldest entries beyond max_entries"""
+        now = time.time()
+        self._conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+        self._conn.execute("DELETE FROM locks WHERE expires_at <= ?", (now,))
+        self._conn.execute(
+            "DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+    
+    def acquire_lock(self, namespace: str, key: str, ttl: float) -> bool:
+        now = time.time()
+        self._conn.execute(
+            "DELETE FROM locks WHERE namespace = ? AND key = ? AND expires_at <= ?", (namespace, key, now)
+        )
+        cursor = self._conn.execute(
+            "INSERT OR IGNORE INTO locks VALUES (?, ?, ?)", (namespace, key, now + ttl)
+        )
+        return cursor.rowcount == 1
+    
+    def release_lock(self, namespace: str, key: str):
+        self._conn.execute("DELETE FROM locks WHERE namespace = ? AND key = ?", (namespace, key))
+    
+    def publish_stats(self, stats: dict):
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO stats VALUES (?, ?, ?, ?, ?, ?)",
+            [(os.getpid(), namespace, s["hits"], s["misses"], s["coalesced"], now) for namespace, s in stats.items()]
+        )
+    
+    def collect_stats(self) -> dict:
+        rows = self._conn.execute(
+            "SELECT namespace, SUM(hits), SUM(misses), SUM(coalesced), COUNT(DISTINCT pid) FROM stats GROUP BY namespace"
+        ).fetchall()
+        return {
+            namespace: {"hits": hits, "misses": misses, "coalesced": coalesced, "processes": processes}
+            for namespace, hits, misses, coalesced, processes in rows
+        }
+
+class SharedCache:
+    """
+    Cache front-end used by the token, quote and bar caches
+    
+    Adds max-age checks, in-process and cross-process fetch coalescing and
+    hit-rate statistics on top of a pluggable backend.
+    """
+    
+    def __init__(self, backend):
+        self.backend = backend
+        self._inflight: dict[tuple[str, str], asyncio.Task] = {}
+        self._stats: dict[str, dict[str, int]] = {}
+        self._published_at = 0.0
+    
+    def _backend_call(self, operation: str, namespace: str, key: str, method, *args, default=None):
+        """Call a backend method; backend errors (e.g. "database is locked") are logged, never raised"""
+        try:
+            return method(*args)
+        except Exception as e:
+            logger.warning(f"Cache {operation} failed ({namespace}/{key}): {e}")
+            return default
+    
+    def _count(self, namespace: str, field: str):
+        stats = self._stats.setdefault(namespace, {"hits": 0, "misses": 0, "coalesced": 0, "revalidated": 0})
+        stats[field] += 1
+        if self.backend.shared and time.monotonic() - self._published_at > CACHE_STATS_PUBLISH_INTERVAL:
+            self._published_at = time.monotonic()
+            self._backend_call("stats publish", namespace, "*", self.backend.publish_stats, self._stats)
+    
+    def get_entry(self, namespace: str, key: str, max_age: float) -> tuple[object, float] | None:
+        """Get (value, age in seconds) if the cached value is younger than max_age"""
+        entry = self._backend_call("read", namespace, key, self.backend.get, namespace, key)
+        if entry is not None:
+            age = max(time.time() - entry[1], 0.0)
+            if age <= max_age:
+                self._count(namespace, "hits")
+                return entry[0], age
+        self._count(namespace, "misses")
+        return None
+    
+    def get(self, namespace: str, key: str, max_age: float):
+        """Get the cached value if younger than max_age, else None"""
+        entry = self.get_entry(namespace, key, max_age)
+        return entry[0] if entry is not None else None
+    
+    def set(self, namespace: str, key: str, value, ttl: float):
+        self._backend_call("write", namespace, key, self.backend.set, namespace, key, value, ttl)
+    
+    def delete(self, namespace: str, key: str):
+        self._backend_call("delete", namespace, key, self.backend.delete, namespace, key)
+    
+    async def get_or_fetch(self, namespace: str, key: str, max_age: float, fetch, ttl: float | None = None):
+        """
+        Get a cached value or fetch it once for all concurrent callers
+        
+        Args:
+            namespace: Cache namespace (e.g. "quote")
+            key: Cache key
+            max_age: Maximum acceptable age in seconds
+            fetch: Zero-argument coroutine function producing the value
+            ttl: Retention of the fetched value (defaults to max_age)
+        """
+        value = self.get(namespace, key, max_age)
+        if value is not None:
+            return value
+        
+        task = self._inflight.get((namespace, key))
+        if task is None:
+            task = asyncio.create_task(self._fetch(namespace, key, max_age, fetch, ttl or max_age))
+            self._inflight[(namespace, key)] = task
+            task.add_done_callback(lambda _: self._inflight.pop((namespace, key), None))
+        else:
+            self._count(namespace, "coalesced")
+        return await asyncio.shield(task)
+    
+    async def get_or_revalidate(self, namespace: str, key: str, soft_ttl: float, hard_ttl: float,
+                                fetch) -> tuple[object, float, str]:
+        """
+        Stale-while-revalidate lookup
+        
+        Values younger than soft_ttl are returned as is. Values between soft_ttl
+        and hard_ttl are returned immediately while a single background refresh
+        runs, and callers only wait for upstream once the value is older than
+        hard_ttl (or missing). fetch must not depend on the caller's client,
+        since a background refresh outlives the call that triggered it.
+        
+        Returns:
+            tuple: (value, age in seconds, "fresh" | "stale" | "fetched")
+        """
+        entry = self.get_entry(namespace, key, hard_ttl)
+        if entry is not None:
+            value, age = entry
+            if age <= soft_ttl:
+                return value, age, "fresh"
+            if (namespace, key) not in self._inflight:
+                self._count(namespace, "revalidated")
+                task = asyncio.create_task(self._fetch(namespace, key, soft_ttl, fetch, hard_ttl))
+                self._inflight[(namespace, key)] = task
+                task.add_done_callback(functools.partial(self._revalidated, namespace, key))
+            return value, age, "stale"
+        
+        value = await self.get_or_fetch(namespace, key, hard_ttl, fetch, hard_ttl)
+        return value, 0.0, "fetched"
+    
+    def _revalidated(self, namespace: str, key: str, task: asyncio.Task):
+        self._inflight.pop((namespace, key), None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Background refresh failed ({namespace}/{key}): {task.exception()}")
+    
+    def _acquire_lock(self, namespace: str, key: str) -> bool | None:
+        """True if acquired, False if held by another process, None if the backend failed"""
+        return self._backend_call("lock", namespace, key, self.backend.acquire_lock,
+                                  namespace, key, CACHE_LOCK_TIMEOUT)
+    
+    async def _fetch(self, namespace: str, key: str, max_age: float, fetch, ttl: float):
+        acquired = self._acquire_lock(namespace, key)
+        if acquired is False:
+            # 다른 프로세스가 조회 중이면 결과가 저장될 때까지 대기
+            deadline = time.monotonic() + CACHE_LOCK_TIMEOUT
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+                entry = self._backend_call("read", namespace, key, self.backend.get, namespace, key)
+                if entry is not None and time.time() - entry[1] <= max_age:
+                    self._count(namespace, "coalesced")
+                    return entry[0]
+                acquired = self._acquire_lock(namespace, key)
+                if acquired is not False:
+                    break
+        try:
+            value = await fetch()
+            self.set(namespace, key, value, ttl)
+            return value
+        finally:
+            # 대기 시간이 지나 잠금 없이 조회한 경우 다른 프로세스의 잠금은 해제하지 않음
+            if acquired:
+                self._backend_call("unlock", namespace, key, self.backend.release_lock, namespace, key)
+    
+    def stats(self) -> dict:
+        """Hit-rate statistics of this process (and of all processes for shared backends)"""
+        def with_rate(stats: dict) -> dict:
+            lookups = stats["hits"] + stats["misses"]
+            return {**stats, "hit_rate": round(stats["hits"] / lookups, 4) if lookups else 0.0}
+        
+        result = {
+            "backend": type(self.backend).__name__,
+            "process": {namespace: with_rate(s) for namespace, s in self._stats.items()},
+        }
+        if self.backend.shared:
+            self._backend_call("stats publish", "*", "*", self.backend.publish_stats, self._stats)
+            self._published_at = time.monotonic()
+            collected = self._backend_call("stats read", "*", "*", self.backend.collect_stats, default={})
+            result["all_processes"] = {namespace: with_rate(s) for namespace, s in collected.items()}
+        return result
+
+def create_cache_backend():
+    """Create the cache backend selected by KIS_CACHE_BACKEND (memory | sqlite)"""
+    if CACHE_BACKEND == "sqlite":
+        try:
+            return SQLiteCacheBackend(CACHE_PATH)
+        except sqlite3.Error as e:
+            logger.error(f"SQLite cache unavailable ({CACHE_PATH}): {e}, falling back to memory cache")
+    return MemoryCacheBackend()
+
+shared_cache = SharedCache(create_cache_backend())
+
 # Token storage
 TOKEN_FILE = Path(__file__).resolve().parent / "token.json"
 
 def load_token():
-    """Load token from file if it exists and is not expired"""
+    """Load token from the shared cache or file if it exists and is not expired"""
+    cached = shared_cache.get("token", "access_token", TOKEN_TTL.total_seconds())
+    if cached:
+        expires_at = datetime.fromisoformat(cached["expires_at"])
+        if datetime.now() < expires_at:
+            return cached["token"], expires_at
     if TOKEN_FILE.exists():
         try:
             with open(TOKEN_FILE, 'r') as f:
@@ -184,7 +957,12 @@ def load_token():
     return None, None
 
 def save_token(token: str, expires_at: datetime):
-    """Save token to file"""
+    """Save token to the shared cache and file"""
+    shared_cache.set(
+        "token", "access_token",
+        {"token": token, "expires_at": expires_at.isoformat()},
+        max((expires_at - datetime.now()).total_seconds(), 0)
+    )
     try:
         with open(TOKEN_FILE, 'w') as f:
             json.dump({
@@ -196,13 +974,27 @@ def save_token(token: str, expires_at: datetime):
 
 async def get_access_token(client: httpx.AsyncClient) -> str:
     """
-    Get access token with file-based caching
+    Get access token with shared cache / file-based caching
     Returns cached token if valid, otherwise requests new token
+    (concurrent requests across processes share one issuance, which runs on
+    its own client so it survives the caller that started it)
     """
     token, expires_at = load_token()
     if token and expires_at and datetime.now() < expires_at:
         return token
     
+    async def issue():
+        # 공유된 발급은 먼저 요청한 도구보다 오래 살 수 있으므로 별도 클라이언트 사용
+        async with kis_client() as own_client:
+            return await issue_access_token(own_client)
+    
+    issued = await shared_cache.get_or_fetch(
+        "token", "access_token", TOKEN_TTL.total_seconds(), issue
+    )
+    return issued["token"]
+
+async def issue_access_token(client: httpx.AsyncClient) -> dict:
+    """Request a new access token and save it"""
     token_response = await client.post(
         f"{DOMAIN}{TOKEN_PATH}",
         headers={"content-type": CONTENT_TYPE},
@@ -216,13 +1008,13 @@ async def get_access_token(client: httpx.AsyncClient) -> str:
     if token_response.status_code != 200:
         raise Exception(f"Failed to get token: {token_response.text}")
     
-    token_data = token_response.json()
+    token_data = decode_response(token_response)
     token = token_data["access_token"]
     
-    expires_at = datetime.now() + timedelta(hours=23)
+    expires_at = datetime.now() + TOKEN_TTL
     save_token(token, expires_at)
     
-    return token
+    return {"token": token, "expires_at": expires_at.isoformat()}
 
 async def get_hashkey(client: httpx.AsyncClient, token: str, body: dict) -> str:
     """
@@ -250,107 +1042,2236 @@ async def get_hashkey(client: httpx.AsyncClient, token: str, body: dict) -> str:
     if response.status_code != 200:
         raise Exception(f"Failed to get hash key: {response.text}")
     
-    return response.json()["HASH"]
+    return decode_response(response)["HASH"]
 
-@mcp.tool(
-    name="inquery-stock-price",
-    description="Get current stock price information from Korea Investment & Securities",
-)
-async def inquery_stock_price(symbol: str):
+class SchedulerDeadlineExceeded(Exception):
+    """Raised when a queued request passes its deadline before being dispatched"""
+
+class RequestScheduler:
     """
-    Get current stock price information from Korea Investment & Securities
+    Priority-aware scheduler for outbound KIS requests
     
-    Args:
-        symbol: Stock symbol (e.g. "005930" for Samsung Electronics)
-        
-    Returns:
-        Dictionary containing stock price information including:
-        - stck_prpr: Current price
-        - prdy_vrss: Change from previous day
-        - prdy_vrss_sign: Change direction (+/-)
-        - prdy_ctrt: Change rate (%)
-        - acml_vol: Accumulated volume
-        - acml_tr_pbmn: Accumulated trade value
-        - hts_kor_isnm: Stock name in Korean
-        - stck_mxpr: High price of the day
-        - stck_llam: Low price of the day
-        - stck_oprc: Opening price
-        - stck_prdy_clpr: Previous day's closing price
+    Requests are dispatched by priority class (order > account > quote > bulk)
+    under a global concurrency cap, per-class concurrency caps and a global
+    request rate. Within a class, MCP sessions are served round-robin.
+    Requests still queued after their deadline are dropped.
     """
-    async with httpx.AsyncClient() as client:
-        token = await get_access_token(client)
-        response = await client.get(
-            f"{TrIdManager.get_domain('price')}{STOCK_PRICE_PATH}",
-            headers={
-                "content-type": CONTENT_TYPE,
-                "authorization": f"{AUTH_TYPE} {token}",
-                "appkey": os.environ["KIS_APP_KEY"],
-                "appsecret": os.environ["KIS_APP_SECRET"],
-                "tr_id": TrIdManager.get_tr_id("price")
-            },
-            params={
-                "fid_cond_mrkt_div_code": "J",
-                "fid_input_iscd": symbol
+    
+    def __init__(self, max_concurrency: int = MAX_CONCURRENT_REQUESTS,
+                 class_limits: dict[str, int] | None = None,
+                 requests_per_second: float = MAX_REQUESTS_PER_SECOND,
+                 reserved_order_slots: int = 1):
+        self.max_concurrency = max_concurrency
+        self.class_limits = class_limits or SCHEDULER_CLASS_LIMITS
+        self.min_interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self.reserved_order_slots = reserved_order_slots
+        # class -> {session -> deque[(future, deadline)]}
+        self._queues: dict[str, dict[object, deque]] = {name: {} for name in PRIORITY_CLASSES}
+        self._running: dict[str, int] = {name: 0 for name in PRIORITY_CLASSES}
+        self._dropped: dict[str, int] = {name: 0 for name in PRIORITY_CLASSES}
+        self._next_dispatch = 0.0
+        self._wakeup: asyncio.TimerHandle | None = None
+    
+    @property
+    def running(self) -> int:
+        return sum(self._running.values())
+    
+    def _has_capacity(self, priority_class: str) -> bool:
+        if self._running[priority_class] >= self.class_limits.get(priority_class, self.max_concurrency):
+            return False
+        # 시세/대량조회는 주문용 예약 슬롯을 사용하지 않음
+        limit = self.max_concurrency
+        if PRIORITY_CLASSES[priority_class] >= PRIORITY_CLASSES["quote"]:
+            limit -= self.reserved_order_slots
+        return self.running < limit
+    
+    def _pop_next(self, priority_class: str):
+        sessions = self._queues[priority_class]
+        session, waiters = next(iter(sessions.items()))
+        waiter = waiters.popleft()
+        # 라운드로빈: 처리한 세션을 맨 뒤로 이동
+        del sessions[session]
+        if waiters:
+            sessions[session] = waiters
+        return waiter
+    
+    def _peek_next(self, priority_class: str):
+        waiters = next(iter(self._queues[priority_class].values()))
+        return waiters[0]
+    
+    def _dispatch(self):
+        self._wakeup = None
+        loop = asyncio.get_running_loop()
+        for priority_class in sorted(PRIORITY_CLASSES, key=PRIORITY_CLASSES.get):
+            while self._queues[priority_class] and self._has_capacity(priority_class):
+                future, deadline = self._peek_next(priority_class)
+                now = loop.time()
+                if future.done():
+                    self._pop_next(priority_class)
+                    continue
+                if deadline is not None and now > deadline:
+                    self._pop_next(priority_class)
+                    self._dropped[priority_class] += 1
+                    future.set_exception(SchedulerDeadlineExceeded(
+                        f"{priority_class} request dropped after waiting past its deadline"
+                    ))
+                    continue
+                if now < self._next_dispatch:
+                    # 초당 요청 수 제한: 다음 허용 시각에 다시 디스패치
+                    self._wakeup = loop.call_at(self._next_dispatch, self._dispatch)
+                    return
+                self._pop_next(priority_class)
+                self._next_dispatch = now + self.min_interval
+                self._running[priority_class] += 1
+                future.set_result(None)
+    
+    async def acquire(self, priority_class: str, deadline: float | None = None, session: object = None):
+        """Wait for a dispatch slot in the given priority class"""
+        future = asyncio.get_running_loop().create_future()
+        self._queues[priority_class].setdefault(session, deque()).append((future, deadline))
+        if self._wakeup is None:
+            self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self.release(priority_class)
+            raise
+    
+    def release(self, priority_class: str):
+        """Release a dispatch slot and wake queued requests"""
+        self._running[priority_class] -= 1
+        if self._wakeup is None:
+            self._dispatch()
+    
+    def stats(self) -> dict:
+        """Queue depth, running and dropped counts per priority class"""
+        return {
+            name: {
+                "queued": sum(len(waiters) for waiters in self._queues[name].values()),
+                "running": self._running[name],
+                "dropped": self._dropped[name],
             }
+            for name in PRIORITY_CLASSES
+        }
+
+def current_session_key() -> object:
+    """Identify the MCP session of the current request (for fair queuing)"""
+    try:
+        return id(request_ctx.get().session)
+    except LookupError:
+        return None
+
+def request_priority_class(request: httpx.Request) -> str:
+    """Map a KIS request to its scheduler priority class"""
+    return request.extensions.get("kis_priority") or REQUEST_PRIORITY_CLASSES.get(request.url.path, "bulk")
+
+class ScheduledTransport(httpx.AsyncBaseTransport):
+    """httpx transport dispatching every KIS request through the RequestScheduler"""
+    
+    def __init__(self, scheduler: RequestScheduler, transport: httpx.AsyncBaseTransport | None = None):
+        self.scheduler = scheduler
+        self.transport = transport or httpx.AsyncHTTPTransport()
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        priority_class = request_priority_class(request)
+        deadline = None
+        if priority_class == "quote" and QUOTE_QUEUE_DEADLINE > 0:
+            deadline = asyncio.get_running_loop().time() + QUOTE_QUEUE_DEADLINE
+        await self.scheduler.acquire(priority_class, deadline, current_session_key())
+        try:
+            response = await self.transport.handle_async_request(request)
+            await response.aread()
+            return response
+        finally:
+            self.scheduler.release(priority_class)
+    
+    async def aclose(self):
+        await self.transport.aclose()
+
+# 요청 기록/재생 설정 (live: 실제 호출 / record: 호출하면서 기록 / replay: 기록된 응답만 사용)
+TRANSPORT_MODE = os.environ.get("KIS_TRANSPORT_MODE", "live").lower()
+ARCHIVE_PATH = Path(os.environ.get("KIS_ARCHIVE_PATH", Path(__file__).resolve().parent / "kis_archive"))
+REPLAY_TIMING = os.environ.get("KIS_REPLAY_TIMING", "original").lower()  # original: 기록된 요청 간격과 응답시간 재현 / fast: 즉시 응답
+ARCHIVE_SECRET_FIELDS = ("appkey", "appsecret", "secretkey")  # 요청 키 계산에서 제외할 인증 필드
+
+class ReplayMiss(Exception):
+    """Raised when replay mode has no recorded response for a request"""
+
+class TransportArchive:
+    """
+    Compact on-disk archive of KIS request/response pairs
+    
+    Responses are appended zlib-compressed to ``responses.bin`` and indexed by
+    request key in ``index.jsonl`` (one line per record with offset, length and
+    timing), so replay only loads the small index and reads bodies on demand.
+    Identical requests (e.g. repeated quotes) are replayed in recorded order and
+    the last response is reused once they run out.
+    """
+    
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.data_path = self.path / "responses.bin"
+        self.index_path = self.path / "index.jsonl"
+        self._index: dict[str, list[dict]] = {}
+        self._cursors: dict[str, int] = {}
+        self._replay_started: float | None = None
+        last_at = 0.0
+        if self.index_path.exists():
+            with open(self.index_path, "r") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._index.setdefault(entry["key"], []).append(entry)
+                        last_at = max(last_at, entry.get("at", 0.0))
+        # 이어서 기록하는 경우에도 요청 시각(at)이 단조 증가하도록 기존 마지막 시각에서 시작
+        self._started = time.monotonic() - last_at
+    
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._index.values())
+    
+    @staticmethod
+    def request_key(request: httpx.Request) -> str:
+        """Stable key of a request: method, path, sorted params, tr_id/tr_cont and body (credentials excluded)"""
+        body = request.content
+        if body:
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                payload = None
+            if isinstance(payload, dict):
+                body = json.dumps(
+                    {k: v for k, v in payload.items() if k not in ARCHIVE_SECRET_FIELDS}, sort_keys=True
+                ).encode()
+        parts = [
+            request.method,
+            request.url.path,
+            "&".join(f"{k}={v}" for k, v in sorted(request.url.params.multi_items())),
+            request.headers.get("tr_id", ""),
+            request.headers.get("tr_cont", ""),
+            hashlib.sha256(body).hexdigest() if body else "",
+        ]
+        return hashlib.sha256("\n".join(parts).encode()).hexdigest()[:32]
+    
+    def record(self, request: httpx.Request, response: httpx.Response, elapsed: float):
+        """Append a response to the archive"""
+        meta = json.dumps({
+            "status": response.status_code,
+            "headers": [[k, v] for k, v in response.headers.multi_items()
+                        if k.lower() not in ("content-encoding", "content-length", "transfer-encoding")],
+        }).encode()
+        blob = zlib.compress(len(meta).to_bytes(4, "big") + meta + response.content)
+        
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self.data_path, "ab") as f:
+            offset = f.seek(0, os.SEEK_END)
+            f.write(blob)
+        entry = {
+            "key": self.request_key(request),
+            "method": request.method,
+            "path": request.url.path,
+            "tr_id": request.headers.get("tr_id", ""),
+            "offset": offset,
+            "length": len(blob),
+            "at": round(time.monotonic() - self._started, 6),  # 기록 시작 후 요청 시각(초)
+            "elapsed": round(elapsed, 6),  # 응답 소요 시간(초)
+        }
+        with open(self.index_path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        self._index.setdefault(entry["key"], []).append(entry)
+    
+    def lookup(self, request: httpx.Request) -> tuple[dict, httpx.Response]:
+        """Return (index entry, recorded response) for a request"""
+        key = self.request_key(request)
+        entries = self._index.get(key)
+        if not entries:
+            raise ReplayMiss(f"No recorded response for {request.method} {request.url.path} "
+                             f"(tr_id={request.headers.get('tr_id', '')})")
+        position = self._cursors.get(key, 0)
+        self._cursors[key] = position + 1
+        entry = entries[min(position, len(entries) - 1)]
+        
+        with open(self.data_path, "rb") as f:
+            f.seek(entry["offset"])
+            blob = zlib.decompress(f.read(entry["length"]))
+        meta_length = int.from_bytes(blob[:4], "big")
+        meta = json.loads(blob[4:4 + meta_length])
+        response = httpx.Response(
+            meta["status"],
+            headers=meta["headers"],
+            content=blob[4 + meta_length:],
+            request=request,
         )
+        return entry, response
+    
+    def replay_delay(self, entry: dict) -> float:
+        """
+        Seconds to wait before releasing a replayed response
         
-        if response.status_code != 200:
-            raise Exception(f"Failed to get stock price: {response.text}")
+        Reproduces the recorded request inter-arrival times ("at", aligned to
+        the first replayed request) plus the recorded response latency. A
+        request arriving later than recorded still waits its recorded latency.
+        """
+        now = time.monotonic()
+        at = entry.get("at", 0.0)
+        if self._replay_started is None:
+            self._replay_started = now - at
+        return max(entry["elapsed"], self._replay_started + at + entry["elapsed"] - now)
+
+class RecordReplayTransport(httpx.AsyncBaseTransport):
+    """httpx transport recording KIS responses to, or replaying them from, a TransportArchive"""
+    
+    def __init__(self, archive: TransportArchive, mode: str = "record", timing: str = "original",
+                 transport: httpx.AsyncBaseTransport | None = None):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unsupported transport mode: {mode}")
+        self.archive = archive
+        self.mode = mode
+        self.timing = timing
+        self.transport = transport or (httpx.AsyncHTTPTransport() if mode == "record" else None)
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if self.mode == "replay":
+            entry, response = self.archive.lookup(request)
+            if self.timing == "original":
+                delay = self.archive.replay_delay(entry)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            return response
         
-        return response.json()["output"]
+        started = time.monotonic()
+        response = await self.transport.handle_async_request(request)
+        await response.aread()
+        self.archive.record(request, response, time.monotonic() - started)
+        return response
+    
+    async def aclose(self):
+        if self.transport is not None:
+            await self.transport.aclose()
 
-@mcp.tool(
-    name="inquery-balance",
-    description="Get current stock balance information from Korea Investment & Securities",
-)
-async def inquery_balance():
+transport_archive = TransportArchive(ARCHIVE_PATH) if TRANSPORT_MODE in ("record", "replay") else None
+
+request_scheduler = RequestScheduler()
+
+def kis_client() -> httpx.AsyncClient:
     """
-    Get current stock balance information from Korea Investment & Securities
+    Create an httpx client whose requests go through the request scheduler
+    
+    In record/replay mode (KIS_TRANSPORT_MODE) the scheduler sits on top of the
+    record/replay transport. Fast replay bypasses the scheduler so recorded
+    sessions run without rate pacing.
+    """
+    if transport_archive is None:
+        return httpx.AsyncClient(transport=ScheduledTransport(request_scheduler))
+    transport = RecordReplayTransport(transport_archive, TRANSPORT_MODE, REPLAY_TIMING)
+    if TRANSPORT_MODE == "replay" and REPLAY_TIMING == "fast":
+        return httpx.AsyncClient(transport=transport)
+    return httpx.AsyncClient(transport=ScheduledTransport(request_scheduler, transport))
+
+async def gather_limited(func, items, limit: int = SCREEN_CONCURRENCY) -> list:
+    """
+    Run func(item) for every item with at most limit calls in flight
     
+    Batch quotes issued inside one tool would otherwise all queue in the
+    scheduler at once and be dropped past KIS_QUOTE_QUEUE_DEADLINE.
+    
+    Args:
+        func: Coroutine function taking one item
+        items: Items to process
+        limit: Maximum number of concurrent calls
+        
     Returns:
-        Dictionary containing stock balance information including:
-        - pdno: Stock code
-        - prdt_name: Stock name
-        - hldg_qty: Holding quantity
-        - pchs_amt: Purchase amount
-        - prpr: Current price
-        - evlu_amt: Evaluation amount
-        - evlu_pfls_amt: Evaluation profit/loss amount
-        - evlu_pfls_rt: Evaluation profit/loss rate
-    """
-    async with httpx.AsyncClient() as client:
-        token = await get_access_token(client)
-        logger.info(f"TrIdManager.get_tr_id('balance'): {TrIdManager.get_tr_id('balance')}")
-        # Prepare request data
-        request_data = {
-            "CANO": os.environ["KIS_CANO"],  # 계좌번호
-            "ACNT_PRDT_CD": "01",  # 계좌상품코드 (기본값: 01)
-            "AFHR_FLPR_YN": "N",  # 시간외단일가여부
-            "INQR_DVSN": "01",  # 조회구분
-            "UNPR_DVSN": "01",  # 단가구분
-            "FUND_STTL_ICLD_YN": "N",  # 펀드결제분포함여부
-            "FNCG_AMT_AUTO_RDPT_YN": "N",  # 융자금액자동상환여부
-            "PRCS_DVSN": "00",  # 처리구분
-            "CTX_AREA_FK100": "",  # 연속조회검색조건100
-            "CTX_AREA_NK100": "",  # 연속조회키100
-            "OFL_YN": ""  # 오프라인여부
-        }
-        response = await client.get(
-            f"{TrIdManager.get_domain('balance')}{BALANCE_PATH}",
-            headers={
-                "content-type": CONTENT_TYPE,
-                "authorization": f"{AUTH_TYPE} {token}",
-                "appkey": os.environ["KIS_APP_KEY"],
-                "appsecret": os.environ["KIS_APP_SECRET"],
-                "tr_id": TrIdManager.get_tr_id("balance")
-            },
-            params=request_data
-        )
+        list: Results in item order (exceptions are returned, not raised)
+    """
+    semaphore = asyncio.Semaphore(limit)
+    
+    async def run(item):
+        async with semaphore:
+            return await func(item)
+    
+    return await asyncio.gather(*(run(item) for item in items), return_exceptions=True)
+
+def to_number(value, default=0):
+    """Convert KIS numeric string (e.g. "1234", "-1.50") to int or float"""
+    if value in (None, ""):
+        return default
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return default
+    return int(number) if number.is_integer() else number
+
+async def fetch_stock_price(client: httpx.AsyncClient, token: str, symbol: str) -> dict:
+    """
+    Fetch current stock price from KIS
+    
+    Args:
+        client: httpx client
+        token: Access token
+        symbol: Stock symbol (e.g. "005930")
+        
+    Returns:
+        dict: 'output' block of the inquire-price response
+    """
+    response = await client.get(
+        f"{TrIdManager.get_domain('price')}{STOCK_PRICE_PATH}",
+        headers={
+            "content-type": CONTENT_TYPE,
+            "authorization": f"{AUTH_TYPE} {token}",
+            "appkey": os.environ["KIS_APP_KEY"],
+            "appsecret": os.environ["KIS_APP_SECRET"],
+            "tr_id": TrIdManager.get_tr_id("price")
+        },
+        params={
+            "fid_cond_mrkt_div_code": "J",
+            "fid_input_iscd": symbol
+        }
+    )
+    
+    if response.status_code != 200:
+        raise Exception(f"Failed to get stock price: {response.text}")
+    
+    return decode_response(response)["output"]
+
+async def get_cached_stock_price(symbol: str, max_age: float = QUOTE_CACHE_TTL) -> dict:
+    """
+    Get current stock price, reusing a cached quote younger than max_age seconds
+    
+    Concurrent requests for the same symbol (across processes with the
+    sqlite cache backend) share a single upstream call.
+    
+    Args:
+        symbol: Stock symbol (e.g. "005930")
+        max_age: Maximum acceptable quote age in seconds
+        
+    Returns:
+        dict: 'output' block of the inquire-price response
+    """
+    async def fetch():
+        # 공유된 조회는 먼저 요청한 도구보다 오래 살 수 있으므로 별도 클라이언트 사용
+        async with kis_client() as client:
+            token = await get_access_token(client)
+            return await fetch_stock_price(client, token, symbol)
+    
+    return await shared_cache.get_or_fetch(
+        "quote", symbol, max_age, fetch, max(QUOTE_CACHE_TTL, QUOTE_CACHE_RETENTION)
+    )
+
+# 스크리닝 조건식: "<필드> <연산자> <숫자>" (예: "prdy_ctrt > 3")
+SCREEN_FILTER_PATTERN = re.compile(r"^\s*([a-z_0-9]+)\s*(>=|<=|==|!=|>|<)\s*(-?\d+(?:\.\d+)?)\s*$")
+SCREEN_OPERATORS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+SCREEN_RESULT_FIELDS = ["stck_prpr", "prdy_vrss", "prdy_ctrt", "acml_vol", "acml_tr_pbmn"]
+
+def parse_screen_filters(filters: list[str]) -> list[tuple[str, str, float]]:
+    """
+    Parse filter expressions over quote fields
+    
+    Args:
+        filters: Expressions like "prdy_ctrt > 3" or "acml_vol >= 1000000"
+        
+    Returns:
+        list: (field, operator, value) tuples
+    """
+    parsed = []
+    for expression in filters:
+        match = SCREEN_FILTER_PATTERN.match(expression.lower())
+        if not match:
+            raise ValueError(f"Invalid filter expression: {expression!r} (expected e.g. 'prdy_ctrt > 3')")
+        field, op, value = match.groups()
+        parsed.append((field, op, float(value)))
+    return parsed
+
+def load_universe(name: str) -> list[str]:
+    """Load a named symbol universe from KIS_UNIVERSE_FILE ({"KOSPI200": ["005930", ...]})"""
+    path = os.environ.get("KIS_UNIVERSE_FILE")
+    universes = {}
+    if path and Path(path).exists():
+        with open(path, 'r', encoding='utf-8') as f:
+            universes = {key.upper(): value for key, value in json.load(f).items()}
+    if name.upper() not in universes:
+        available = ", ".join(sorted(universes)) or "none (set KIS_UNIVERSE_FILE)"
+        raise ValueError(f"Unknown universe: {name}. Available universes: {available}")
+    return universes[name.upper()]
+
+def compact_order_book(symbol: str, data: dict) -> dict:
+    """
+    Convert an inquire-asking-price response into the compact array layout
+    
+    Args:
+        symbol: Stock symbol
+        data: inquire-asking-price-exp-ccn response body
+        
+    Returns:
+        dict: symbol, time, ask/bid {"prices": [...], "qtys": [...]} (level 1 first),
+        total_ask_qty, total_bid_qty and the expected-execution block
+    """
+    book = data.get("output1") or {}
+    expected = data.get("output2") or {}
+    return {
+        "symbol": symbol,
+        "time": book.get("aspr_acpt_hour", ""),
+        "ask": {
+            "prices": [to_number(book.get(f"askp{level}")) for level in ORDER_BOOK_LEVELS],
+            "qtys": [to_number(book.get(f"askp_rsqn{level}")) for level in ORDER_BOOK_LEVELS],
+        },
+        "bid": {
+            "prices": [to_number(book.get(f"bidp{level}")) for level in ORDER_BOOK_LEVELS],
+            "qtys": [to_number(book.get(f"bidp_rsqn{level}")) for level in ORDER_BOOK_LEVELS],
+        },
+        "total_ask_qty": to_number(book.get("total_askp_rsqn")),
+        "total_bid_qty": to_number(book.get("total_bidp_rsqn")),
+        "expected": {key: to_number(value, value) for key, value in expected.items()},
+    }
+
+class OrderBookStore:
+    """Versioned order book snapshots per symbol for delta polling"""
+    
+    def __init__(self, history: int = ORDER_BOOK_HISTORY):
+        self.history = history
+        self._seq = 0
+        self._books: dict[str, deque] = {}
+    
+    def update(self, snapshot: dict) -> int:
+        """Store a snapshot, returning its sequence number (unchanged books keep their seq)"""
+        versions = self._books.setdefault(snapshot["symbol"], deque(maxlen=self.history))
+        if versions and self._book_part(versions[-1][1]) == self._book_part(snapshot):
+            return versions[-1][0]
+        self._seq += 1
+        versions.append((self._seq, snapshot))
+        return self._seq
+    
+    @staticmethod
+    def _book_part(snapshot: dict) -> dict:
+        # 호가 접수시각만 바뀐 경우는 변경으로 보지 않음
+        return {key: value for key, value in snapshot.items() if key != "time"}
+    
+    def snapshot(self, symbol: str) -> dict:
+        """Latest snapshot with its seq"""
+        seq, snapshot = self._books[symbol][-1]
+        return {"seq": seq, "full": True, **snapshot}
+    
+    def delta(self, symbol: str, since_seq: int) -> dict:
+        """
+        Changes between the snapshot at since_seq and the latest snapshot
+        
+        Falls back to the full snapshot when since_seq is no longer retained.
+        
+        Returns:
+            dict: seq, base_seq, full=False and only the changed parts:
+            ask/bid as [[level, price, qty], ...], totals and expected fields
+        """
+        versions = self._books[symbol]
+        seq, latest = versions[-1]
+        base = next((snapshot for version, snapshot in versions if version == since_seq), None)
+        if base is None:
+            return self.snapshot(symbol)
+        
+        delta = {"symbol": symbol, "seq": seq, "base_seq": since_seq, "full": False, "time": latest["time"]}
+        for side in ("ask", "bid"):
+            changes = [
+                [level, price, qty]
+                for level, price, qty, old_price, old_qty in zip(
+                    ORDER_BOOK_LEVELS, latest[side]["prices"], latest[side]["qtys"],
+                    base[side]["prices"], base[side]["qtys"]
+                )
+                if price != old_price or qty != old_qty
+            ]
+            if changes:
+                delta[side] = changes
+        for key in ("total_ask_qty", "total_bid_qty"):
+            if latest[key] != base[key]:
+                delta[key] = latest[key]
+        expected = {key: value for key, value in latest["expected"].items() if base["expected"].get(key) != value}
+        if expected:
+            delta["expected"] = expected
+        return delta
+
+order_book_store = OrderBookStore()
+
+# 해외주식 종목 -> 거래소 캐시 (파일에 영구 저장)
+EXCHANGE_CACHE_FILE = Path(__file__).resolve().parent / "exchange_cache.json"
+_exchange_cache: dict[str, str] | None = None
+
+def load_exchange_cache() -> dict[str, str]:
+    """Load the symbol -> exchange cache from file"""
+    global _exchange_cache
+    if _exchange_cache is None:
+        _exchange_cache = {}
+        if EXCHANGE_CACHE_FILE.exists():
+            try:
+                with open(EXCHANGE_CACHE_FILE, 'r') as f:
+                    _exchange_cache = json.load(f)
+            except Exception as e:
+                print(f"Error loading exchange cache: {e}", file=sys.stderr)
+    return _exchange_cache
+
+def save_exchange(symbol: str, market: str):
+    """Remember the exchange of a symbol and persist the cache"""
+    cache = load_exchange_cache()
+    if cache.get(symbol) == market:
+        return
+    cache[symbol] = market
+    try:
+        with open(EXCHANGE_CACHE_FILE, 'w') as f:
+            json.dump(cache, f)
+    except Exception as e:
+        print(f"Error saving exchange cache: {e}", file=sys.stderr)
+
+def normalize_market(market: str) -> str:
+    """Normalize a market code to the trading code used in MARKET_CODES (e.g. "NAS" -> "NASD")"""
+    market = market.upper()
+    if market in MARKET_CODES:
+        return market
+    for trading_code, price_code in PRICE_EXCHANGE_CODES.items():
+        if market == price_code:
+            return trading_code
+    raise ValueError(f"Unsupported market: {market}. Supported markets: {', '.join(MARKET_CODES.keys())}")
+
+def exchange_candidates(symbol: str) -> list[str]:
+    """Candidate exchanges for a symbol (numeric codes: Asia, tickers: US/Vietnam)"""
+    if symbol.isdigit():
+        return ["SEHK", "SHAA", "SZAA", "TKSE"]
+    return ["NASD", "NYSE", "AMEX", "HASE", "VNSE"]
+
+async def fetch_overseas_price(client: httpx.AsyncClient, token: str, symbol: str, market: str) -> dict:
+    """
+    Fetch overseas stock price on one exchange
+    
+    Args:
+        client: httpx client
+        token: Access token
+        symbol: Stock symbol (e.g. "AAPL")
+        market: Market code (e.g. "NASD")
+        
+    Returns:
+        dict: overseas price response body
+    """
+    response = await client.get(
+        f"{TrIdManager.get_domain('overseas_price')}{OVERSEAS_STOCK_PRICE_PATH}",
+        headers={
+            "content-type": CONTENT_TYPE,
+            "authorization": f"{AUTH_TYPE} {token}",
+            "appkey": os.environ["KIS_APP_KEY"],
+            "appsecret": os.environ["KIS_APP_SECRET"],
+            "tr_id": TrIdManager.get_tr_id("overseas_price")
+        },
+        params={
+            "AUTH": "",
+            "EXCD": PRICE_EXCHANGE_CODES[market],
+            "SYMB": symbol
+        }
+    )
+    
+    if response.status_code != 200:
+        raise Exception(f"Failed to get overseas stock price: {response.text}")
+    
+    return decode_response(response)
+
+def is_listed(data: dict) -> bool:
+    """Whether an overseas price response contains a quote (unlisted symbols return empty fields)"""
+    return (data.get("output") or {}).get("last") not in (None, "")
+
+async def resolve_overseas_price(client: httpx.AsyncClient, token: str, symbol: str,
+                                 market: str = "", probe_limit: int = SCREEN_CONCURRENCY) -> tuple[str, dict]:
+    """
+    Fetch overseas price, resolving the exchange when market is not given
+    
+    Cached exchanges are tried first. Otherwise the candidate exchanges are
+    probed (at most probe_limit at a time) and the first listing (in
+    candidate order) is remembered in the persistent symbol -> exchange cache.
+    
+    Returns:
+        tuple: (market code, price response body)
+    """
+    symbol = symbol.upper()
+    if market:
+        market = normalize_market(market)
+        return market, await fetch_overseas_price(client, token, symbol, market)
+    
+    cached_market = load_exchange_cache().get(symbol)
+    if cached_market:
+        data = await fetch_overseas_price(client, token, symbol, cached_market)
+        if is_listed(data):
+            return cached_market, data
+    
+    candidates = [m for m in exchange_candidates(symbol) if m != cached_market]
+    results = await gather_limited(lambda m: fetch_overseas_price(client, token, symbol, m), candidates, probe_limit)
+    for candidate, data in zip(candidates, results):
+        if not isinstance(data, BaseException) and is_listed(data):
+            save_exchange(symbol, candidate)
+            return candidate, data
+    
+    errors = [str(data) for data in results if isinstance(data, BaseException)]
+    raise Exception(f"Could not resolve exchange for {symbol} (tried {', '.join(candidates)})"
+                    + (f": {errors[0]}" if errors else ""))
+
+def overseas_markets(markets: list[str] | None) -> list[str]:
+    """Markets to fan out to (real accounts query all US exchanges through NASD)"""
+    if markets:
+        return list(dict.fromkeys(normalize_market(m) for m in markets))
+    is_real_account = os.environ.get("KIS_ACCOUNT_TYPE", "REAL").upper() == "REAL"
+    if is_real_account:
+        return [m for m in MARKET_CODES if m not in ("NYSE", "AMEX")]
+    return list(MARKET_CODES)
+
+async def fetch_overseas_pages(client: httpx.AsyncClient, token: str, path: str, operation: str,
+                               request_data: dict) -> tuple[list[dict], list]:
+    """
+    Fetch an overseas trading inquiry across all continuation pages
+    
+    Args:
+        client: httpx client
+        token: Access token
+        path: API path
+        operation: TrIdManager operation name
+        request_data: Query parameters (CTX_AREA_FK200 / CTX_AREA_NK200 are filled in)
+        
+    Returns:
+        tuple: (output1 rows of every page, output2 of every page)
+    """
+    rows = []
+    summaries = []
+    ctx_area_fk200 = ""
+    ctx_area_nk200 = ""
+    tr_cont = ""
+    
+    for _ in range(MAX_CONTINUATION_PAGES):
+        response = await client.get(
+            f"{TrIdManager.get_domain(operation)}{path}",
+            headers={
+                "content-type": CONTENT_TYPE,
+                "authorization": f"{AUTH_TYPE} {token}",
+                "appkey": os.environ["KIS_APP_KEY"],
+                "appsecret": os.environ["KIS_APP_SECRET"],
+                "tr_id": TrIdManager.get_tr_id(operation),
+                "tr_cont": tr_cont
+            },
+            params={**request_data, "CTX_AREA_FK200": ctx_area_fk200, "CTX_AREA_NK200": ctx_area_nk200}
+        )
+        
+        if response.status_code != 200:
+            raise Exception(f"Failed to get {operation}: {response.text}")
+        
+        data = decode_response(response)
+        if data.get("rt_cd") not in (None, "0"):
+            raise Exception(f"Failed to get {operation}: {data.get('msg1')}")
+        rows.extend(data.get("output1") or [])
+        if data.get("output2"):
+            summaries.append(data["output2"])
+        
+        if response.headers.get("tr_cont") not in ("F", "M"):
+            break
+        ctx_area_fk200 = data.get("ctx_area_fk200", "").strip()
+        ctx_area_nk200 = data.get("ctx_area_nk200", "").strip()
+        tr_cont = "N"
+    else:
+        logger.warning(f"{operation} continuation stopped after {MAX_CONTINUATION_PAGES} pages")
+    
+    return rows, summaries
+
+async def fetch_balance_pages(client: httpx.AsyncClient, token: str) -> tuple[list[dict], dict]:
+    """
+    Fetch stock balance across all continuation pages
+    
+    Args:
+        client: httpx client
+        token: Access token
+        
+    Returns:
+        tuple: (holdings from every page's output1, account summary from output2)
+    """
+    holdings = []
+    summary = {}
+    ctx_area_fk100 = ""
+    ctx_area_nk100 = ""
+    tr_cont = ""
+    
+    for _ in range(MAX_CONTINUATION_PAGES):
+        request_data = {
+            "CANO": os.environ["KIS_CANO"],  # 계좌번호
+            "ACNT_PRDT_CD": "01",  # 계좌상품코드 (기본값: 01)
+            "AFHR_FLPR_YN": "N",  # 시간외단일가여부
+            "INQR_DVSN": "01",  # 조회구분
+            "UNPR_DVSN": "01",  # 단가구분
+            "FUND_STTL_ICLD_YN": "N",  # 펀드결제분포함여부
+            "FNCG_AMT_AUTO_RDPT_YN": "N",  # 융자금액자동상환여부
+            "PRCS_DVSN": "00",  # 처리구분
+            "CTX_AREA_FK100": ctx_area_fk100,  # 연속조회검색조건100
+            "CTX_AREA_NK100": ctx_area_nk100,  # 연속조회키100
+            "OFL_YN": ""  # 오프라인여부
+        }
+        response = await client.get(
+            f"{TrIdManager.get_domain('balance')}{BALANCE_PATH}",
+            headers={
+                "content-type": CONTENT_TYPE,
+                "authorization": f"{AUTH_TYPE} {token}",
+                "appkey": os.environ["KIS_APP_KEY"],
+                "appsecret": os.environ["KIS_APP_SECRET"],
+                "tr_id": TrIdManager.get_tr_id("balance"),
+                "tr_cont": tr_cont
+            },
+            params=request_data
+        )
+        
+        if response.status_code != 200:
+            raise Exception(f"Failed to get balance: {response.text}")
+        
+        data = decode_response(response)
+        # 오류 응답(호출 제한 등)으로 빈 잔고가 원장에 반영되지 않도록 예외 처리
+        if data.get("rt_cd") not in (None, "0"):
+            raise Exception(f"Failed to get balance: {data.get('msg1')}")
+        holdings.extend(data.get("output1") or [])
+        if data.get("output2"):
+            summary = data["output2"][0]
+        
+        # 응답 헤더 tr_cont가 F/M이면 다음 페이지 존재
+        if response.headers.get("tr_cont") not in ("F", "M"):
+            break
+        ctx_area_fk100 = data.get("ctx_area_fk100", "").strip()
+        ctx_area_nk100 = data.get("ctx_area_nk100", "").strip()
+        tr_cont = "N"
+    else:
+        logger.warning(f"Balance continuation stopped after {MAX_CONTINUATION_PAGES} pages")
+    
+    return holdings, summary
+
+async def fetch_order_list_page(client: httpx.AsyncClient, token: str, start_date: str, end_date: str,
+                                ctx_area_fk100: str = "", ctx_area_nk100: str = "",
+                                tr_cont: str = "", priority: str | None = None) -> tuple[dict, bool]:
+    """
+    Fetch one page of the daily order list
+    
+    Args:
+        client: httpx client
+        token: Access token
+        start_date: Start date (YYYYMMDD)
+        end_date: End date (YYYYMMDD)
+        ctx_area_fk100: Continuation search condition from the previous page
+        ctx_area_nk100: Continuation key from the previous page
+        tr_cont: "N" when requesting a continuation page
+        priority: Scheduler priority class overriding the path default (e.g. "bulk")
+        
+    Returns:
+        tuple: (response body, whether a next page exists)
+    """
+    request_data = {
+        "CANO": os.environ["KIS_CANO"],  # 계좌번호
+        "ACNT_PRDT_CD": "01",  # 계좌상품코드
+        "INQR_STRT_DT": start_date,  # 조회시작일자
+        "INQR_END_DT": end_date,  # 조회종료일자
+        "SLL_BUY_DVSN_CD": "00",  # 매도매수구분
+        "INQR_DVSN": "00",  # 조회구분
+        "PDNO": "",  # 종목코드
+        "CCLD_DVSN": "00",  # 체결구분
+        "ORD_GNO_BRNO": "",  # 주문채번지점번호
+        "ODNO": "",  # 주문번호
+        "INQR_DVSN_3": "00",  # 조회구분3
+        "INQR_DVSN_1": "",  # 조회구분1
+        "CTX_AREA_FK100": ctx_area_fk100,  # 연속조회검색조건100
+        "CTX_AREA_NK100": ctx_area_nk100,  # 연속조회키100
+    }
+    
+    response = await client.get(
+        f"{TrIdManager.get_domain('order_list')}{ORDER_LIST_PATH}",
+        headers={
+            "content-type": CONTENT_TYPE,
+            "authorization": f"{AUTH_TYPE} {token}",
+            "appkey": os.environ["KIS_APP_KEY"],
+            "appsecret": os.environ["KIS_APP_SECRET"],
+            "tr_id": TrIdManager.get_tr_id("order_list"),
+            "tr_cont": tr_cont
+        },
+        params=request_data,
+        extensions={"kis_priority": priority} if priority else None
+    )
+    
+    if response.status_code != 200:
+        raise Exception(f"Failed to get order list: {response.text}")
+    
+    data = decode_response(response)
+    if data.get("rt_cd") not in (None, "0"):
+        raise Exception(f"Failed to get order list: {data.get('msg1')}")
+    return data, response.headers.get("tr_cont") in ("F", "M")
+
+async def fetch_filled_quantities(client: httpx.AsyncClient, token: str) -> dict[str, int]:
+    """
+    Fetch today's cumulative filled quantity per order
+    
+    Args:
+        client: httpx client
+        token: Access token
+        
+    Returns:
+        dict: Normalized order number (ODNO) -> total filled quantity
+    """
+    today = datetime.now().strftime("%Y%m%d")
+    filled = {}
+    ctx_area_fk100 = ""
+    ctx_area_nk100 = ""
+    tr_cont = ""
+    for _ in range(MAX_CONTINUATION_PAGES):
+        data, has_next = await fetch_order_list_page(client, token, today, today,
+                                                     ctx_area_fk100, ctx_area_nk100, tr_cont)
+        for row in data.get("output1") or []:
+            quantity = to_number(row.get("tot_ccld_qty"))
+            if row.get("odno") and quantity:
+                filled[normalize_order_no(row["odno"])] = quantity
+        if not has_next:
+            break
+        ctx_area_fk100 = data.get("ctx_area_fk100", "").strip()
+        ctx_area_nk100 = data.get("ctx_area_nk100", "").strip()
+        tr_cont = "N"
+    return filled
+
+async def fetch_stock_history(client: httpx.AsyncClient, token: str, symbol: str,
+                              start_date: str, end_date: str, priority: str | None = None) -> dict:
+    """
+    Fetch daily stock price history
+    
+    Args:
+        client: httpx client
+        token: Access token
+        symbol: Stock symbol (e.g. "005930")
+        start_date: Start date (YYYYMMDD)
+        end_date: End date (YYYYMMDD)
+        priority: Scheduler priority class overriding the path default (e.g. "bulk")
+        
+    Returns:
+        dict: inquire-daily-itemchartprice response body
+    """
+    request_data = {
+        "FID_COND_MRKT_DIV_CODE": "J",  # 시장구분
+        "FID_INPUT_ISCD": symbol,  # 종목코드
+        "FID_INPUT_DATE_1": start_date,  # 시작일자
+        "FID_INPUT_DATE_2": end_date,  # 종료일자
+        "FID_PERIOD_DIV_CODE": "D",  # 기간분류코드
+        "FID_ORG_ADJ_PRC": "0",  # 수정주가원구분
+    }
+    
+    response = await client.get(
+        f"{TrIdManager.get_domain('stock_history')}{STOCK_HISTORY_PATH}",
+        headers={
+            "content-type": CONTENT_TYPE,
+            "authorization": f"{AUTH_TYPE} {token}",
+            "appkey": os.environ["KIS_APP_KEY"],
+            "appsecret": os.environ["KIS_APP_SECRET"],
+            "tr_id": TrIdManager.get_tr_id("stock_history")
+        },
+        params=request_data,
+        extensions={"kis_priority": priority} if priority else None
+    )
+    
+    if response.status_code != 200:
+        raise Exception(f"Failed to get stock history: {response.text}")
+    
+    data = decode_response(response, STOCK_HISTORY_SCHEMA)
+    # 오류 응답(잘못된 종목, 호출 제한 등)은 캐시되지 않도록 예외 처리
+    if data.get("rt_cd") not in (None, "0"):
+        raise Exception(f"Failed to get stock history: {data.get('msg1')}")
+    return data
+
+async def fetch_stock_info(client: httpx.AsyncClient, token: str, symbol: str,
+                           start_date: str, end_date: str) -> dict:
+    """
+    Fetch daily stock price information
+    
+    Args:
+        client: httpx client
+        token: Access token
+        symbol: Stock symbol (e.g. "005930")
+        start_date: Start date (YYYYMMDD)
+        end_date: End date (YYYYMMDD)
+        
+    Returns:
+        dict: inquire-daily-price response body
+    """
+    request_data = {
+        "FID_COND_MRKT_DIV_CODE": "J",  # 시장구분
+        "FID_INPUT_ISCD": symbol,  # 종목코드
+        "FID_INPUT_DATE_1": start_date,  # 시작일자
+        "FID_INPUT_DATE_2": end_date,  # 종료일자
+        "FID_PERIOD_DIV_CODE": "D",  # 기간분류코드
+        "FID_ORG_ADJ_PRC": "0",  # 수정주가원구분
+    }
+    
+    response = await client.get(
+        f"{TrIdManager.get_domain('stock_info')}{STOCK_INFO_PATH}",
+        headers={
+            "content-type": CONTENT_TYPE,
+            "authorization": f"{AUTH_TYPE} {token}",
+            "appkey": os.environ["KIS_APP_KEY"],
+            "appsecret": os.environ["KIS_APP_SECRET"],
+            "tr_id": TrIdManager.get_tr_id("stock_info")
+        },
+        params=request_data
+    )
+    
+    if response.status_code != 200:
+        raise Exception(f"Failed to get stock info: {response.text}")
+    
+    data = decode_response(response)
+    if data.get("rt_cd") not in (None, "0"):
+        raise Exception(f"Failed to get stock info: {data.get('msg1')}")
+    return data
+
+def daily_price_ttls(end_date: str) -> tuple[float, float]:
+    """(soft, hard) cache TTL of a daily price range; ranges ending before today never change"""
+    if end_date < datetime.now().strftime("%Y%m%d"):
+        return CLOSED_HISTORY_TTL, CLOSED_HISTORY_TTL
+    return HISTORY_SOFT_TTL, max(HISTORY_HARD_TTL, HISTORY_SOFT_TTL)
+
+async def get_daily_prices(namespace: str, fetch, symbol: str, start_date: str, end_date: str) -> dict:
+    """
+    Get daily prices with stale-while-revalidate caching
+    
+    Args:
+        namespace: Cache namespace ("stock_info" or "stock_history")
+        fetch: fetch_stock_info or fetch_stock_history
+        symbol: Stock symbol (e.g. "005930")
+        start_date: Start date (YYYYMMDD)
+        end_date: End date (YYYYMMDD)
+        
+    Returns:
+        dict: response body with cache {age, status}
+    """
+    async def refresh():
+        # 백그라운드 갱신은 호출한 도구보다 오래 살 수 있으므로 별도 클라이언트 사용
+        async with kis_client() as client:
+            token = await get_access_token(client)
+            return await fetch(client, token, symbol, start_date, end_date)
+    
+    soft_ttl, hard_ttl = daily_price_ttls(end_date)
+    value, age, status = await shared_cache.get_or_revalidate(
+        namespace, f"{symbol}:{start_date}:{end_date}", soft_ttl, hard_ttl, refresh
+    )
+    return {**value, "cache": {"age": round(age, 3), "status": status}}
+
+# 분봉 조회 설정
+MINUTE_BAR_INTERVALS = (1, 5, 30)  # 지원하는 분봉 주기(분)
+MARKET_OPEN_HOUR = "090000"  # 정규장 시작
+MARKET_CLOSE_HOUR = "153000"  # 정규장 종료
+MINUTE_BAR_CACHE_TTL = 86400.0  # 종목/일자별 분봉 캐시 보관 시간(초)
+minute_bar_locks: dict[str, asyncio.Lock] = {}
+
+def is_hhmmss(value: str) -> bool:
+    """Whether value is a valid 6-digit HHMMSS time"""
+    if not re.fullmatch(r"\d{6}", value):
+        return False
+    try:
+        datetime.strptime(value, "%H%M%S")
+    except ValueError:
+        return False
+    return True
+
+async def fetch_minute_bars(client: httpx.AsyncClient, token: str, symbol: str, day: str,
+                            end_hour: str, stop_hour: str = MARKET_OPEN_HOUR) -> list[dict]:
+    """
+    Fetch today's minute bars, paging backward from end_hour
+    
+    Each request returns up to 30 bars ending at FID_INPUT_HOUR_1, so the next
+    page starts one minute before the oldest bar received. Paging stops once
+    stop_hour (e.g. the last cached bar) is reached.
+    
+    Args:
+        client: httpx client
+        token: Access token
+        symbol: Stock symbol (e.g. "005930")
+        day: Trading day (YYYYMMDD); bars of other days are dropped
+        end_hour: Latest bar time to fetch (HHMMSS)
+        stop_hour: Earliest bar time needed (HHMMSS)
+        
+    Returns:
+        list: Bars {time, open, high, low, close, volume, amount} in ascending time order
+    """
+    bars = {}
+    hour = end_hour
+    
+    for _ in range(MAX_CONTINUATION_PAGES):
+        response = await client.get(
+            f"{TrIdManager.get_domain('minute_chart')}{MINUTE_CHART_PATH}",
+            headers={
+                "content-type": CONTENT_TYPE,
+                "authorization": f"{AUTH_TYPE} {token}",
+                "appkey": os.environ["KIS_APP_KEY"],
+                "appsecret": os.environ["KIS_APP_SECRET"],
+                "tr_id": TrIdManager.get_tr_id("minute_chart")
+            },
+            params={
+                "FID_ETC_CLS_CODE": "",  # 기타구분코드
+                "FID_COND_MRKT_DIV_CODE": "J",  # 시장구분
+                "FID_INPUT_ISCD": symbol,  # 종목코드
+                "FID_INPUT_HOUR_1": hour,  # 조회기준시간 (이 시간 이전 30건)
+                "FID_PW_DATA_INCU_YN": "Y",  # 과거데이터포함여부
+            }
+        )
+        
+        if response.status_code != 200:
+            raise Exception(f"Failed to get minute bars: {response.text}")
+        
+        rows = [row for row in decode_response(response).get("output2") or []
+                if row.get("stck_bsop_date") == day and row.get("stck_cntg_hour")]
+        if not rows:
+            break
+        for row in rows:
+            bars[row["stck_cntg_hour"]] = {
+                "time": row["stck_cntg_hour"],
+                "open": to_number(row.get("stck_oprc")),
+                "high": to_number(row.get("stck_hgpr")),
+                "low": to_number(row.get("stck_lwpr")),
+                "close": to_number(row.get("stck_prpr")),
+                "volume": to_number(row.get("cntg_vol")),
+                "amount": to_number(row.get("acml_tr_pbmn")),
+            }
+        
+        oldest = min(row["stck_cntg_hour"] for row in rows)
+        if oldest <= stop_hour:
+            break
+        hour = (datetime.strptime(oldest, "%H%M%S") - timedelta(minutes=1)).strftime("%H%M%S")
+    else:
+        logger.warning(f"Minute bar paging for {symbol} stopped after {MAX_CONTINUATION_PAGES} pages")
+    
+    return [bars[time] for time in sorted(bars) if time >= stop_hour]
+
+def merge_minute_bars(cached: list[dict], fresh: list[dict]) -> list[dict]:
+    """Append fresh bars to the cached day; only bars at or after the first fresh bar are replaced"""
+    if not fresh:
+        return cached
+    first = fresh[0]["time"]
+    return [bar for bar in cached if bar["time"] < first] + fresh
+
+def resample_minute_bars(bars: list[dict], interval: int) -> list[dict]:
+    """
+    Resample 1-minute bars to interval-minute bars (labelled by bucket start time)
+    
+    Works column-wise: bucket boundaries are computed once for the whole day
+    and each OHLCV column is reduced per bucket slice.
+    """
+    if interval == 1 or not bars:
+        return bars
+    minutes = [int(bar["time"][:2]) * 60 + int(bar["time"][2:4]) for bar in bars]
+    buckets = [minute - minute % interval for minute in minutes]
+    # 구간 경계 (bars는 시간순이므로 같은 구간은 연속)
+    starts = [i for i in range(len(buckets)) if i == 0 or buckets[i] != buckets[i - 1]]
+    ends = starts[1:] + [len(buckets)]
+    
+    columns = {field: [bar[field] for bar in bars] for field in ("open", "high", "low", "close", "volume")}
+    return [
+        {
+            "time": f"{buckets[start] // 60:02d}{buckets[start] % 60:02d}00",
+            "open": columns["open"][start],
+            "high": max(columns["high"][start:end]),
+            "low": min(columns["low"][start:end]),
+            "close": columns["close"][end - 1],
+            "volume": sum(columns["volume"][start:end]),
+            "amount": bars[end - 1]["amount"],
+        }
+        for start, end in zip(starts, ends)
+    ]
+
+async def get_minute_bars(client: httpx.AsyncClient, token: str, symbol: str, day: str,
+                          end_hour: str) -> tuple[list[dict], int]:
+    """
+    Get 1-minute bars of a day up to end_hour from the append-only cache,
+    fetching only the minutes after the last cached bar
+    
+    Returns:
+        tuple: (bars up to end_hour, number of newly fetched bars)
+    """
+    key = f"{symbol}:{day}"
+    lock = minute_bar_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        cached = shared_cache.get("minute_bars", key, MINUTE_BAR_CACHE_TTL) or []
+        fresh = []
+        if not cached or cached[-1]["time"] < end_hour:
+            # 마지막 분봉은 아직 진행 중일 수 있으므로 다시 조회해 교체
+            stop_hour = cached[-1]["time"] if cached else MARKET_OPEN_HOUR
+            fresh = await fetch_minute_bars(client, token, symbol, day, end_hour, stop_hour)
+            if fresh:
+                cached = merge_minute_bars(cached, fresh)
+                shared_cache.set("minute_bars", key, cached, MINUTE_BAR_CACHE_TTL)
+    return [bar for bar in cached if bar["time"] <= end_hour], len(fresh)
+
+# 실시간 체결통보 필드 (H0STCNI0 / H0STCNI9)
+EXECUTION_NOTICE_FIELDS = [
+    "CUST_ID", "ACNT_NO", "ODER_NO", "OODER_NO", "SELN_BYOV_CLS", "RCTF_CLS",
+    "ODER_KIND", "ODER_COND", "STCK_SHRN_ISCD", "CNTG_QTY", "CNTG_UNPR",
+    "STCK_CNTG_HOUR", "RFUS_YN", "CNTG_YN", "ACPT_YN", "BRNC_NO", "ODER_QTY",
+    "ACNT_NAME", "CNTG_ISNM", "CRDT_CLS", "CRDT_LOAN_DATE", "CNTG_ISNM40", "ODER_PRC"
+]
+
+# 주문 최종 상태
+TERMINAL_ORDER_STATUSES = {"filled", "cancelled", "rejected"}
+
+def normalize_order_no(order_no: str) -> str:
+    """Normalize order number (ODNO) by stripping leading zeros"""
+    return str(order_no).strip().lstrip("0") or "0"
+
+def decrypt_notice(key: str, iv: str, cipher_text: str) -> str:
+    """
+    Decrypt real-time execution notice (AES-256-CBC, base64 encoded)
+    
+    Args:
+        key: Per-session AES key from the subscribe response
+        iv: Per-session IV from the subscribe response
+        cipher_text: Base64 encoded notice payload
+        
+    Returns:
+        str: Decrypted notice ('^' separated fields)
+    """
+    cipher = AES.new(key.encode("utf-8"), AES.MODE_CBC, iv.encode("utf-8"))
+    return unpad(cipher.decrypt(b64decode(cipher_text)), AES.block_size).decode("utf-8")
+
+class OrderStateTable:
+    """In-memory order state table keyed by order number (ODNO)"""
+    
+    def __init__(self):
+        self._orders: dict[str, dict] = {}
+        self._condition = asyncio.Condition()
+        self._fill_listeners = []
+    
+    def add_fill_listener(self, listener):
+        """Register a callback(order, quantity, price) invoked on every fill"""
+        self._fill_listeners.append(listener)
+    
+    def get(self, order_no: str) -> dict | None:
+        """Get current state of the given order"""
+        return self._orders.get(normalize_order_no(order_no))
+    
+    def _entry(self, order_no: str) -> dict:
+        odno = normalize_order_no(order_no)
+        if odno not in self._orders:
+            self._orders[odno] = {
+                "odno": odno,
+                "symbol": "",
+                "name": "",
+                "side": "",
+                "order_qty": 0,
+                "filled_qty": 0,
+                "avg_fill_price": 0.0,
+                "status": "submitted",
+                "fills": [],
+                "updated_at": datetime.now().isoformat(timespec="seconds"),
+            }
+        return self._orders[odno]
+    
+    async def register(self, order_no: str, symbol: str, side: str, order_qty: int, tracked: bool = True):
+        """
+        Register an order accepted by order-stock
+        
+        Args:
+            tracked: Whether execution notices were subscribed when the order was
+                sent; untracked orders get status "unknown" (poll inquery-order-detail)
+        """
+        async with self._condition:
+            entry = self._entry(order_no)
+            entry["symbol"] = entry["symbol"] or symbol
+            entry["side"] = entry["side"] or side
+            entry["order_qty"] = entry["order_qty"] or order_qty
+            if not tracked and entry["status"] == "submitted":
+                entry["status"] = "unknown"
+            self._condition.notify_all()
+    
+    async def apply_notice(self, notice: dict) -> dict:
+        """
+        Apply a decrypted execution notice to the order state
+        
+        Args:
+            notice: Notice fields keyed by EXECUTION_NOTICE_FIELDS
+            
+        Returns:
+            dict: Updated order state
+        """
+        async with self._condition:
+            # 정정/취소 확인은 원주문번호의 상태를 변경
+            is_cancel = notice.get("RCTF_CLS") == "2"
+            target_no = notice["OODER_NO"] if is_cancel and notice.get("OODER_NO") else notice["ODER_NO"]
+            entry = self._entry(target_no)
+            entry["symbol"] = entry["symbol"] or notice.get("STCK_SHRN_ISCD", "")
+            entry["name"] = entry["name"] or notice.get("CNTG_ISNM", "")
+            entry["side"] = entry["side"] or {"01": "sell", "02": "buy"}.get(notice.get("SELN_BYOV_CLS"), "")
+            if not is_cancel and not entry["order_qty"]:
+                entry["order_qty"] = to_number(notice.get("ODER_QTY"))
+            
+            if notice.get("RFUS_YN") == "1":
+                entry["status"] = "rejected" if not is_cancel else entry["status"]
+            elif notice.get("CNTG_YN") == "2":
+                quantity = to_number(notice.get("CNTG_QTY"))
+                price = to_number(notice.get("CNTG_UNPR"))
+                filled_qty = entry["filled_qty"] + quantity
+                entry["avg_fill_price"] = round(
+                    (entry["avg_fill_price"] * entry["filled_qty"] + price * quantity) / filled_qty, 4
+                ) if filled_qty else 0.0
+                entry["filled_qty"] = filled_qty
+                entry["fills"].append({
+                    "qty": quantity,
+                    "price": price,
+                    "time": notice.get("STCK_CNTG_HOUR", ""),
+                })
+                if entry["order_qty"] and filled_qty >= entry["order_qty"]:
+                    entry["status"] = "filled"
+                else:
+                    entry["status"] = "partially_filled"
+                for listener in self._fill_listeners:
+                    try:
+                        listener(entry, quantity, price)
+                    except Exception as e:
+                        logger.error(f"Fill listener failed: {e}")
+            elif is_cancel or notice.get("ACPT_YN") == "3":
+                entry["status"] = "cancelled"
+            elif entry["status"] == "submitted":
+                entry["status"] = "accepted"
+            
+            entry["updated_at"] = datetime.now().isoformat(timespec="seconds")
+            self._condition.notify_all()
+            return entry
+    
+    async def wait_for_terminal(self, order_no: str, timeout: float) -> dict | None:
+        """
+        Wait until the order reaches a terminal state (filled, cancelled, rejected)
+        
+        Args:
+            order_no: Order number (ODNO)
+            timeout: Maximum time to wait in seconds
+            
+        Returns:
+            dict | None: Order state (possibly non-terminal on timeout) or None if unknown
+        """
+        def is_terminal():
+            entry = self.get(order_no)
+            return entry is not None and entry["status"] in TERMINAL_ORDER_STATUSES
+        
+        async with self._condition:
+            try:
+                await asyncio.wait_for(self._condition.wait_for(is_terminal), timeout)
+            except TimeoutError:
+                pass
+            return self.get(order_no)
+
+class ExecutionNoticeSubscriber:
+    """
+    Subscriber for KIS real-time execution notices (체결통보) over websocket
+    
+    on_gap (e.g. PositionLedger.mark_dirty) is called whenever notices may have
+    been missed: when the subscription is (re)established or lost.
+    """
+    
+    def __init__(self, table: OrderStateTable, url: str | None = None,
+                 approval_key: str | None = None, hts_id: str | None = None, on_gap=None):
+        is_real_account = os.environ.get("KIS_ACCOUNT_TYPE", "REAL").upper() == "REAL"
+        self.table = table
+        self.url = url or os.environ.get("KIS_WS_URL") or (WS_DOMAIN if is_real_account else VIRTUAL_WS_DOMAIN)
+        self.hts_id = hts_id or os.environ.get("KIS_HTS_ID", "")
+        self.tr_id = TrIdManager.get_tr_id("execution_notice")
+        self._approval_key = approval_key
+        self._key = None
+        self._iv = None
+        self._task: asyncio.Task | None = None
+        self.subscribed = asyncio.Event()
+        self.on_gap = on_gap
+    
+    def _notify_gap(self):
+        if self.on_gap is not None:
+            try:
+                self.on_gap()
+            except Exception as e:
+                logger.error(f"Notice gap listener failed: {e}")
+    
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+    
+    def start(self):
+        """Start the subscriber loop in the background if not already running"""
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Stop the subscriber loop"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.subscribed.clear()
+    
+    async def _run(self):
+        delay = 1.0
+        while True:
+            try:
+                if not self._approval_key:
+                    async with kis_client() as client:
+                        self._approval_key = await get_approval_key(client)
+                async with connect(self.url, ping_interval=None) as websocket:
+                    await websocket.send(json.dumps({
+                        "header": {
+                            "approval_key": self._approval_key,
+                            "custtype": "P",
+                            "tr_type": "1",
+                            "content-type": "utf-8"
+                        },
+                        "body": {"input": {"tr_id": self.tr_id, "tr_key": self.hts_id}}
+                    }))
+                    delay = 1.0
+                    async for message in websocket:
+                        reply = await self.handle_message(message)
+                        if reply is not None:
+                            await websocket.send(reply)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Execution notice connection lost: {e} (retry in {delay:.0f}s)")
+            if self.subscribed.is_set():
+                self.subscribed.clear()
+                self._notify_gap()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60.0)
+    
+    async def handle_message(self, message: str) -> str | None:
+        """
+        Handle one websocket message
+        
+        Args:
+            message: Raw websocket message
+            
+        Returns:
+            str | None: Message to send back (PINGPONG echo), if any
+        """
+        if message[:1] in ("0", "1"):
+            encrypted, tr_id, count, payload = message.split("|", 3)
+            if tr_id != self.tr_id:
+                return None
+            if encrypted == "1":
+                if not (self._key and self._iv):
+                    logger.warning("Execution notice received before AES key/IV")
+                    return None
+                payload = decrypt_notice(self._key, self._iv, payload)
+            values = payload.split("^")
+            count = max(int(count), 1)
+            size = len(values) // count
+            for i in range(count):
+                notice = dict(zip(EXECUTION_NOTICE_FIELDS, values[i * size:(i + 1) * size]))
+                state = await self.table.apply_notice(notice)
+                logger.info(f"Execution notice: ODNO={state['odno']} status={state['status']}")
+            return None
+        
+        data = json.loads(message)
+        header = data.get("header", {})
+        if header.get("tr_id") == "PINGPONG":
+            return message
+        body = data.get("body", {})
+        if body.get("rt_cd") not in (None, "0"):
+            logger.error(f"Execution notice subscribe failed: {body.get('msg1')}")
+            return None
+        output = body.get("output") or {}
+        if output.get("key") and output.get("iv"):
+            self._key = output["key"]
+            self._iv = output["iv"]
+            self.subscribed.set()
+            # 구독 전(또는 재연결 사이)의 체결은 통보되지 않았을 수 있음
+            self._notify_gap()
+        return None
+
+async def get_approval_key(client: httpx.AsyncClient) -> str:
+    """
+    Get websocket approval key for real-time subscriptions
+    
+    Args:
+        client: httpx client
+        
+    Returns:
+        str: Approval key
+    """
+    response = await client.post(
+        f"{TrIdManager.get_domain('buy')}{APPROVAL_PATH}",
+        headers={"content-type": CONTENT_TYPE},
+        json={
+            "grant_type": "client_credentials",
+            "appkey": os.environ["KIS_APP_KEY"],
+            "secretkey": os.environ["KIS_APP_SECRET"]
+        }
+    )
+    
+    if response.status_code != 200:
+        raise Exception(f"Failed to get approval key: {response.text}")
+    
+    return decode_response(response)["approval_key"]
+
+class PositionLedger:
+    """
+    Local position and cash ledger serving balance reads from memory
+    
+    Seeded from one balance fetch, updated incrementally from fills and
+    reconciled against KIS periodically (LEDGER_RECONCILE_INTERVAL) or on demand.
+    """
+    
+    def __init__(self, reconcile_interval: float = LEDGER_RECONCILE_INTERVAL):
+        self.reconcile_interval = reconcile_interval
+        self._positions: dict[str, dict] = {}
+        self._summary: dict = {}
+        self._reconciled_at: float | None = None
+        self._reconciled_at_iso = ""
+        self._updated_at_iso = ""
+        self._pending_updates = 0
+        self._needs_reconcile = False
+        self._reconcile_error = ""
+        self._reconciled_fills: dict[str, int] = {}
+        self._lock = asyncio.Lock()
+    
+    @property
+    def seeded(self) -> bool:
+        return self._reconciled_at is not None
+    
+    def age(self) -> float | None:
+        """Seconds since the last reconcile with KIS"""
+        if self._reconciled_at is None:
+            return None
+        return time.monotonic() - self._reconciled_at
+    
+    def is_expired(self) -> bool:
+        return not self.seeded or self._needs_reconcile or self.age() > self.reconcile_interval
+    
+    def mark_dirty(self):
+        """Force a reconcile on the next read (e.g. order placed without fill notices)"""
+        self._needs_reconcile = True
+    
+    def seed(self, holdings: list[dict], summary: dict, filled: dict[str, int] | None = None):
+        """
+        Replace ledger contents with a fresh balance fetch
+        
+        Args:
+            holdings: Balance output1 rows
+            summary: Balance output2 summary
+            filled: Cumulative filled quantity per ODNO already reflected in the balance
+        """
+        self._positions = {h["pdno"]: dict(h) for h in holdings if to_number(h.get("hldg_qty")) > 0}
+        self._summary = dict(summary)
+        self._reconciled_fills = dict(filled or {})
+        self._reconciled_at = time.monotonic()
+        self._reconciled_at_iso = datetime.now().isoformat(timespec="seconds")
+        self._updated_at_iso = self._reconciled_at_iso
+        self._pending_updates = 0
+        self._needs_reconcile = False
+        self._reconcile_error = ""
+    
+    async def reconcile(self, client: httpx.AsyncClient, token: str):
+        """Reconcile the ledger against KIS balance (concurrent callers share one fetch)"""
+        if self._lock.locked():
+            async with self._lock:
+                return
+        async with self._lock:
+            pending_before = self._pending_updates
+            holdings, summary = await fetch_balance_pages(client, token)
+            # 잔고 조회 이후에 주문별 체결수량을 조회해 잔고에 이미 반영된 체결통보를 걸러냄
+            try:
+                filled = await fetch_filled_quantities(client, token)
+            except Exception as e:
+                logger.warning(f"Filled quantity lookup failed, fills are not deduplicated: {e}")
+                filled = {}
+            # 조회 중 반영된 체결은 조회 결과와 중복/누락될 수 있으므로 다음 조회 시 재동기화
+            changed = self._pending_updates != pending_before
+            self.seed(holdings, summary, filled)
+            self._needs_reconcile = changed
+    
+    async def read(self, client: httpx.AsyncClient, token: str, refresh: bool = False) -> tuple[list[dict], dict]:
+        """
+        Read positions and account summary, reconciling first if required
+        
+        Falls back to the last known ledger (reported as stale) if the
+        reconcile fails after the ledger has been seeded.
+        """
+        if refresh or self.is_expired():
+            try:
+                await self.reconcile(client, token)
+            except Exception as e:
+                if not self.seeded:
+                    raise
+                logger.warning(f"Ledger reconcile failed, serving stale balance: {e}")
+                self._needs_reconcile = True
+                self._reconcile_error = str(e)
+        return list(self._positions.values()), self._summary
+    
+    def apply_fill(self, order: dict, quantity: int, price: float):
+        """Apply one execution to positions and D+2 cash"""
+        if not self.seeded:
+            return
+        # 마지막 재동기화 잔고에 이미 포함된 체결수량은 제외 (주문번호별 누적 체결수량 기준)
+        included = self._reconciled_fills.get(order.get("odno"), 0)
+        if included:
+            filled_before = order.get("filled_qty", quantity) - quantity
+            quantity -= min(quantity, max(included - filled_before, 0))
+        if not quantity:
+            return
+        symbol = order["symbol"]
+        amount = quantity * price
+        position = self._positions.get(symbol)
+        
+        if order["side"] == "buy":
+            if position is None:
+                position = self._positions[symbol] = {
+                    "pdno": symbol,
+                    "prdt_name": order.get("name", ""),
+                    "hldg_qty": "0",
+                    "pchs_amt": "0",
+                    "pchs_avg_pric": "0",
+                    "prpr": str(price),
+                }
+            hldg_qty = to_number(position.get("hldg_qty")) + quantity
+            pchs_amt = to_number(position.get("pchs_amt")) + amount
+            cash_delta = -amount
+        elif order["side"] == "sell" and position is not None:
+            held = to_number(position.get("hldg_qty"))
+            hldg_qty = max(held - quantity, 0)
+            pchs_amt = to_number(position.get("pchs_amt")) * hldg_qty / held if held else 0
+            cash_delta = amount
+        else:
+            # 원장에 없는 종목 매도 등은 재동기화로 처리
+            self._needs_reconcile = True
+            return
+        
+        if hldg_qty > 0:
+            prpr = to_number(position.get("prpr")) or price
+            position["hldg_qty"] = str(hldg_qty)
+            position["pchs_amt"] = str(round(pchs_amt))
+            position["pchs_avg_pric"] = str(round(pchs_amt / hldg_qty, 4))
+            position["evlu_amt"] = str(round(hldg_qty * prpr))
+            position["evlu_pfls_amt"] = str(round(hldg_qty * prpr - pchs_amt))
+        else:
+            self._positions.pop(symbol, None)
+        
+        if self._summary:
+            cash = to_number(self._summary.get("prvs_rcdl_excc_amt")) + cash_delta
+            self._summary["prvs_rcdl_excc_amt"] = str(round(cash))
+        self._pending_updates += 1
+        self._updated_at_iso = datetime.now().isoformat(timespec="seconds")
+    
+    def status(self) -> dict:
+        """Staleness indicator for ledger-served reads"""
+        age = self.age()
+        return {
+            "source": "ledger",
+            "reconciled_at": self._reconciled_at_iso,
+            "updated_at": self._updated_at_iso,
+            "age_seconds": round(age, 1) if age is not None else None,
+            "pending_updates": self._pending_updates,
+            "stale": self._needs_reconcile or (age is not None and age > self.reconcile_interval),
+            "reconcile_error": self._reconcile_error,
+        }
+
+position_ledger = PositionLedger()
+
+order_state_table = OrderStateTable()
+order_state_table.add_fill_listener(position_ledger.apply_fill)
+_execution_notice_subscriber: ExecutionNoticeSubscriber | None = None
+
+def ensure_execution_notice_subscriber() -> ExecutionNoticeSubscriber:
+    """Start the execution notice subscriber (requires KIS_HTS_ID) if not running"""
+    global _execution_notice_subscriber
+    if not os.environ.get("KIS_HTS_ID"):
+        raise Exception("KIS_HTS_ID must be set to subscribe to execution notices")
+    if _execution_notice_subscriber is None:
+        _execution_notice_subscriber = ExecutionNoticeSubscriber(order_state_table, on_gap=position_ledger.mark_dirty)
+    _execution_notice_subscriber.start()
+    return _execution_notice_subscriber
+
+async def wait_for_execution_notices(timeout: float = NOTICE_SUBSCRIBE_TIMEOUT) -> bool:
+    """Start the subscriber if needed and wait (bounded) until notices are subscribed"""
+    if not os.environ.get("KIS_HTS_ID"):
+        return False
+    subscriber = ensure_execution_notice_subscriber()
+    try:
+        await asyncio.wait_for(subscriber.subscribed.wait(), timeout)
+    except TimeoutError:
+        logger.warning(f"Execution notices not subscribed after {timeout:.0f}s")
+    return subscriber.subscribed.is_set()
+
+async def start_background_services():
+    """Start services that must run before the first tool call (execution notices)"""
+    if os.environ.get("KIS_HTS_ID"):
+        ensure_execution_notice_subscriber()
+
+async def stop_background_services():
+    if _execution_notice_subscriber is not None:
+        await _execution_notice_subscriber.stop()
+
+class Job:
+    """Background job state with incrementally collected results"""
+    
+    def __init__(self, kind: str, params: dict):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.params = params
+        self.status = "pending"
+        self.progress = 0
+        self.total: int | None = None
+        self.results: list = []
+        self.error = ""
+        self.created_at = datetime.now().isoformat(timespec="seconds")
+        self.finished_at = ""
+        self.finished_monotonic: float | None = None
+        self.task: asyncio.Task | None = None
+        self._changed = asyncio.Condition()
+    
+    @property
+    def done(self) -> bool:
+        return self.status in ("completed", "failed", "cancelled")
+    
+    async def add_results(self, items: list, advance: int = 1):
+        """Append partial results and advance progress"""
+        async with self._changed:
+            self.results.extend(items)
+            self.progress += advance
+            self._changed.notify_all()
+    
+    async def set_total(self, total: int):
+        async with self._changed:
+            self.total = total
+            self._changed.notify_all()
+    
+    async def finish(self, status: str, error: str = ""):
+        async with self._changed:
+            self.status = status
+            self.error = error
+            self.finished_at = datetime.now().isoformat(timespec="seconds")
+            self.finished_monotonic = time.monotonic()
+            self._changed.notify_all()
+    
+    async def wait_for_change(self, cursor: int, progress: int, timeout: float) -> bool:
+        """Wait until new results, progress or completion; returns False on timeout"""
+        async with self._changed:
+            try:
+                await asyncio.wait_for(self._changed.wait_for(
+                    lambda: self.done or len(self.results) > cursor or self.progress > progress
+                ), timeout)
+                return True
+            except TimeoutError:
+                return False
+    
+    def summary(self) -> dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "total": self.total,
+            "result_count": len(self.results),
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+class JobManager:
+    """Registry running long bulk queries as background jobs"""
+    
+    def __init__(self, retention: float = JOB_RETENTION_SECONDS):
+        self.retention = retention
+        self._jobs: dict[str, Job] = {}
+    
+    def _prune(self):
+        now = time.monotonic()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_monotonic is not None and now - job.finished_monotonic > self.retention:
+                del self._jobs[job_id]
+    
+    def submit(self, kind: str, params: dict, runner, session=None) -> Job:
+        """
+        Start a job in the background
+        
+        Args:
+            kind: Job kind (e.g. "stock-history")
+            params: Job parameters (reported back in job status)
+            runner: async runner(job) producing results
+            session: MCP session notified when the job finishes
+        """
+        self._prune()
+        job = Job(kind, params)
+        self._jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job, runner, session))
+        return job
+    
+    async def _run(self, job: Job, runner, session):
+        job.status = "running"
+        try:
+            await runner(job)
+            await job.finish("completed")
+        except asyncio.CancelledError:
+            await job.finish("cancelled")
+        except Exception as e:
+            logger.error(f"Job {job.id} ({job.kind}) failed: {e}")
+            await job.finish("failed", str(e))
+        
+        if session is not None:
+            try:
+                await session.send_log_message(level="info", data=job.summary(), logger="kis-jobs")
+            except Exception as e:
+                logger.debug(f"Job {job.id} completion notice not delivered: {e}")
+    
+    def get(self, job_id: str) -> Job:
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise ValueError(f"Unknown job: {job_id}")
+        return job
+    
+    def cancel(self, job_id: str) -> Job:
+        job = self.get(job_id)
+        if job.task is not None and not job.done:
+            job.task.cancel()
+        return job
+
+job_manager = JobManager()
+
+async def run_stock_history_job(job: Job):
+    """Fetch daily history for every symbol concurrently (one result per symbol)"""
+    symbols = job.params["symbols"]
+    await job.set_total(len(symbols))
+    
+    async with kis_client() as client:
+        token = await get_access_token(client)
+        
+        async def fetch(symbol: str):
+            try:
+                # 백그라운드 작업은 대화형 조회보다 낮은 우선순위로 스케줄링
+                data = await fetch_stock_history(client, token, symbol,
+                                                 job.params["start_date"], job.params["end_date"], "bulk")
+                item = {"symbol": symbol, "output1": data.get("output1"), "output2": data.get("output2", [])}
+            except Exception as e:
+                item = {"symbol": symbol, "error": str(e)}
+            await job.add_results([item])
+        
+        await asyncio.gather(*(fetch(symbol) for symbol in symbols))
+
+async def run_order_export_job(job: Job):
+    """Export the daily order list across all continuation pages (one result per order)"""
+    ctx_area_fk100 = ""
+    ctx_area_nk100 = ""
+    tr_cont = ""
+    
+    async with kis_client() as client:
+        token = await get_access_token(client)
+        for _ in range(MAX_EXPORT_PAGES):
+            data, has_next = await fetch_order_list_page(
+                client, token, job.params["start_date"], job.params["end_date"],
+                ctx_area_fk100, ctx_area_nk100, tr_cont, priority="bulk"
+            )
+            await job.add_results(data.get("output1") or [])
+            if not has_next:
+                break
+            ctx_area_fk100 = data.get("ctx_area_fk100", "").strip()
+            ctx_area_nk100 = data.get("ctx_area_nk100", "").strip()
+            tr_cont = "N"
+        else:
+            logger.warning(f"Order export stopped after {MAX_EXPORT_PAGES} pages")
+        await job.set_total(job.progress)
+
+# 프로파일링 설정 (KIS_ADMIN_TOKEN이 없으면 /admin/profile 비활성화)
+ADMIN_TOKEN = os.environ.get("KIS_ADMIN_TOKEN", "")
+MAX_PROFILE_SECONDS = 120.0  # 한 번에 프로파일링할 수 있는 최대 시간(초)
+MIN_PROFILE_INTERVAL = 0.001  # 최소 샘플링 간격(초, 샘플러 스레드가 루프를 점유하지 않도록)
+PROFILE_TOP_ENTRIES = 20  # 결과에 포함할 상위 항목 수
+
+def frame_label(code) -> str:
+    """Flamegraph frame label: function (file:line)"""
+    return f"{code.co_qualname} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+def fold_frames(frame) -> str:
+    """Fold a thread's call stack into a root-first, ';'-separated line"""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+def fold_task(task: asyncio.Task) -> str:
+    """Fold the await chain of a task (coroutine -> awaited coroutine -> ...)"""
+    labels = [f"task:{task.get_name()}"]
+    awaitable = task.get_coro()
+    while awaitable is not None:
+        code = getattr(awaitable, "cr_code", None) or getattr(awaitable, "gi_code", None) or getattr(awaitable, "ag_code", None)
+        if code is None:
+            labels.append(type(awaitable).__qualname__)
+            break
+        labels.append(frame_label(code))
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None) or getattr(awaitable, "ag_await", None)
+    return ";".join(labels)
+
+class SlowCallbackHandler(logging.Handler):
+    """Collects asyncio debug-mode "Executing <handle> took N seconds" warnings"""
+    
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.callbacks = []
+    
+    def emit(self, record: logging.LogRecord):
+        if isinstance(record.msg, str) and record.msg.startswith("Executing") and isinstance(record.args, tuple) and len(record.args) == 2:
+            handle, duration = record.args
+            self.callbacks.append({"callback": str(handle)[:300], "seconds": round(duration, 4)})
+
+class ServerProfiler:
+    """
+    On-demand profiler for the running server
+    
+    Nothing is installed until run() is called: the sampler thread, the loop
+    lag probe and asyncio debug mode (for slow-callback detection) only exist
+    for the requested window, so the server pays no overhead otherwise.
+    
+    Modes:
+        sample: samples the event loop thread's Python stack (time spent in
+            JSON, logging, scheduler, ... including idle time in select)
+        tasks: samples the await chain of every asyncio task (where requests
+            are waiting, e.g. scheduler queue vs upstream response)
+    """
+    
+    def __init__(self):
+        self._lock = asyncio.Lock()
+    
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+    
+    async def run(self, seconds: float, mode: str = "sample", interval: float = 0.005,
+                  slow_callback_threshold: float = 0.1) -> dict:
+        if mode not in ("sample", "tasks"):
+            raise ValueError(f"Unsupported profile mode: {mode}. Use 'sample' or 'tasks'")
+        for name, value in (("seconds", seconds), ("interval", interval),
+                            ("slow_callback_threshold", slow_callback_threshold)):
+            if not math.isfinite(value) or value <= 0:
+                raise ValueError(f"{name} must be a positive number")
+        if self.running:
+            raise Exception("A profiling session is already running")
+        interval = max(interval, MIN_PROFILE_INTERVAL)
+        seconds = min(max(seconds, interval), MAX_PROFILE_SECONDS)
+        
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            stacks: dict[str, int] = {}
+            stop = threading.Event()
+            
+            if mode == "sample":
+                loop_thread = threading.get_ident()
+                
+                def sample():
+                    while not stop.wait(interval):
+                        frame = sys._current_frames().get(loop_thread)
+                        if frame is not None:
+                            stack = fold_frames(frame)
+                            stacks[stack] = stacks.get(stack, 0) + 1
+                
+                sampler = threading.Thread(target=sample, name="kis-profiler", daemon=True)
+                sampler.start()
+            
+            # 이벤트 루프 지연 측정 (interval마다 깨어나 예정 시각보다 늦은 만큼 기록)
+            lags = []
+            async def probe():
+                while not stop.is_set():
+                    expected = loop.time() + interval
+                    await asyncio.sleep(interval)
+                    lags.append(max(loop.time() - expected, 0.0))
+                    if mode == "tasks":
+                        for task in asyncio.all_tasks(loop):
+                            # 루프 지연 측정 태스크 자신은 제외
+                            if task is not prober and not task.done():
+                                stack = fold_task(task)
+                                stacks[stack] = stacks.get(stack, 0) + 1
+            
+            slow_callbacks = SlowCallbackHandler()
+            asyncio_logger = logging.getLogger("asyncio")
+            was_debug, previous_threshold = loop.get_debug(), loop.slow_callback_duration
+            asyncio_logger.addHandler(slow_callbacks)
+            loop.slow_callback_duration = slow_callback_threshold
+            loop.set_debug(True)
+            prober = asyncio.create_task(probe(), name="kis-profiler-probe")
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                stop.set()
+                await prober
+                loop.set_debug(was_debug)
+                loop.slow_callback_duration = previous_threshold
+                asyncio_logger.removeHandler(slow_callbacks)
+                if mode == "sample":
+                    await asyncio.to_thread(sampler.join)
+        
+        folded = sorted(stacks.items(), key=operator.itemgetter(1), reverse=True)
+        leaves: dict[str, int] = {}
+        for stack, count in folded:
+            leaf = stack.rsplit(";", 1)[-1]
+            leaves[leaf] = leaves.get(leaf, 0) + count
+        total = sum(stacks.values())
+        lags.sort()
+        
+        return {
+            "mode": mode,
+            "seconds": seconds,
+            "samples": total,
+            "folded": "\n".join(f"{stack} {count}" for stack, count in folded),
+            "top": [
+                {"frame": leaf, "samples": count, "ratio": round(count / total, 4)}
+                for leaf, count in sorted(leaves.items(), key=operator.itemgetter(1), reverse=True)[:PROFILE_TOP_ENTRIES]
+            ],
+            "loop_lag": {
+                "probes": len(lags),
+                "mean": round(sum(lags) / len(lags), 6) if lags else 0.0,
+                "p50": round(lags[len(lags) // 2], 6) if lags else 0.0,
+                "p99": round(lags[min(int(len(lags) * 0.99), len(lags) - 1)], 6) if lags else 0.0,
+                "max": round(lags[-1], 6) if lags else 0.0,
+            },
+            "slow_callbacks": sorted(slow_callbacks.callbacks, key=operator.itemgetter("seconds"),
+                                     reverse=True)[:PROFILE_TOP_ENTRIES],
+        }
+
+server_profiler = ServerProfiler()
+
+def submitting_session(ctx: Context):
+    """MCP session of the current request, if any"""
+    try:
+        return ctx.session
+    except ValueError:
+        return None
+
+@mcp.tool(
+    name="inquery-stock-price",
+    description="Get current stock price information from Korea Investment & Securities",
+)
+async def inquery_stock_price(symbol: str):
+    """
+    Get current stock price information from Korea Investment & Securities
+    
+    Args:
+        symbol: Stock symbol (e.g. "005930" for Samsung Electronics)
+        
+    Returns:
+        Dictionary containing stock price information including:
+        - stck_prpr: Current price
+        - prdy_vrss: Change from previous day
+        - prdy_vrss_sign: Change direction (+/-)
+        - prdy_ctrt: Change rate (%)
+        - acml_vol: Accumulated volume
+        - acml_tr_pbmn: Accumulated trade value
+        - hts_kor_isnm: Stock name in Korean
+        - stck_mxpr: High price of the day
+        - stck_llam: Low price of the day
+        - stck_oprc: Opening price
+        - stck_prdy_clpr: Previous day's closing price
+    """
+    async with kis_client() as client:
+        token = await get_access_token(client)
+        output = await fetch_stock_price(client, token, symbol)
+    
+    # 최신 시세를 캐시에 저장하여 portfolio-snapshot 등에서 재사용
+    shared_cache.set("quote", symbol, output, max(QUOTE_CACHE_TTL, QUOTE_CACHE_RETENTION))
+    return output
+
+@mcp.tool(
+    name="inquery-balance",
+    description="Get current stock balance information from Korea Investment & Securities",
+)
+async def inquery_balance(refresh: bool = False):
+    """
+    Get current stock balance information from Korea Investment & Securities
+    
+    Served from the local position ledger, which is seeded from one balance
+    fetch (all continuation pages), updated from fill notices and reconciled
+    against KIS every KIS_LEDGER_RECONCILE_SECONDS or when refresh is set.
+    
+    Args:
+        refresh: Reconcile with KIS before returning
+    
+    Returns:
+        Dictionary containing stock balance information including:
+        - output1: Holdings
+            - pdno: Stock code
+            - prdt_name: Stock name
+            - hldg_qty: Holding quantity
+            - pchs_amt: Purchase amount
+            - prpr: Current price
+            - evlu_amt: Evaluation amount
+            - evlu_pfls_amt: Evaluation profit/loss amount
+            - evlu_pfls_rt: Evaluation profit/loss rate
+        - output2: Account summary
+        - ledger: Staleness indicator (reconciled_at, updated_at, age_seconds,
+          pending_updates, stale)
+    """
+    async with kis_client() as client:
+        token = await get_access_token(client)
+        holdings, summary = await position_ledger.read(client, token, refresh)
+    
+    return {
+        "output1": holdings,
+        "output2": [summary] if summary else [],
+        "ledger": position_ledger.status(),
+    }
+
+@mcp.tool(
+    name="portfolio-snapshot",
+    description="Get portfolio snapshot (holdings valued at live prices, P&L and weights) from Korea Investment & Securities",
+)
+async def portfolio_snapshot(max_quote_age: float = QUOTE_CACHE_TTL):
+    """
+    Get portfolio snapshot combining balance with concurrently refreshed prices
+    
+    Reads holdings from the position ledger (see inquery-balance), refreshes the
+    current price of every holding concurrently (reusing quotes younger than
+    max_quote_age) and computes market value, P&L and weights server-side.
+    
+    Args:
+        max_quote_age: Maximum acceptable age of cached quotes in seconds
+        
+    Returns:
+        Dictionary containing:
+        - as_of: Snapshot timestamp (ISO 8601)
+        - columns: Column names of each row
+        - rows: One row per holding (pdno, prdt_name, hldg_qty, pchs_avg_pric,
+          prpr, pchs_amt, evlu_amt, evlu_pfls_amt, evlu_pfls_rt, weight)
+        - summary: Cash (D+2), stock evaluation, purchase amount, P&L and total evaluation
+        - stale_symbols: Symbols valued at the balance price because the quote refresh failed
+    """
+    async with kis_client() as client:
+        token = await get_access_token(client)
+        holdings, summary = await position_ledger.read(client, token)
+    
+    as_of = datetime.now()
+    quotes = await gather_limited(lambda h: get_cached_stock_price(h["pdno"], max_quote_age), holdings)
+    
+    rows = []
+    stale_symbols = []
+    for holding, quote in zip(holdings, quotes):
+        if isinstance(quote, BaseException):
+            logger.warning(f"Price refresh failed for {holding['pdno']}: {quote}")
+            stale_symbols.append(holding["pdno"])
+            price = to_number(holding.get("prpr"))
+        else:
+            price = to_number(quote.get("stck_prpr"))
         
-        if response.status_code != 200:
-            raise Exception(f"Failed to get balance: {response.text}")
+        quantity = to_number(holding.get("hldg_qty"))
+        purchase_amount = to_number(holding.get("pchs_amt"))
+        market_value = quantity * price
+        profit_loss = market_value - purchase_amount
+        rows.append([
+            holding["pdno"],
+            holding.get("prdt_name", ""),
+            quantity,
+            to_number(holding.get("pchs_avg_pric")),
+            price,
+            purchase_amount,
+            market_value,
+            profit_loss,
+            round(profit_loss / purchase_amount * 100, 2) if purchase_amount else 0.0,
+        ])
+    
+    cash = to_number(summary.get("prvs_rcdl_excc_amt"))  # D+2 예수금
+    stock_value = sum(row[6] for row in rows)
+    purchase_total = sum(row[5] for row in rows)
+    total_value = stock_value + cash
+    for row in rows:
+        row.append(round(row[6] / total_value, 4) if total_value else 0.0)
+    
+    return {
+        "as_of": as_of.isoformat(timespec="seconds"),
+        "columns": [
+            "pdno", "prdt_name", "hldg_qty", "pchs_avg_pric", "prpr",
+            "pchs_amt", "evlu_amt", "evlu_pfls_amt", "evlu_pfls_rt", "weight"
+        ],
+        "rows": rows,
+        "summary": {
+            "cash": cash,
+            "stock_evlu_amt": stock_value,
+            "pchs_amt": purchase_total,
+            "evlu_pfls_amt": stock_value - purchase_total,
+            "evlu_pfls_rt": round((stock_value - purchase_total) / purchase_total * 100, 2) if purchase_total else 0.0,
+            "tot_evlu_amt": total_value,
+        },
+        "stale_symbols": stale_symbols,
+    }
+
+@mcp.tool(
+    name="screen-stocks",
+    description="Screen a universe of stocks by filter expressions over current quote fields (e.g. 'prdy_ctrt > 3')",
+)
+async def screen_stocks(filters: list[str], ctx: Context, universe: str = "", symbols: list[str] | None = None,
+                        max_results: int = 50, max_quote_age: float = 30.0):
+    """
+    Screen stocks by filter expressions over current price fields
+    
+    Scans the universe concurrently within the request scheduler's rate limit,
+    reusing cached quotes younger than max_quote_age. Each match is streamed as
+    an MCP log notification (logger "screen-stocks") with progress
+    notifications, and the scan stops once max_results matches are found.
+    
+    Args:
+        filters: Expressions combined with AND, e.g. ["prdy_ctrt > 3", "acml_vol >= 1000000"]
+            (fields of inquery-stock-price output; operators >, >=, <, <=, ==, !=).
+            A symbol whose quote lacks a filtered field or has a non-numeric
+            value there does not match
+        universe: Named universe from KIS_UNIVERSE_FILE (e.g. "KOSPI200")
+        symbols: Explicit symbol list (used instead of / in addition to universe)
+        max_results: Stop scanning after this many matches
+        max_quote_age: Maximum age in seconds of cached quotes to reuse
         
-        return response.json()
+    Returns:
+        Dictionary containing:
+        - as_of: Scan start timestamp
+        - matches: Matching symbols with stck_prpr, prdy_vrss, prdy_ctrt, acml_vol,
+          acml_tr_pbmn and the filtered fields
+        - scanned: Number of symbols scanned
+        - total: Universe size
+        - stopped_early: Whether the scan stopped at max_results
+        - errors: Symbols whose quote could not be fetched
+    """
+    conditions = parse_screen_filters(filters)
+    candidates = list(symbols or [])
+    if universe:
+        candidates.extend(load_universe(universe))
+    candidates = list(dict.fromkeys(candidates))
+    if not candidates:
+        raise ValueError("Either universe or symbols must be given")
+    
+    as_of = datetime.now()
+    result_fields = list(dict.fromkeys(SCREEN_RESULT_FIELDS + [field for field, _, _ in conditions]))
+    queue = deque(candidates)
+    matches = []
+    errors = {}
+    scanned = 0
+    
+    async def worker():
+        nonlocal scanned
+        while queue and len(matches) < max_results:
+            symbol = queue.popleft()
+            try:
+                quote = await get_cached_stock_price(symbol, max_quote_age)
+            except Exception as e:
+                errors[symbol] = str(e)
+                continue
+            finally:
+                scanned += 1
+            
+            # 시세에 없거나 숫자가 아닌 필드는 0으로 간주하지 않고 불일치로 처리
+            values = {field: to_number(quote.get(field), None) for field in result_fields}
+            if all(values[field] is not None and SCREEN_OPERATORS[op](values[field], value)
+                   for field, op, value in conditions) and len(matches) < max_results:
+                match = {"symbol": symbol, **values}
+                matches.append(match)
+                await ctx.log("info", json_dumps(match), logger_name="screen-stocks")
+            await ctx.report_progress(scanned, len(candidates))
+    
+    # 워커 수를 제한하여 스케줄러 대기열에서 시세 요청이 폐기되지 않도록 함
+    await asyncio.gather(*(worker() for _ in range(min(SCREEN_CONCURRENCY, len(candidates)))))
+
+    return {
+        "as_of": as_of.isoformat(timespec="seconds"),
+        "matches": matches,
+        "scanned": scanned,
+        "total": len(candidates),
+        "stopped_early": bool(queue) and len(matches) >= max_results,
+        "errors": errors,
+    }
 
 @mcp.tool(
     name="order-stock",
@@ -374,7 +3295,10 @@ async def order_stock(symbol: str, quantity: int, price: int, order_type: str):
     if order_type not in ["buy", "sell"]:
         raise ValueError('order_type must be either "buy" or "sell"')
 
-    async with httpx.AsyncClient() as client:
+    # 시장가 주문은 즉시 체결될 수 있으므로 주문 전에 체결통보 구독 완료를 확인
+    tracked = await wait_for_execution_notices()
+    
+    async with kis_client() as client:
         token = await get_access_token(client)
         
         # Prepare request data
@@ -406,7 +3330,17 @@ async def order_stock(symbol: str, quantity: int, price: int, order_type: str):
         if response.status_code != 200:
             raise Exception(f"Failed to order stock: {response.text}")
         
-        return response.json()
+        data = decode_response(response)
+    
+    # 체결통보 대기를 위해 주문 상태 테이블에 등록
+    order_no = (data.get("output") or {}).get("ODNO")
+    if data.get("rt_cd") == "0" and order_no:
+        await order_state_table.register(order_no, symbol, order_type, quantity, tracked)
+        if not tracked:
+            # 체결통보를 받을 수 없으므로 원장을 갱신할 수 없어 다음 잔고 조회 시 재동기화
+            position_ledger.mark_dirty()
+    
+    return data
 
 @mcp.tool(
     name="inquery-order-list",
@@ -423,43 +3357,10 @@ async def inquery_order_list(start_date: str, end_date: str):
     Returns:
         Dictionary containing order list information
     """
-    async with httpx.AsyncClient() as client:
+    async with kis_client() as client:
         token = await get_access_token(client)
-        
-        # Prepare request data
-        request_data = {
-            "CANO": os.environ["KIS_CANO"],  # 계좌번호
-            "ACNT_PRDT_CD": "01",  # 계좌상품코드
-            "INQR_STRT_DT": start_date,  # 조회시작일자
-            "INQR_END_DT": end_date,  # 조회종료일자
-            "SLL_BUY_DVSN_CD": "00",  # 매도매수구분
-            "INQR_DVSN": "00",  # 조회구분
-            "PDNO": "",  # 종목코드
-            "CCLD_DVSN": "00",  # 체결구분
-            "ORD_GNO_BRNO": "",  # 주문채번지점번호
-            "ODNO": "",  # 주문번호
-            "INQR_DVSN_3": "00",  # 조회구분3
-            "INQR_DVSN_1": "",  # 조회구분1
-            "CTX_AREA_FK100": "",  # 연속조회검색조건100
-            "CTX_AREA_NK100": "",  # 연속조회키100
-        }
-        
-        response = await client.get(
-            f"{TrIdManager.get_domain('order_list')}{ORDER_LIST_PATH}",
-            headers={
-                "content-type": CONTENT_TYPE,
-                "authorization": f"{AUTH_TYPE} {token}",
-                "appkey": os.environ["KIS_APP_KEY"],
-                "appsecret": os.environ["KIS_APP_SECRET"],
-                "tr_id": TrIdManager.get_tr_id("order_list")
-            },
-            params=request_data
-        )
-        
-        if response.status_code != 200:
-            raise Exception(f"Failed to get order list: {response.text}")
-        
-        return response.json()
+        data, _ = await fetch_order_list_page(client, token, start_date, end_date)
+        return data
 
 @mcp.tool(
     name="inquery-order-detail",
@@ -476,7 +3377,7 @@ async def inquery_order_detail(order_no: str, order_date: str):
     Returns:
         Dictionary containing order detail information
     """
-    async with httpx.AsyncClient() as client:
+    async with kis_client() as client:
         token = await get_access_token(client)
         
         # Prepare request data
@@ -512,7 +3413,44 @@ async def inquery_order_detail(order_no: str, order_date: str):
         if response.status_code != 200:
             raise Exception(f"Failed to get order detail: {response.text}")
         
-        return response.json()
+        return decode_response(response)
+
+@mcp.tool(
+    name="wait-order-fill",
+    description="Wait for an order to be filled, cancelled or rejected using real-time execution notices",
+)
+async def wait_order_fill(order_no: str, timeout: float = 30.0):
+    """
+    Wait for an order to reach a terminal state using real-time execution notices
+    
+    Requires KIS_HTS_ID (HTS login ID) for the execution notice subscription.
+    
+    Args:
+        order_no: Order number (ODNO) returned by order-stock
+        timeout: Maximum time to wait in seconds
+        
+    Returns:
+        Dictionary containing:
+        - order: Order state (odno, symbol, side, order_qty, filled_qty,
+          avg_fill_price, status, fills, updated_at) or None if no notice arrived
+        - terminal: Whether the order reached filled/cancelled/rejected
+        - timed_out: Whether the wait ended by timeout
+        - poll: True if notices may have been missed for this order (status
+          "unknown"); use inquery-order-detail instead of waiting
+    """
+    ensure_execution_notice_subscriber()
+    order = order_state_table.get(order_no)
+    if order is not None and order["status"] == "unknown":
+        # 주문 시점에 체결통보가 구독되지 않아 통보가 누락되었을 수 있음
+        return {"order": order, "terminal": False, "timed_out": False, "poll": True}
+    order = await order_state_table.wait_for_terminal(order_no, timeout)
+    terminal = order is not None and order["status"] in TERMINAL_ORDER_STATUSES
+    return {
+        "order": order,
+        "terminal": terminal,
+        "timed_out": not terminal,
+        "poll": False,
+    }
 
 @mcp.tool(
     name="inquery-stock-info",
@@ -528,37 +3466,11 @@ async def inquery_stock_info(symbol: str, start_date: str, end_date: str):
         end_date: End date (YYYYMMDD)
         
     Returns:
-        Dictionary containing daily stock price information
+        Dictionary containing daily stock price information and cache
+        {age, status} (served from cache and refreshed in the background once
+        older than KIS_HISTORY_SOFT_TTL)
     """
-    async with httpx.AsyncClient() as client:
-        token = await get_access_token(client)
-        
-        # Prepare request data
-        request_data = {
-            "FID_COND_MRKT_DIV_CODE": "J",  # 시장구분
-            "FID_INPUT_ISCD": symbol,  # 종목코드
-            "FID_INPUT_DATE_1": start_date,  # 시작일자
-            "FID_INPUT_DATE_2": end_date,  # 종료일자
-            "FID_PERIOD_DIV_CODE": "D",  # 기간분류코드
-            "FID_ORG_ADJ_PRC": "0",  # 수정주가원구분
-        }
-        
-        response = await client.get(
-            f"{TrIdManager.get_domain('stock_info')}{STOCK_INFO_PATH}",
-            headers={
-                "content-type": CONTENT_TYPE,
-                "authorization": f"{AUTH_TYPE} {token}",
-                "appkey": os.environ["KIS_APP_KEY"],
-                "appsecret": os.environ["KIS_APP_SECRET"],
-                "tr_id": TrIdManager.get_tr_id("stock_info")
-            },
-            params=request_data
-        )
-        
-        if response.status_code != 200:
-            raise Exception(f"Failed to get stock info: {response.text}")
-        
-        return response.json()
+    return await get_daily_prices("stock_info", fetch_stock_info, symbol, start_date, end_date)
 
 @mcp.tool(
     name="inquery-stock-history",
@@ -574,53 +3486,87 @@ async def inquery_stock_history(symbol: str, start_date: str, end_date: str):
         end_date: End date (YYYYMMDD)
         
     Returns:
-        Dictionary containing daily stock price history
+        Dictionary containing daily stock price history and cache {age, status}
     """
-    async with httpx.AsyncClient() as client:
-        token = await get_access_token(client)
-        
-        # Prepare request data
-        request_data = {
-            "FID_COND_MRKT_DIV_CODE": "J",  # 시장구분
-            "FID_INPUT_ISCD": symbol,  # 종목코드
-            "FID_INPUT_DATE_1": start_date,  # 시작일자
-            "FID_INPUT_DATE_2": end_date,  # 종료일자
-            "FID_PERIOD_DIV_CODE": "D",  # 기간분류코드
-            "FID_ORG_ADJ_PRC": "0",  # 수정주가원구분
-        }
-        
-        response = await client.get(
-            f"{TrIdManager.get_domain('stock_history')}{STOCK_HISTORY_PATH}",
-            headers={
-                "content-type": CONTENT_TYPE,
-                "authorization": f"{AUTH_TYPE} {token}",
-                "appkey": os.environ["KIS_APP_KEY"],
-                "appsecret": os.environ["KIS_APP_SECRET"],
-                "tr_id": TrIdManager.get_tr_id("stock_history")
-            },
-            params=request_data
-        )
-        
-        if response.status_code != 200:
-            raise Exception(f"Failed to get stock history: {response.text}")
+    return await get_daily_prices("stock_history", fetch_stock_history, symbol, start_date, end_date)
+
+@mcp.tool(
+    name="inquery-stock-minute-bars",
+    description="Get today's intraday minute bars (1/5/30 minutes) from Korea Investment & Securities",
+)
+async def inquery_stock_minute_bars(symbol: str, interval: int = 1, end_time: str = ""):
+    """
+    Get today's intraday minute bars
+    
+    Bars are cached per symbol and day, so repeated calls only fetch the
+    minutes since the last cached bar.
+    
+    Args:
+        symbol: Stock symbol (e.g. "005930")
+        interval: Bar interval in minutes (1, 5 or 30)
+        end_time: Latest bar time (HHMMSS, default: now, capped at market close)
         
-        return response.json()
+    Returns:
+        Dictionary containing:
+        - symbol, date, interval
+        - bars: [{time, open, high, low, close, volume, amount}] in ascending
+          time order (time is the bucket start for 5/30-minute bars; amount is
+          the accumulated trading value at the bar's close)
+        - fetched: Number of 1-minute bars fetched from KIS for this call
+    """
+    if interval not in MINUTE_BAR_INTERVALS:
+        raise ValueError(f"Unsupported interval: {interval}. Supported intervals: {MINUTE_BAR_INTERVALS}")
+    # 시각은 문자열로 비교하므로 HHMMSS 6자리만 허용 (예: "1030"은 잘못된 봉을 반환함)
+    if end_time and not is_hhmmss(end_time):
+        raise ValueError(f"Invalid end_time: {end_time!r} (expected HHMMSS, e.g. '103000')")
+    now = datetime.now()
+    day = now.strftime("%Y%m%d")
+    end_hour = min(end_time or now.strftime("%H%M%S"), MARKET_CLOSE_HOUR)
+    
+    async with kis_client() as client:
+        token = await get_access_token(client)
+        bars, fetched = await get_minute_bars(client, token, symbol, day, end_hour)
+    
+    return {
+        "symbol": symbol,
+        "date": day,
+        "interval": interval,
+        "bars": resample_minute_bars(bars, interval),
+        "fetched": fetched,
+    }
 
 @mcp.tool(
     name="inquery-stock-ask",
     description="Get stock ask price from Korea Investment & Securities",
 )
-async def inquery_stock_ask(symbol: str):
+async def inquery_stock_ask(symbol: str, layout: str = "flat", since_seq: int | None = None):
     """
     Get stock ask price from Korea Investment & Securities
     
+    Every call stores a versioned snapshot of the order book. Polling clients
+    can pass the seq of their last response as since_seq to receive only the
+    levels and fields that changed.
+    
     Args:
         symbol: Stock symbol (e.g. "005930")
+        layout: "flat" for the original KIS response (askp1..askp10 fields) or
+            "compact" for prices[]/qtys[] arrays with a seq number
+        since_seq: Return only changes since this seq (implies compact layout);
+            a full compact snapshot is returned if the seq is no longer retained
         
     Returns:
         Dictionary containing stock ask price information
+        - flat: output1 (10-level book), output2 (expected execution)
+        - compact: seq, full, time, ask/bid {prices, qtys}, total_ask_qty,
+          total_bid_qty, expected
+        - delta: seq, base_seq, full=false and changed ask/bid levels as
+          [level, price, qty], totals and expected fields
     """
-    async with httpx.AsyncClient() as client:
+    layout = layout.lower()
+    if layout not in ["flat", "compact"]:
+        raise ValueError('layout must be either "flat" or "compact"')
+
+    async with kis_client() as client:
         token = await get_access_token(client)
         
         # Prepare request data
@@ -644,7 +3590,233 @@ async def inquery_stock_ask(symbol: str):
         if response.status_code != 200:
             raise Exception(f"Failed to get stock ask: {response.text}")
         
-        return response.json()
+        data = decode_response(response)
+    
+    # 오류 응답은 빈 호가로 저장하지 않음 (since_seq 클라이언트에 잘못된 delta가 전달됨)
+    if data.get("rt_cd") != "0" or not data.get("output1"):
+        raise Exception(f"Failed to get stock ask: {data.get('msg1', response.text)}")
+    
+    order_book_store.update(compact_order_book(symbol, data))
+    if since_seq is not None:
+        return order_book_store.delta(symbol, since_seq)
+    if layout == "compact":
+        return order_book_store.snapshot(symbol)
+    return data
+
+@mcp.tool(
+    name="submit-history-job",
+    description="Start a background job fetching daily price history for multiple symbols",
+)
+async def submit_history_job(symbols: list[str], start_date: str, end_date: str, ctx: Context):
+    """
+    Start a background job fetching daily price history for multiple symbols
+    
+    Returns at once with a job ID. Use job-results to fetch results as each
+    symbol completes and job-status to check progress.
+    
+    Args:
+        symbols: Stock symbols (e.g. ["005930", "000660"])
+        start_date: Start date (YYYYMMDD)
+        end_date: End date (YYYYMMDD)
+        
+    Returns:
+        Dictionary containing job status (job_id, kind, status, progress, total)
+    """
+    if not symbols:
+        raise ValueError("symbols must not be empty")
+    job = job_manager.submit(
+        "stock-history",
+        {"symbols": list(dict.fromkeys(symbols)), "start_date": start_date, "end_date": end_date},
+        run_stock_history_job,
+        submitting_session(ctx)
+    )
+    return job.summary()
+
+@mcp.tool(
+    name="submit-order-export-job",
+    description="Start a background job exporting the full daily order list across all pages",
+)
+async def submit_order_export_job(start_date: str, end_date: str, ctx: Context):
+    """
+    Start a background job exporting the daily order list across all continuation pages
+    
+    Args:
+        start_date: Start date (YYYYMMDD)
+        end_date: End date (YYYYMMDD)
+        
+    Returns:
+        Dictionary containing job status (job_id, kind, status, progress, total)
+    """
+    job = job_manager.submit(
+        "order-export",
+        {"start_date": start_date, "end_date": end_date},
+        run_order_export_job,
+        submitting_session(ctx)
+    )
+    return job.summary()
+
+@mcp.tool(
+    name="job-status",
+    description="Get status and progress of a background job",
+)
+async def job_status(job_id: str):
+    """
+    Get status and progress of a background job
+    
+    Args:
+        job_id: Job ID returned by a submit-*-job tool
+        
+    Returns:
+        Dictionary containing job_id, kind, status (pending/running/completed/failed/cancelled),
+        progress, total, result_count, error, created_at, finished_at
+    """
+    return job_manager.get(job_id).summary()
+
+@mcp.tool(
+    name="job-results",
+    description="Fetch results of a background job from a cursor, optionally waiting for new results with progress notifications",
+)
+async def job_results(job_id: str, ctx: Context, cursor: int = 0, limit: int = 100, wait: float = 0.0):
+    """
+    Fetch partial or final results of a background job
+    
+    When wait > 0 and no results are available past the cursor, waits up to
+    wait seconds for new results, sending MCP progress notifications as the
+    job advances.
+    
+    Args:
+        job_id: Job ID returned by a submit-*-job tool
+        cursor: Index of the first result to return (next_cursor of the previous call)
+        limit: Maximum number of results to return
+        wait: Seconds to wait for new results if none are available
+        
+    Returns:
+        Dictionary containing:
+        - items: Results from cursor
+        - next_cursor: Cursor for the next call
+        - job: Job status
+        - done: Whether the job finished and all results were returned
+    """
+    job = job_manager.get(job_id)
+    deadline = time.monotonic() + max(wait, 0.0)
+    while len(job.results) <= cursor and not job.done:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        progress = job.progress
+        if await job.wait_for_change(cursor, progress, remaining) and job.progress != progress:
+            await ctx.report_progress(job.progress, job.total)
+    
+    items = job.results[cursor:cursor + limit]
+    next_cursor = cursor + len(items)
+    return {
+        "items": items,
+        "next_cursor": next_cursor,
+        "job": job.summary(),
+        "done": job.done and next_cursor >= len(job.results),
+    }
+
+@mcp.tool(
+    name="cancel-job",
+    description="Cancel a running background job",
+)
+async def cancel_job(job_id: str):
+    """
+    Cancel a running background job (results collected so far are kept)
+    
+    Args:
+        job_id: Job ID returned by a submit-*-job tool
+        
+    Returns:
+        Dictionary containing job status
+    """
+    job = job_manager.cancel(job_id)
+    if job.task is not None:
+        await asyncio.wait([job.task], timeout=5)
+    return job.summary()
+
+@mcp.tool(
+    name="cache-stats",
+    description="Get cache hit-rate statistics of the KIS MCP server",
+)
+async def cache_stats():
+    """
+    Get cache hit-rate statistics
+    
+    Returns:
+        Dictionary containing:
+        - backend: Cache backend in use
+        - process: Hits, misses, coalesced fetches and hit rate per namespace for this process
+        - all_processes: Same counters summed over every process (sqlite backend only)
+    """
+    return shared_cache.stats()
+
+@mcp.resource(
+    RESULT_URI_TEMPLATE,
+    name="large-result-page",
+    description="Page of a large tool result as NDJSON (first line: meta, then one row per line)",
+    mime_type="application/x-ndjson",
+)
+async def large_result_page(result_id: str, page: int) -> str:
+    """
+    Read one page of a large tool result
+    
+    Args:
+        result_id: Result ID from the large_result stub returned by the tool
+        page: Page number (0 to pages - 1)
+        
+    Returns:
+        NDJSON text of the page
+    """
+    return result_store.page(result_id, int(page))
+
+@mcp.custom_route("/admin/profile", methods=["GET"])
+async def profile_server(request: Request) -> Response:
+    """
+    Profile the running server and return a flamegraph-compatible profile
+    
+    Admin-only HTTP endpoint authenticated with "Authorization: Bearer
+    <KIS_ADMIN_TOKEN>" (not an MCP tool, so the secret never appears in MCP
+    messages or logs).
+    
+    Query parameters:
+        seconds: Profiling window in seconds (default 10, max 120)
+        mode: "sample" to sample the event loop thread's stack or "tasks" to
+            sample the await chain of every asyncio task
+        interval: Sampling interval in seconds (default 0.005, at least 0.001)
+        slow_callback_threshold: Report event loop callbacks running longer than this (default 0.1)
+        format: "json" (default) or "folded" for the folded stacks only
+        
+    Returns:
+        JSON containing:
+        - folded: Folded stacks ("frame;frame;frame count" per line) for
+          flamegraph.pl, speedscope or inferno
+        - top: Frames with the most samples
+        - loop_lag: Event loop lag statistics (seconds)
+        - slow_callbacks: Slowest event loop callbacks
+    """
+    if not ADMIN_TOKEN:
+        return PlainTextResponse("Profiling is disabled. Set KIS_ADMIN_TOKEN to enable it", status_code=404)
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        return PlainTextResponse("Invalid admin token", status_code=401)
+    if server_profiler.running:
+        return PlainTextResponse("A profiling session is already running", status_code=409)
+    
+    params = request.query_params
+    try:
+        result = await server_profiler.run(
+            float(params.get("seconds", "10")),
+            params.get("mode", "sample"),
+            float(params.get("interval", "0.005")),
+            float(params.get("slow_callback_threshold", "0.1")),
+        )
+    except ValueError as e:
+        return PlainTextResponse(str(e), status_code=400)
+    
+    if params.get("format") == "folded":
+        return PlainTextResponse(result["folded"])
+    return Response(json_dumps(result), media_type="application/json")
 
 # @mcp.tool(
 #     name="order-overseas-stock",
@@ -730,42 +3902,165 @@ async def inquery_stock_ask(symbol: str):
 
 @mcp.tool(
     name="inquery-overseas-stock-price",
-    description="Get overseas stock price from Korea Investment & Securities",
+    description="Get overseas stock price from Korea Investment & Securities (exchange is resolved automatically if market is omitted)",
 )
-async def inquery_overseas_stock_price(symbol: str, market: str):
+async def inquery_overseas_stock_price(symbol: str, market: str = ""):
     """
     Get overseas stock price
     
     Args:
         symbol: Stock symbol (e.g. "AAPL")
-        market: Market code ("NASD" for NASDAQ, "NYSE" for NYSE, etc.)
+        market: Market code ("NASD" for NASDAQ, "NYSE" for NYSE, etc.).
+            If omitted, candidate exchanges are probed concurrently and the
+            result is remembered in the symbol -> exchange cache.
         
     Returns:
-        Dictionary containing stock price information
+        Dictionary containing stock price information and the resolved market code
     """
-    async with httpx.AsyncClient() as client:
+    async with kis_client() as client:
         token = await get_access_token(client)
+        market, data = await resolve_overseas_price(client, token, symbol, market)
+    
+    return {**data, "market": market}
+
+@mcp.tool(
+    name="inquery-overseas-stock-prices",
+    description="Get prices of multiple overseas stocks at once, resolving exchanges automatically",
+)
+async def inquery_overseas_stock_prices(symbols: list[str], market: str = ""):
+    """
+    Get prices of multiple overseas stocks concurrently
+    
+    Args:
+        symbols: Stock symbols (e.g. ["AAPL", "TSLA", "0700"])
+        market: Market code applied to every symbol (omit to resolve per symbol)
         
-        response = await client.get(
-            f"{TrIdManager.get_domain('buy')}{OVERSEAS_STOCK_PRICE_PATH}",
-            headers={
-                "content-type": CONTENT_TYPE,
-                "authorization": f"{AUTH_TYPE} {token}",
-                "appkey": os.environ["KIS_APP_KEY"],
-                "appsecret": os.environ["KIS_APP_SECRET"],
-                "tr_id": "HHDFS00000300"
-            },
-            params={
-                "AUTH": "",
-                "EXCD": market,
-                "SYMB": symbol
-            }
-        )
+    Returns:
+        Dictionary containing:
+        - results: symbol -> {"market": market code, "output": price information}
+        - errors: symbol -> error message
+    """
+    results = {}
+    errors = {}
+    
+    async def fetch(symbol: str):
+        async def resolve():
+            # 공유된 조회는 먼저 요청한 도구보다 오래 살 수 있으므로 별도 클라이언트 사용
+            async with kis_client() as client:
+                token = await get_access_token(client)
+                # 종목 단위로 동시 조회하므로 거래소 탐색은 순차로 진행해 대기열 적체를 막음
+                return await resolve_overseas_price(client, token, symbol, market, probe_limit=1)
         
-        if response.status_code != 200:
-            raise Exception(f"Failed to get overseas stock price: {response.text}")
+        try:
+            resolved, data = await shared_cache.get_or_fetch(
+                "overseas_quote", f"{symbol.upper()}:{market.upper()}", QUOTE_CACHE_TTL, resolve
+            )
+            results[symbol] = {"market": resolved, "output": data.get("output")}
+        except Exception as e:
+            errors[symbol] = str(e)
+    
+    await gather_limited(fetch, dict.fromkeys(symbols))
+    
+    return {"results": results, "errors": errors}
+
+@mcp.tool(
+    name="inquery-overseas-balance",
+    description="Get overseas stock balance across exchanges from Korea Investment & Securities",
+)
+async def inquery_overseas_balance(markets: list[str] | None = None):
+    """
+    Get overseas stock balance, querying every exchange in parallel
+    
+    Args:
+        markets: Market codes to query (default: all markets in MARKET_CODES;
+            real accounts query all US exchanges through NASD)
+        
+    Returns:
+        Dictionary containing:
+        - output1: Holdings of every market (each row tagged with market)
+        - output2: Account summary per market
+        - errors: market -> error message
+    """
+    targets = overseas_markets(markets)
+    holdings = []
+    summaries = {}
+    errors = {}
+    
+    async with kis_client() as client:
+        token = await get_access_token(client)
+        
+        async def fetch(market: str):
+            try:
+                rows, pages = await fetch_overseas_pages(client, token, OVERSEAS_BALANCE_PATH, "overseas_balance", {
+                    "CANO": os.environ["KIS_CANO"],  # 계좌번호
+                    "ACNT_PRDT_CD": "01",  # 계좌상품코드
+                    "OVRS_EXCG_CD": market,  # 해외거래소코드
+                    "TR_CRCY_CD": MARKET_CURRENCIES[market],  # 거래통화코드
+                })
+            except Exception as e:
+                errors[market] = str(e)
+                return
+            holdings.extend({**row, "market": market} for row in rows)
+            if pages:
+                summaries[market] = pages[-1]
+        
+        await asyncio.gather(*(fetch(market) for market in targets))
+    
+    return {"output1": holdings, "output2": summaries, "errors": errors}
+
+@mcp.tool(
+    name="inquery-overseas-order-list",
+    description="Get overseas order list across exchanges from Korea Investment & Securities",
+)
+async def inquery_overseas_order_list(start_date: str, end_date: str, markets: list[str] | None = None):
+    """
+    Get overseas order/execution list, querying every exchange in parallel
+    
+    Virtual accounts only support querying all exchanges at once, so a single
+    request is made for them.
+    
+    Args:
+        start_date: Start date (YYYYMMDD, local date of the exchange)
+        end_date: End date (YYYYMMDD)
+        markets: Market codes to query (default: all markets in MARKET_CODES)
+        
+    Returns:
+        Dictionary containing:
+        - output: Orders of every market (each row tagged with market)
+        - errors: market -> error message
+    """
+    is_real_account = os.environ.get("KIS_ACCOUNT_TYPE", "REAL").upper() == "REAL"
+    targets = overseas_markets(markets) if is_real_account else [""]
+    orders = []
+    errors = {}
+    
+    async with kis_client() as client:
+        token = await get_access_token(client)
         
-        return response.json()
+        async def fetch(market: str):
+            try:
+                rows, _ = await fetch_overseas_pages(client, token, OVERSEAS_ORDER_LIST_PATH, "overseas_order_list", {
+                    "CANO": os.environ["KIS_CANO"],  # 계좌번호
+                    "ACNT_PRDT_CD": "01",  # 계좌상품코드
+                    "PDNO": "%" if is_real_account else "",  # 상품번호 (전종목)
+                    "ORD_STRT_DT": start_date,  # 주문시작일자
+                    "ORD_END_DT": end_date,  # 주문종료일자
+                    "SLL_BUY_DVSN": "00",  # 매도매수구분 (전체)
+                    "CCLD_NCCS_DVSN": "00",  # 체결미체결구분 (전체)
+                    "OVRS_EXCG_CD": market,  # 해외거래소코드
+                    "SORT_SQN": "DS",  # 정렬순서 (정순)
+                    "ORD_DT": "",  # 주문일자
+                    "ORD_GNO_BRNO": "",  # 주문채번지점번호
+                    "ODNO": "",  # 주문번호
+                })
+            except Exception as e:
+                errors[market or "ALL"] = str(e)
+                return
+            orders.extend({**row, "market": market or row.get("ovrs_excg_cd", "")} for row in rows)
+        
+        await asyncio.gather(*(fetch(market) for market in targets))
+    
+    return {"output": orders, "errors": errors}
 
 # if __name__ == "__main__":
 #     logger.info("Starting MCP server...")
@@ -0,0 +1,50 @@
+# tests/test_codec.py
+import json
+
+import httpx
+import pytest
+
+from kis_mcp_server_adk import server
+
+HISTORY = {
+    "rt_cd": "0", "msg_cd": "MCA00000", "msg1": "정상처리 되었습니다.",
+    "output1": {"hts_kor_isnm": "삼성전자"},
+    "output2": [{"stck_bsop_date": "20260105", "stck_clpr": "71000", "acml_vol": "100"}],
+}
+
+def test_round_trip_preserves_non_ascii():
+    encoded = server.json_dumps(HISTORY)
+    assert "삼성전자" in encoded
+    assert json.loads(encoded) == HISTORY
+
+def test_history_schema_round_trip():
+    decoded = server.json_loads(json.dumps(HISTORY).encode(), server.STOCK_HISTORY_SCHEMA)
+    assert decoded["output1"]["hts_kor_isnm"] == "삼성전자"
+    bar = json.loads(server.json_dumps(decoded["output2"][0]))
+    assert bar["stck_clpr"] == "71000"
+    assert bar["stck_bsop_date"] == "20260105"
+
+@pytest.mark.asyncio
+async def test_tool_results_are_encoded_by_codec():
+    async def runner(job):
+        await job.add_results([{"symbol": "005930"}])
+
+    job = server.job_manager.submit("test", {}, runner)
+    await job.task
+    content = await server.mcp.call_tool("job-status", {"job_id": job.id})
+    assert content[0].text == server.json_dumps(job.summary())
+
+    tool = server.mcp._tool_manager.get_tool("portfolio-snapshot")
+    assert tool.fn.__wrapped__ is server.portfolio_snapshot
+    assert "max_quote_age" in tool.parameters["properties"]
+
+@pytest.mark.parametrize("body", [
+    {"rt_cd": "0", "output1": None, "output2": None},
+    {"rt_cd": "0", "output1": {}, "output2": [{}]},
+    {"rt_cd": "0", "output2": [{"stck_bsop_date": "20260105", "stck_clpr": None}]},
+    {"rt_cd": "0", "output2": [{"stck_bsop_date": "20260105", "stck_clpr": 71000}]},
+])
+def test_typed_decode_matches_untyped(body):
+    response = httpx.Response(200, content=json.dumps(body).encode())
+    decoded = server.decode_response(response, server.STOCK_HISTORY_SCHEMA)
+    assert json.loads(server.json_dumps(decoded)) == body
@@ -0,0 +1,42 @@
+# tests/test_daily_prices.py
+import httpx
+import pytest
+
+from kis_mcp_server_adk import server
+from kis_mcp_server_adk.server import MemoryCacheBackend, SharedCache, get_daily_prices
+
+@pytest.fixture
+def kis_stub(monkeypatch):
+    """Route KIS calls to a programmable stand-in and isolate the cache"""
+    responses = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=responses.pop(0))
+
+    async def get_access_token(client):
+        return "token"
+
+    monkeypatch.setenv("KIS_APP_KEY", "key")
+    monkeypatch.setenv("KIS_APP_SECRET", "secret")
+    monkeypatch.setattr(server, "shared_cache", SharedCache(MemoryCacheBackend()))
+    monkeypatch.setattr(server, "get_access_token", get_access_token)
+    monkeypatch.setattr(server, "kis_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return responses
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("namespace, fetch", [
+    ("stock_info", server.fetch_stock_info),
+    ("stock_history", server.fetch_stock_history),
+])
+async def test_error_responses_are_not_cached(kis_stub, namespace, fetch):
+    kis_stub.append({"rt_cd": "1", "msg_cd": "EGW00201", "msg1": "초당 거래건수를 초과하였습니다."})
+    with pytest.raises(Exception, match="초당 거래건수"):
+        await get_daily_prices(namespace, fetch, "005930", "20240102", "20240131")
+
+    kis_stub.append({"rt_cd": "0", "output1": {}, "output2": []})
+    result = await get_daily_prices(namespace, fetch, "005930", "20240102", "20240131")
+    assert result["rt_cd"] == "0"
+    assert result["cache"]["status"] == "fetched"
+    cached = await get_daily_prices(namespace, fetch, "005930", "20240102", "20240131")
+    assert cached["cache"]["status"] == "fresh"
+    assert not kis_stub
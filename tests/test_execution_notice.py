@@ -0,0 +1,119 @@
+# tests/test_execution_notice.py
+import asyncio
+import json
+from base64 import b64encode
+
+import pytest
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import pad
+from websockets.asyncio.server import serve
+
+from kis_mcp_server_adk import server as server_module
+from kis_mcp_server_adk.server import (
+    EXECUTION_NOTICE_FIELDS,
+    ExecutionNoticeSubscriber,
+    OrderStateTable,
+)
+
+# 로컬 대역 서버가 사용할 세션 AES 키/IV
+AES_KEY = "k" * 32
+AES_IV = "i" * 16
+TR_ID = "H0STCNI0"
+
+# 녹화된 체결통보 (접수 -> 부분체결 -> 잔량체결)
+RECORDED_NOTICES = [
+    {"ODER_NO": "0000012345", "OODER_NO": "", "SELN_BYOV_CLS": "02", "RCTF_CLS": "0",
+     "STCK_SHRN_ISCD": "005930", "CNTG_QTY": "0", "CNTG_UNPR": "0", "STCK_CNTG_HOUR": "090101",
+     "RFUS_YN": "0", "CNTG_YN": "1", "ACPT_YN": "1", "ODER_QTY": "10", "ODER_PRC": "70000"},
+    {"ODER_NO": "0000012345", "OODER_NO": "", "SELN_BYOV_CLS": "02", "RCTF_CLS": "0",
+     "STCK_SHRN_ISCD": "005930", "CNTG_QTY": "4", "CNTG_UNPR": "70000", "STCK_CNTG_HOUR": "090105",
+     "RFUS_YN": "0", "CNTG_YN": "2", "ACPT_YN": "2", "ODER_QTY": "10", "ODER_PRC": "70000"},
+    {"ODER_NO": "0000012345", "OODER_NO": "", "SELN_BYOV_CLS": "02", "RCTF_CLS": "0",
+     "STCK_SHRN_ISCD": "005930", "CNTG_QTY": "6", "CNTG_UNPR": "69900", "STCK_CNTG_HOUR": "090109",
+     "RFUS_YN": "0", "CNTG_YN": "2", "ACPT_YN": "2", "ODER_QTY": "10", "ODER_PRC": "70000"},
+]
+
+def encrypt_notice(notice: dict) -> str:
+    plain = "^".join(notice.get(field, "") for field in EXECUTION_NOTICE_FIELDS)
+    cipher = AES.new(AES_KEY.encode(), AES.MODE_CBC, AES_IV.encode())
+    return b64encode(cipher.encrypt(pad(plain.encode(), AES.block_size))).decode()
+
+async def stand_in_handler(websocket):
+    """구독 요청을 받으면 키/IV를 내려주고 녹화된 체결통보를 전송하는 KIS 대역"""
+    request = json.loads(await websocket.recv())
+    assert request["body"]["input"]["tr_id"] == TR_ID
+    await websocket.send(json.dumps({
+        "header": {"tr_id": TR_ID, "tr_key": "testid", "encrypt": "N"},
+        "body": {"rt_cd": "0", "msg_cd": "OPSP0000", "msg1": "SUBSCRIBE SUCCESS",
+                 "output": {"iv": AES_IV, "key": AES_KEY}}
+    }))
+    await websocket.send(json.dumps({"header": {"tr_id": "PINGPONG", "datetime": "20260101090100"}}))
+    assert json.loads(await websocket.recv())["header"]["tr_id"] == "PINGPONG"
+    for notice in RECORDED_NOTICES:
+        await websocket.send(f"1|{TR_ID}|001|{encrypt_notice(notice)}")
+    await websocket.wait_closed()
+
+@pytest.mark.asyncio
+async def test_order_reaches_filled_from_recorded_notices():
+    async with serve(stand_in_handler, "127.0.0.1", 0) as server:
+        port = server.sockets[0].getsockname()[1]
+        table = OrderStateTable()
+        await table.register("12345", "005930", "buy", 10)
+        subscriber = ExecutionNoticeSubscriber(
+            table, url=f"ws://127.0.0.1:{port}", approval_key="test-approval", hts_id="testid"
+        )
+        subscriber.tr_id = TR_ID
+        subscriber.start()
+        try:
+            order = await table.wait_for_terminal("0000012345", timeout=5)
+        finally:
+            await subscriber.stop()
+
+    assert order["status"] == "filled"
+    assert order["filled_qty"] == 10
+    assert order["avg_fill_price"] == 69940
+    assert [fill["qty"] for fill in order["fills"]] == [4, 6]
+
+@pytest.mark.asyncio
+async def test_wait_for_terminal_times_out_on_partial_fill():
+    table = OrderStateTable()
+    await table.apply_notice(RECORDED_NOTICES[1])
+    order = await table.wait_for_terminal("12345", timeout=0.05)
+    assert order["status"] == "partially_filled"
+    assert order["filled_qty"] == 4
+
+@pytest.mark.asyncio
+async def test_cancel_notice_marks_original_order_cancelled():
+    table = OrderStateTable()
+    await table.apply_notice(RECORDED_NOTICES[0])
+    await table.apply_notice({**RECORDED_NOTICES[0], "ODER_NO": "0000012399",
+                              "OODER_NO": "0000012345", "RCTF_CLS": "2"})
+    assert table.get("12345")["status"] == "cancelled"
+
+@pytest.mark.asyncio
+async def test_orders_wait_for_subscription_started_at_startup(monkeypatch):
+    async with serve(stand_in_handler, "127.0.0.1", 0) as server:
+        port = server.sockets[0].getsockname()[1]
+        table = OrderStateTable()
+        subscriber = ExecutionNoticeSubscriber(
+            table, url=f"ws://127.0.0.1:{port}", approval_key="test-approval", hts_id="testid"
+        )
+        subscriber.tr_id = TR_ID
+        monkeypatch.setenv("KIS_HTS_ID", "testid")
+        monkeypatch.setattr(server_module, "_execution_notice_subscriber", subscriber)
+
+        await server_module.start_background_services()
+        try:
+            assert subscriber.running
+            assert await server_module.wait_for_execution_notices(timeout=5)
+        finally:
+            await server_module.stop_background_services()
+        assert not subscriber.running
+
+@pytest.mark.asyncio
+async def test_untracked_order_is_marked_unknown(monkeypatch):
+    monkeypatch.delenv("KIS_HTS_ID", raising=False)
+    assert not await server_module.wait_for_execution_notices(timeout=0.01)
+    table = OrderStateTable()
+    await table.register("555", "005930", "buy", 1, tracked=False)
+    assert table.get("555")["status"] == "unknown"
@@ -171,4 +171,23 @@ async def test_05_stock_history_chart(run_test_server):
         data = parse_result(result)
         
         assert data is not None
-        print("[성공] 차트용 주가 히스토리 조회 완료")
\ No newline at end of file
+        print("[성공] 차트용 주가 히스토리 조회 완료")
+
+@pytest.mark.asyncio
+async def test_06_portfolio_snapshot(run_test_server):
+    """
+    [포트폴리오 스냅샷] 잔고 + 보유종목 현재가를 한 번에 조회
+    """
+    server_url = run_test_server
+    
+    async with Client(server_url) as client:
+        print("\n[Action] 'portfolio-snapshot' 툴 호출...")
+        result = await client.call_tool("portfolio-snapshot", {})
+        data = parse_result(result)
+        
+        assert data is not None
+        assert "rows" in data and "summary" in data
+        assert len(data["columns"]) == 10
+        for row in data["rows"]:
+            assert len(row) == len(data["columns"])
+        print(f"[성공] 보유종목 {len(data['rows'])}개, 총평가금액: {data['summary']['tot_evlu_amt']}")
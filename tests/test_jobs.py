@@ -0,0 +1,98 @@
+# tests/test_jobs.py
+import asyncio
+
+import httpx
+import pytest
+
+from kis_mcp_server_adk import server
+from kis_mcp_server_adk.server import JobManager, request_priority_class
+
+async def counting_runner(job):
+    await job.set_total(3)
+    for i in range(3):
+        await asyncio.sleep(0.01)
+        await job.add_results([{"index": i}])
+
+async def failing_runner(job):
+    await job.add_results([{"index": 0}])
+    raise Exception("upstream error")
+
+async def blocking_runner(job):
+    await job.add_results([{"index": 0}])
+    await asyncio.Future()
+
+@pytest.mark.asyncio
+async def test_job_results_arrive_incrementally():
+    manager = JobManager()
+    job = manager.submit("test", {}, counting_runner)
+    assert job.status == "pending"
+
+    assert await job.wait_for_change(0, 0, timeout=1)
+    assert job.results[:1] == [{"index": 0}]
+
+    await job.task
+    summary = manager.get(job.id).summary()
+    assert summary["status"] == "completed"
+    assert summary["progress"] == summary["total"] == 3
+    assert [item["index"] for item in job.results] == [0, 1, 2]
+
+@pytest.mark.asyncio
+async def test_failed_job_keeps_partial_results():
+    manager = JobManager()
+    job = manager.submit("test", {}, failing_runner)
+    await job.task
+    assert job.status == "failed"
+    assert job.error == "upstream error"
+    assert len(job.results) == 1
+
+@pytest.mark.asyncio
+async def test_cancel_job():
+    manager = JobManager()
+    job = manager.submit("test", {}, blocking_runner)
+    await asyncio.sleep(0.01)
+    manager.cancel(job.id)
+    await job.task
+    assert job.status == "cancelled"
+    assert len(job.results) == 1
+
+@pytest.mark.asyncio
+async def test_finished_jobs_are_pruned_after_retention():
+    manager = JobManager(retention=0)
+    job = manager.submit("test", {}, counting_runner)
+    await job.task
+    manager.submit("test", {}, counting_runner)
+    with pytest.raises(ValueError):
+        manager.get(job.id)
+
+@pytest.mark.asyncio
+async def test_jobs_request_the_bulk_priority_class(monkeypatch):
+    priorities = []
+    pages = [({"output1": [{"odno": "1"}], "ctx_area_fk100": "fk", "ctx_area_nk100": "nk"}, "M"),
+             ({"output1": [{"odno": "2"}]}, "D")]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        priorities.append((request.url.path, request_priority_class(request)))
+        if request.url.path == server.ORDER_LIST_PATH:
+            body, tr_cont = pages.pop(0)
+            return httpx.Response(200, json={"rt_cd": "0", **body}, headers={"tr_cont": tr_cont})
+        return httpx.Response(200, json={"rt_cd": "0", "output1": {}, "output2": []})
+
+    async def get_access_token(client):
+        return "token"
+
+    for name in ("KIS_APP_KEY", "KIS_APP_SECRET", "KIS_CANO"):
+        monkeypatch.setenv(name, "test")
+    monkeypatch.setattr(server, "get_access_token", get_access_token)
+    monkeypatch.setattr(server, "kis_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    manager = JobManager()
+    export = manager.submit("order-export", {"start_date": "20240101", "end_date": "20240131"},
+                            server.run_order_export_job)
+    history = manager.submit("stock-history", {"symbols": ["005930", "000660"], "start_date": "20240101",
+                                               "end_date": "20240131"}, server.run_stock_history_job)
+    await asyncio.gather(export.task, history.task)
+
+    assert [item["odno"] for item in export.results] == ["1", "2"]
+    assert len(history.results) == 2
+    assert len(priorities) == 4
+    assert {priority for _, priority in priorities} == {"bulk"}
@@ -0,0 +1,95 @@
+# tests/test_large_results.py
+import json
+
+import httpx
+import pytest
+
+from kis_mcp_server_adk.server import CompressionMiddleware, KisMCP, ResultStore, accepted_encoding
+
+def test_large_result_is_split_into_ndjson_pages():
+    store = ResultStore(page_bytes=1024)
+    result = {"rt_cd": "0", "output1": [{"odno": str(i), "pad": "x" * 40} for i in range(100)], "output2": []}
+    stub = store.put("inquery-order-list", result, 6000)
+    assert stub["pages"] > 1
+    assert stub["first_page"] == stub["uri_template"].format(page=0)
+
+    lines = []
+    for page in range(stub["pages"]):
+        text = store.page(stub["first_page"].split("/")[-2], page)
+        assert len(text) <= 1024
+        lines.extend(json.loads(line) for line in text.splitlines())
+    assert lines[0] == {"meta": {"rt_cd": "0"}, "fields": {"output1": 100, "output2": 0}}
+    assert [line["row"]["odno"] for line in lines[1:]] == [str(i) for i in range(100)]
+    with pytest.raises(ValueError):
+        store.page("unknown", 0)
+
+def test_result_store_is_bounded():
+    store = ResultStore(max_bytes=3000, page_bytes=1024)
+    first = store.put("a", {"items": ["x" * 100] * 20}, 2200)
+    second = store.put("b", {"items": ["y" * 100] * 20}, 2200)
+    with pytest.raises(ValueError, match="expired"):
+        store.page(first["first_page"].split("/")[-2], 0)
+    assert store.page(second["first_page"].split("/")[-2], 0)
+
+def test_accepted_encoding():
+    assert accepted_encoding("gzip, deflate, br") == "gzip"
+    assert accepted_encoding("zstd;q=0, gzip") == "gzip"
+    assert accepted_encoding("identity") is None
+
+async def streaming_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", b"text/event-stream")]})
+    for i in range(3):
+        await send({"type": "http.response.body", "body": f"data: {i}\n\n".encode(), "more_body": True})
+    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+@pytest.mark.asyncio
+async def test_streamed_responses_are_compressed_per_chunk():
+    transport = httpx.ASGITransport(app=CompressionMiddleware(streaming_app))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        raw = await client.get("/mcp/", headers={"Accept-Encoding": "gzip"})
+        assert raw.headers["content-encoding"] == "gzip"
+        assert raw.headers["vary"] == "Accept-Encoding"
+        assert raw.text == "data: 0\n\ndata: 1\n\ndata: 2\n\n"
+
+        plain = await client.get("/mcp/", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in plain.headers
+        assert plain.text == raw.text
+
+@pytest.mark.asyncio
+async def test_small_responses_are_not_compressed():
+    async def small_app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-length", b"2")]})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    transport = httpx.ASGITransport(app=CompressionMiddleware(small_app))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.text == "{}"
+
+@pytest.mark.asyncio
+async def test_add_tool_forwards_registration_arguments():
+    app = KisMCP("test")
+
+    async def echo(value: int):
+        return {"value": value}
+
+    app.add_tool(echo, "echo-tool", description="Echo a value")
+    tool = app._tool_manager.get_tool("echo-tool")
+    assert tool.description == "Echo a value"
+    assert json.loads(await tool.run({"value": 3})) == {"value": 3}
+
+def test_large_dict_fields_are_split_into_entries():
+    store = ResultStore(page_bytes=1024)
+    results = {str(i): {"symbol": f"{i:06d}", "pad": "x" * 40} for i in range(100)}
+    stub = store.put("inquery-overseas-stock-prices", {"results": results, "errors": {}}, 7000)
+    result_id = stub["first_page"].split("/")[-2]
+
+    lines = []
+    for page in range(stub["pages"]):
+        text = store.page(result_id, page)
+        assert len(text) <= 1024
+        lines.extend(json.loads(line) for line in text.splitlines())
+    assert lines[0] == {"meta": {"errors": {}}, "fields": {}, "maps": {"results": 100}}
+    assert {line["key"]: line["row"] for line in lines[1:]} == results
@@ -0,0 +1,72 @@
+# tests/test_minute_bars.py
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+
+from kis_mcp_server_adk import server
+from kis_mcp_server_adk.server import MemoryCacheBackend, SharedCache, get_minute_bars, resample_minute_bars
+
+DAY = "20250102"
+
+def minute_chart(last_hour: str, requests: list) -> httpx.MockTransport:
+    """Stand-in for inquire-time-itemchartprice: 30 bars per page, newest first, 1 bar per minute from 09:00"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        hour = min(request.url.params["FID_INPUT_HOUR_1"], last_hour)
+        requests.append(hour)
+        end = datetime.strptime(hour[:4], "%H%M")
+        rows = []
+        for i in range(30):
+            time = end - timedelta(minutes=i)
+            if time < datetime.strptime("0900", "%H%M"):
+                break
+            minute = time.hour * 60 + time.minute
+            rows.append({"stck_bsop_date": DAY, "stck_cntg_hour": time.strftime("%H%M00"),
+                         "stck_oprc": str(minute), "stck_hgpr": str(minute + 5), "stck_lwpr": str(minute - 5),
+                         "stck_prpr": str(minute + 1), "cntg_vol": "10", "acml_tr_pbmn": str(minute * 100)})
+        return httpx.Response(200, json={"rt_cd": "0", "output2": rows})
+    return httpx.MockTransport(handler)
+
+@pytest.fixture(autouse=True)
+def isolated_cache(monkeypatch):
+    monkeypatch.setenv("KIS_APP_KEY", "key")
+    monkeypatch.setenv("KIS_APP_SECRET", "secret")
+    monkeypatch.setattr(server, "shared_cache", SharedCache(MemoryCacheBackend()))
+    monkeypatch.setattr(server, "minute_bar_locks", {})
+
+@pytest.mark.asyncio
+async def test_pages_backward_then_fetches_incrementally():
+    requests = []
+    async with httpx.AsyncClient(transport=minute_chart("100000", requests)) as client:
+        bars, fetched = await get_minute_bars(client, "token", "005930", DAY, "100000")
+        assert [bars[0]["time"], bars[-1]["time"]] == ["090000", "100000"]
+        assert len(bars) == fetched == 61
+        assert requests == ["100000", "093000", "090000"]
+
+        requests.clear()
+        bars, fetched = await get_minute_bars(client, "token", "005930", DAY, "095000")
+        assert bars[-1]["time"] == "095000" and fetched == 0 and requests == []
+
+    requests.clear()
+    async with httpx.AsyncClient(transport=minute_chart("100500", requests)) as client:
+        bars, fetched = await get_minute_bars(client, "token", "005930", DAY, "100500")
+    # 마지막 캐시 분봉(10:00)부터 다시 조회
+    assert requests == ["100500"]
+    assert fetched == 6
+    assert len(bars) == 66
+    assert [bar["time"] for bar in bars] == sorted({bar["time"] for bar in bars})
+
+def test_resample_minute_bars():
+    bars = [{"time": f"09{m:02d}00", "open": m, "high": m + 5, "low": m - 5, "close": m + 1,
+             "volume": 10, "amount": m * 100} for m in range(12)]
+    five = resample_minute_bars(bars, 5)
+    assert [bar["time"] for bar in five] == ["090000", "090500", "091000"]
+    assert five[1] == {"time": "090500", "open": 5, "high": 14, "low": 0, "close": 10, "volume": 50, "amount": 900}
+    assert resample_minute_bars(bars, 30)[0]["volume"] == 120
+    assert resample_minute_bars(bars, 1) is bars
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("end_time", ["1030", "10300", "10:30:00", "250000", "106000"])
+async def test_invalid_end_time_is_rejected(end_time):
+    with pytest.raises(ValueError, match="HHMMSS"):
+        await server.inquery_stock_minute_bars("005930", end_time=end_time)
@@ -0,0 +1,72 @@
+# tests/test_order_book.py
+import httpx
+import pytest
+
+from kis_mcp_server_adk import server
+from kis_mcp_server_adk.server import OrderBookStore, compact_order_book
+
+def ask_response(best_ask_qty: str = "100", hour: str = "090000") -> dict:
+    book = {"aspr_acpt_hour": hour, "total_askp_rsqn": "5500", "total_bidp_rsqn": "6000"}
+    for level in range(1, 11):
+        book[f"askp{level}"] = str(70000 + level * 100)
+        book[f"bidp{level}"] = str(70000 - (level - 1) * 100)
+        book[f"askp_rsqn{level}"] = str(level * 100)
+        book[f"bidp_rsqn{level}"] = str(level * 110)
+    book["askp_rsqn1"] = best_ask_qty
+    return {"output1": book, "output2": {"antc_cnpr": "70100", "antc_vol": "0"}}
+
+def test_compact_layout():
+    snapshot = compact_order_book("005930", ask_response())
+    assert snapshot["ask"]["prices"][:2] == [70100, 70200]
+    assert snapshot["bid"]["qtys"][0] == 110
+    assert len(snapshot["ask"]["prices"]) == 10
+    assert snapshot["expected"]["antc_cnpr"] == 70100
+
+def test_delta_contains_only_changed_levels():
+    store = OrderBookStore()
+    base_seq = store.update(compact_order_book("005930", ask_response()))
+    seq = store.update(compact_order_book("005930", ask_response(best_ask_qty="250")))
+    delta = store.delta("005930", base_seq)
+    assert seq == base_seq + 1
+    assert delta["full"] is False
+    assert delta["ask"] == [[1, 70100, 250]]
+    assert "bid" not in delta and "expected" not in delta
+
+def test_unchanged_book_keeps_seq():
+    store = OrderBookStore()
+    seq = store.update(compact_order_book("005930", ask_response(hour="090000")))
+    assert store.update(compact_order_book("005930", ask_response(hour="090001"))) == seq
+    assert store.delta("005930", seq) == {"symbol": "005930", "seq": seq, "base_seq": seq,
+                                          "full": False, "time": "090000"}
+
+def test_expired_seq_returns_full_snapshot():
+    store = OrderBookStore(history=2)
+    first = store.update(compact_order_book("005930", ask_response("1")))
+    store.update(compact_order_book("005930", ask_response("2")))
+    store.update(compact_order_book("005930", ask_response("3")))
+    delta = store.delta("005930", first)
+    assert delta["full"] is True
+    assert delta["ask"]["qtys"][0] == 3
+
+@pytest.mark.asyncio
+async def test_error_response_does_not_update_store(monkeypatch):
+    responses = [{"rt_cd": "0", **ask_response()},
+                 {"rt_cd": "1", "msg_cd": "EGW00201", "msg1": "초당 거래건수를 초과하였습니다."}]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=responses.pop(0))
+
+    async def get_access_token(client):
+        return "token"
+
+    store = OrderBookStore()
+    monkeypatch.setenv("KIS_APP_KEY", "key")
+    monkeypatch.setenv("KIS_APP_SECRET", "secret")
+    monkeypatch.setattr(server, "order_book_store", store)
+    monkeypatch.setattr(server, "get_access_token", get_access_token)
+    monkeypatch.setattr(server, "kis_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    snapshot = await server.inquery_stock_ask("005930", layout="compact")
+    with pytest.raises(Exception, match="초당 거래건수"):
+        await server.inquery_stock_ask("005930", since_seq=snapshot["seq"])
+    assert store.snapshot("005930") == snapshot
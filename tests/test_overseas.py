@@ -0,0 +1,102 @@
+# tests/test_overseas.py
+import asyncio
+
+import httpx
+import pytest
+
+from kis_mcp_server_adk import server
+from kis_mcp_server_adk.server import (
+    MemoryCacheBackend,
+    SharedCache,
+    fetch_overseas_pages,
+    normalize_market,
+    resolve_overseas_price,
+)
+
+@pytest.fixture
+def exchange_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("KIS_APP_KEY", "key")
+    monkeypatch.setenv("KIS_APP_SECRET", "secret")
+    monkeypatch.setattr(server, "EXCHANGE_CACHE_FILE", tmp_path / "exchange_cache.json")
+    monkeypatch.setattr(server, "_exchange_cache", None)
+    return tmp_path / "exchange_cache.json"
+
+def price_client(listings: dict, probes: list) -> httpx.AsyncClient:
+    def handler(request: httpx.Request) -> httpx.Response:
+        excd = request.url.params["EXCD"]
+        probes.append(excd)
+        last = "185.5" if excd in listings.get(request.url.params["SYMB"], ()) else ""
+        return httpx.Response(200, json={"rt_cd": "0", "output": {"last": last}})
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+def test_normalize_market():
+    assert normalize_market("nasd") == "NASD"
+    assert normalize_market("HKS") == "SEHK"
+    with pytest.raises(ValueError):
+        normalize_market("KRX")
+
+@pytest.mark.asyncio
+async def test_resolve_probes_candidates_and_caches(exchange_cache):
+    probes = []
+    async with price_client({"IBM": {"NYS"}}, probes) as client:
+        market, data = await resolve_overseas_price(client, "token", "ibm")
+        assert market == "NYSE"
+        assert data["output"]["last"] == "185.5"
+        assert sorted(probes) == ["AMS", "HNX", "HSX", "NAS", "NYS"]
+        assert '"IBM": "NYSE"' in exchange_cache.read_text()
+
+        probes.clear()
+        assert (await resolve_overseas_price(client, "token", "IBM"))[0] == "NYSE"
+        assert probes == ["NYS"]
+
+@pytest.mark.asyncio
+async def test_unlisted_symbol_raises(exchange_cache):
+    async with price_client({}, []) as client:
+        with pytest.raises(Exception, match="Could not resolve exchange"):
+            await resolve_overseas_price(client, "token", "0700")
+
+@pytest.mark.asyncio
+async def test_overseas_pages_follow_continuation(monkeypatch):
+    monkeypatch.setenv("KIS_APP_KEY", "key")
+    monkeypatch.setenv("KIS_APP_SECRET", "secret")
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.params["CTX_AREA_NK200"] == "":
+            return httpx.Response(200, headers={"tr_cont": "M"},
+                                  json={"rt_cd": "0", "output1": [{"ovrs_pdno": "AAPL"}], "output2": {"page": 1},
+                                        "ctx_area_fk200": "F1 ", "ctx_area_nk200": "N1 "})
+        assert request.headers["tr_cont"] == "N"
+        return httpx.Response(200, json={"rt_cd": "0", "output1": [{"ovrs_pdno": "TSLA"}], "output2": {"page": 2}})
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        rows, summaries = await fetch_overseas_pages(client, "token", server.OVERSEAS_BALANCE_PATH,
+                                                     "overseas_balance", {"OVRS_EXCG_CD": "NASD"})
+    assert [row["ovrs_pdno"] for row in rows] == ["AAPL", "TSLA"]
+    assert summaries == [{"page": 1}, {"page": 2}]
+
+@pytest.mark.asyncio
+async def test_batch_prices_bound_exchange_probes(exchange_cache, monkeypatch):
+    in_flight = []
+    peak = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal peak
+        in_flight.append(request)
+        peak = max(peak, len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.remove(request)
+        last = "100.0" if request.url.params["EXCD"] == "AMS" else ""
+        return httpx.Response(200, json={"rt_cd": "0", "output": {"last": last}})
+
+    async def get_access_token(client):
+        return "token"
+
+    monkeypatch.setattr(server, "shared_cache", SharedCache(MemoryCacheBackend()))
+    monkeypatch.setattr(server, "get_access_token", get_access_token)
+    monkeypatch.setattr(server, "kis_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    symbols = ["SPY", "QQQ", "DIA", "IWM", "GLD", "TLT"]
+    result = await server.inquery_overseas_stock_prices(symbols)
+    assert result["errors"] == {}
+    assert {item["market"] for item in result["results"].values()} == {"AMEX"}
+    assert peak <= server.SCREEN_CONCURRENCY
@@ -0,0 +1,106 @@
+# tests/test_portfolio.py
+import httpx
+import pytest
+
+from kis_mcp_server_adk import server
+from kis_mcp_server_adk.server import MemoryCacheBackend, PositionLedger, SharedCache
+
+BALANCE_PAGES = [
+    {"output1": [{"pdno": "005930", "prdt_name": "삼성전자", "hldg_qty": "10", "pchs_amt": "700000",
+                  "pchs_avg_pric": "70000.0000", "prpr": "71000"}],
+     "output2": [], "ctx_area_fk100": "FK1  ", "ctx_area_nk100": "NK1  "},
+    {"output1": [{"pdno": "000660", "prdt_name": "SK하이닉스", "hldg_qty": "2", "pchs_amt": "300000",
+                  "pchs_avg_pric": "150000.0000", "prpr": "180000"},
+                 {"pdno": "035420", "prdt_name": "NAVER", "hldg_qty": "5", "pchs_amt": "1000000",
+                  "pchs_avg_pric": "200000.0000", "prpr": "190000"}],
+     "output2": [{"prvs_rcdl_excc_amt": "1000000"}]},
+]
+QUOTES = {"005930": "72000", "000660": "160000"}
+
+@pytest.fixture
+def kis_stub(monkeypatch):
+    """Serve a two-page balance and quotes (035420 fails) through a mock transport"""
+    balance_requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == server.BALANCE_PATH:
+            balance_requests.append(request)
+            page = len(balance_requests) - 1
+            return httpx.Response(200, json={"rt_cd": "0", **BALANCE_PAGES[page]},
+                                  headers={"tr_cont": "M" if page == 0 else "D"})
+        if request.url.path == server.ORDER_LIST_PATH:
+            return httpx.Response(200, json={"rt_cd": "0", "output1": []})
+        symbol = request.url.params["fid_input_iscd"]
+        if symbol not in QUOTES:
+            return httpx.Response(500, text="upstream error")
+        return httpx.Response(200, json={"rt_cd": "0", "output": {"stck_prpr": QUOTES[symbol]}})
+
+    async def get_access_token(client):
+        return "token"
+
+    for name in ("KIS_APP_KEY", "KIS_APP_SECRET", "KIS_CANO"):
+        monkeypatch.setenv(name, "test")
+    monkeypatch.setattr(server, "position_ledger", PositionLedger())
+    monkeypatch.setattr(server, "shared_cache", SharedCache(MemoryCacheBackend()))
+    monkeypatch.setattr(server, "get_access_token", get_access_token)
+    monkeypatch.setattr(server, "kis_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return balance_requests
+
+@pytest.mark.asyncio
+async def test_snapshot_pages_balance_and_values_holdings(kis_stub):
+    snapshot = await server.portfolio_snapshot()
+
+    assert len(kis_stub) == 2
+    continuation = kis_stub[1]
+    assert continuation.headers["tr_cont"] == "N"
+    assert continuation.url.params["CTX_AREA_FK100"] == "FK1"
+    assert continuation.url.params["CTX_AREA_NK100"] == "NK1"
+
+    rows = {row[0]: dict(zip(snapshot["columns"], row)) for row in snapshot["rows"]}
+    assert list(rows) == ["005930", "000660", "035420"]
+    assert rows["005930"]["prpr"] == 72000
+    assert rows["005930"]["evlu_amt"] == 720000
+    assert rows["005930"]["evlu_pfls_amt"] == 20000
+    assert rows["005930"]["evlu_pfls_rt"] == 2.86
+    assert rows["000660"]["evlu_pfls_rt"] == 6.67
+    assert [row["weight"] for row in rows.values()] == [0.2408, 0.107, 0.3177]
+
+    assert snapshot["stale_symbols"] == ["035420"]
+    assert rows["035420"]["prpr"] == 190000
+    assert rows["035420"]["evlu_pfls_amt"] == -50000
+
+    assert snapshot["summary"] == {
+        "cash": 1000000,
+        "stock_evlu_amt": 1990000,
+        "pchs_amt": 2000000,
+        "evlu_pfls_amt": -10000,
+        "evlu_pfls_rt": -0.5,
+        "tot_evlu_amt": 2990000,
+    }
+
+@pytest.mark.asyncio
+async def test_snapshot_quotes_stay_within_the_queue_deadline(monkeypatch):
+    holdings = [{"pdno": f"{i:06d}", "hldg_qty": "1", "pchs_amt": "1000", "prpr": "1000"} for i in range(15)]
+    ledger = PositionLedger()
+    ledger.seed(holdings, {"prvs_rcdl_excc_amt": "0"})
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={"rt_cd": "0", "output": {"stck_prpr": "1100"}})
+
+    async def get_access_token(client):
+        return "token"
+
+    # 초당 20건, 대기 0.5초: 15건을 한꺼번에 대기열에 넣으면 뒤쪽 시세가 폐기됨
+    scheduler = server.RequestScheduler(requests_per_second=20)
+    monkeypatch.setenv("KIS_APP_KEY", "key")
+    monkeypatch.setenv("KIS_APP_SECRET", "secret")
+    monkeypatch.setattr(server, "QUOTE_QUEUE_DEADLINE", 0.5)
+    monkeypatch.setattr(server, "position_ledger", ledger)
+    monkeypatch.setattr(server, "shared_cache", SharedCache(MemoryCacheBackend()))
+    monkeypatch.setattr(server, "get_access_token", get_access_token)
+    monkeypatch.setattr(server, "kis_client", lambda: httpx.AsyncClient(
+        transport=server.ScheduledTransport(scheduler, httpx.MockTransport(handler))))
+
+    snapshot = await server.portfolio_snapshot()
+    assert snapshot["stale_symbols"] == []
+    assert {row[4] for row in snapshot["rows"]} == {1100}
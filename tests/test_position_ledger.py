@@ -0,0 +1,122 @@
+# tests/test_position_ledger.py
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from kis_mcp_server_adk import server
+from kis_mcp_server_adk.server import ExecutionNoticeSubscriber, OrderStateTable, PositionLedger
+
+HOLDINGS = [
+    {"pdno": "005930", "prdt_name": "삼성전자", "hldg_qty": "10", "pchs_amt": "700000",
+     "pchs_avg_pric": "70000.0000", "prpr": "71000", "evlu_amt": "710000"},
+    {"pdno": "000660", "prdt_name": "SK하이닉스", "hldg_qty": "0", "pchs_amt": "0",
+     "pchs_avg_pric": "0", "prpr": "180000", "evlu_amt": "0"},
+]
+SUMMARY = {"prvs_rcdl_excc_amt": "1000000", "tot_evlu_amt": "1710000"}
+
+def seeded_ledger() -> PositionLedger:
+    ledger = PositionLedger(reconcile_interval=60)
+    ledger.seed(HOLDINGS, SUMMARY)
+    return ledger
+
+def test_seed_skips_empty_positions():
+    ledger = seeded_ledger()
+    assert [p["pdno"] for p in ledger._positions.values()] == ["005930"]
+    assert ledger.status()["stale"] is False
+    assert not ledger.is_expired()
+
+def test_buy_fill_updates_position_and_cash():
+    ledger = seeded_ledger()
+    ledger.apply_fill({"symbol": "005930", "side": "buy", "name": ""}, 10, 72000)
+    position = ledger._positions["005930"]
+    assert position["hldg_qty"] == "20"
+    assert position["pchs_amt"] == "1420000"
+    assert position["pchs_avg_pric"] == "71000.0"
+    assert ledger._summary["prvs_rcdl_excc_amt"] == "280000"
+    assert ledger.status()["pending_updates"] == 1
+
+def test_sell_fill_closes_position():
+    ledger = seeded_ledger()
+    ledger.apply_fill({"symbol": "005930", "side": "sell", "name": ""}, 10, 71000)
+    assert "005930" not in ledger._positions
+    assert ledger._summary["prvs_rcdl_excc_amt"] == "1710000"
+
+def test_unknown_sell_forces_reconcile():
+    ledger = seeded_ledger()
+    ledger.apply_fill({"symbol": "035420", "side": "sell", "name": ""}, 1, 200000)
+    assert ledger.is_expired()
+    assert ledger.status()["stale"] is True
+
+@pytest.mark.asyncio
+async def test_fill_notices_feed_ledger():
+    ledger = seeded_ledger()
+    table = OrderStateTable()
+    table.add_fill_listener(ledger.apply_fill)
+    await table.register("1", "035420", "buy", 2)
+    await table.apply_notice({"ODER_NO": "0000000001", "OODER_NO": "", "SELN_BYOV_CLS": "02",
+                              "RCTF_CLS": "0", "STCK_SHRN_ISCD": "035420", "CNTG_QTY": "2",
+                              "CNTG_UNPR": "200000", "RFUS_YN": "0", "CNTG_YN": "2",
+                              "ACPT_YN": "2", "ODER_QTY": "2", "CNTG_ISNM": "NAVER"})
+    assert ledger._positions["035420"]["hldg_qty"] == "2"
+    assert ledger._positions["035420"]["prdt_name"] == "NAVER"
+
+@pytest.mark.asyncio
+async def test_notice_gaps_force_reconcile():
+    ledger = seeded_ledger()
+    subscriber = ExecutionNoticeSubscriber(OrderStateTable(), url="ws://127.0.0.1:9", approval_key="key",
+                                           hts_id="testid", on_gap=ledger.mark_dirty)
+    await subscriber.handle_message(json.dumps({
+        "header": {"tr_id": subscriber.tr_id},
+        "body": {"rt_cd": "0", "output": {"iv": "i" * 16, "key": "k" * 32}},
+    }))
+    assert subscriber.subscribed.is_set()
+    assert ledger.is_expired()
+
+    # 재동기화 후 연결이 끊기면 다시 재동기화 필요
+    ledger.seed(HOLDINGS, SUMMARY)
+    assert not ledger.is_expired()
+    subscriber.start()
+    await asyncio.sleep(0.1)
+    await subscriber.stop()
+    assert ledger.is_expired()
+
+def fill_notice(quantity: str) -> dict:
+    return {"ODER_NO": "0000000007", "OODER_NO": "", "SELN_BYOV_CLS": "02", "RCTF_CLS": "0",
+            "STCK_SHRN_ISCD": "005930", "CNTG_QTY": quantity, "CNTG_UNPR": "70000", "RFUS_YN": "0",
+            "CNTG_YN": "2", "ACPT_YN": "2", "ODER_QTY": "10", "CNTG_ISNM": "삼성전자"}
+
+@pytest.mark.asyncio
+async def test_fills_included_in_reconcile_are_not_applied_twice():
+    ledger = PositionLedger(reconcile_interval=60)
+    # 재동기화 잔고에 주문 7의 체결 6주가 이미 반영됨
+    ledger.seed(HOLDINGS, SUMMARY, {"7": 6})
+    table = OrderStateTable()
+    table.add_fill_listener(ledger.apply_fill)
+    await table.register("7", "005930", "buy", 10)
+
+    await table.apply_notice(fill_notice("4"))
+    assert ledger._positions["005930"]["hldg_qty"] == "10"
+    await table.apply_notice(fill_notice("4"))
+    assert ledger._positions["005930"]["hldg_qty"] == "12"
+    assert ledger.status()["pending_updates"] == 1
+
+@pytest.mark.asyncio
+async def test_error_balance_response_is_not_seeded(monkeypatch):
+    bodies = [{"rt_cd": "1", "msg_cd": "EGW00201", "msg1": "초당 거래건수를 초과하였습니다."}]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=bodies[0])
+
+    for name in ("KIS_APP_KEY", "KIS_APP_SECRET", "KIS_CANO"):
+        monkeypatch.setenv(name, "test")
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        with pytest.raises(Exception, match="초당 거래건수"):
+            await PositionLedger().read(client, "token")
+
+        ledger = seeded_ledger()
+        holdings, _ = await ledger.read(client, "token", refresh=True)
+        assert [h["pdno"] for h in holdings] == ["005930"]
+        assert ledger.status()["stale"] is True
+        assert "초당 거래건수" in ledger.status()["reconcile_error"]
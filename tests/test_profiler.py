@@ -0,0 +1,78 @@
+# tests/test_profiler.py
+import asyncio
+import time
+
+import pytest
+
+from kis_mcp_server_adk.server import ServerProfiler
+
+def busy_json_encode():
+    deadline = time.perf_counter() + 0.15
+    while time.perf_counter() < deadline:
+        pass
+
+@pytest.mark.asyncio
+async def test_sample_profile_reports_blocking_callbacks():
+    profiler = ServerProfiler()
+
+    async def blocker():
+        await asyncio.sleep(0.05)
+        busy_json_encode()
+
+    task = asyncio.create_task(blocker())
+    result = await profiler.run(0.4, "sample", interval=0.005, slow_callback_threshold=0.1)
+    await task
+
+    assert result["samples"] > 0
+    assert "busy_json_encode" in result["folded"]
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in result["folded"].splitlines())
+    assert result["loop_lag"]["max"] >= 0.1
+    assert result["slow_callbacks"] and result["slow_callbacks"][0]["seconds"] >= 0.1
+    assert not asyncio.get_running_loop().get_debug()
+
+@pytest.mark.asyncio
+async def test_task_profile_shows_await_chains():
+    profiler = ServerProfiler()
+
+    async def wait_for_upstream():
+        await asyncio.sleep(1)
+
+    async def handle_request():
+        await wait_for_upstream()
+
+    task = asyncio.create_task(handle_request(), name="request-1")
+    result = await profiler.run(0.1, "tasks", interval=0.01)
+    task.cancel()
+
+    assert any(line.startswith("task:request-1;") and "wait_for_upstream" in line
+               for line in result["folded"].splitlines())
+    with pytest.raises(ValueError):
+        await profiler.run(0.1, "trace")
+
+@pytest.mark.asyncio
+async def test_profile_endpoint_authenticates_from_header(monkeypatch):
+    import httpx
+    from starlette.applications import Starlette
+    from starlette.routing import Route
+
+    from kis_mcp_server_adk import server as server_module
+
+    monkeypatch.setattr(server_module, "ADMIN_TOKEN", "secret")
+    app = Starlette(routes=[Route("/admin/profile", server_module.profile_server)])
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        assert (await client.get("/admin/profile")).status_code == 401
+        denied = await client.get("/admin/profile", headers={"Authorization": "Bearer wrong"})
+        assert denied.status_code == 401
+
+        headers = {"Authorization": "Bearer secret"}
+        response = await client.get("/admin/profile", params={"seconds": "0.05", "mode": "tasks"}, headers=headers)
+        assert response.status_code == 200
+        assert "loop_lag" in response.json()
+
+        for params in ({"mode": "trace"}, {"interval": "0"}, {"seconds": "-1"}, {"seconds": "nan"},
+                       {"slow_callback_threshold": "inf"}, {"interval": "fast"}):
+            invalid = await client.get("/admin/profile", params=params, headers=headers)
+            assert invalid.status_code == 400, params
+
+        monkeypatch.setattr(server_module, "ADMIN_TOKEN", "")
+        assert (await client.get("/admin/profile", headers=headers)).status_code == 404
@@ -0,0 +1,81 @@
+# tests/test_record_replay.py
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+from kis_mcp_server_adk.server import RecordReplayTransport, ReplayMiss, TransportArchive
+
+def upstream():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(200, headers={"tr_cont": "D"},
+                              json={"rt_cd": "0", "output": {"stck_prpr": str(70000 + len(calls))}})
+    return calls, httpx.MockTransport(handler)
+
+def quote(client: httpx.AsyncClient, symbol: str = "005930", appkey: str = "key"):
+    return client.get(
+        "https://openapi.koreainvestment.com:9443/uapi/domestic-stock/v1/quotations/inquire-price",
+        headers={"tr_id": "FHKST01010100", "appkey": appkey, "authorization": "Bearer secret"},
+        params={"fid_input_iscd": symbol, "fid_cond_mrkt_div_code": "J"},
+    )
+
+@pytest.mark.asyncio
+async def test_replay_serves_recorded_responses_in_order(tmp_path):
+    calls, transport = upstream()
+    recorder = RecordReplayTransport(TransportArchive(tmp_path), "record", transport=transport)
+    async with httpx.AsyncClient(transport=recorder) as client:
+        await quote(client)
+        await quote(client)
+        await client.post("https://openapi.koreainvestment.com:9443/oauth2/tokenP",
+                          json={"grant_type": "client_credentials", "appkey": "key", "appsecret": "secret"})
+    assert len(calls) == 3
+
+    archive = TransportArchive(tmp_path)
+    assert len(archive) == 3
+    replayer = RecordReplayTransport(archive, "replay", "fast")
+    async with httpx.AsyncClient(transport=replayer) as client:
+        prices = [(await quote(client, appkey="other")).json()["output"]["stck_prpr"] for _ in range(3)]
+        token = await client.post("https://openapi.koreainvestment.com:9443/oauth2/tokenP",
+                                  json={"grant_type": "client_credentials", "appkey": "k2", "appsecret": "s2"})
+        assert token.status_code == 200
+        assert (await quote(client)).headers["tr_cont"] == "D"
+        with pytest.raises(ReplayMiss):
+            await quote(client, "000660")
+    # 동일 요청은 기록 순서대로 재생하고, 소진되면 마지막 응답을 재사용
+    assert prices == ["70001", "70002", "70002"]
+    assert len(calls) == 3
+    assert b"secret" not in (tmp_path / "index.jsonl").read_bytes()
+
+@pytest.mark.asyncio
+async def test_replay_original_timing(tmp_path):
+    archive = TransportArchive(tmp_path)
+    request = httpx.Request("GET", "https://example.com/uapi/test", headers={"tr_id": "T"})
+    archive.record(request, httpx.Response(200, content=b"{}"), 0.2)
+
+    async with httpx.AsyncClient(transport=RecordReplayTransport(archive, "replay", "original")) as client:
+        started = time.monotonic()
+        await client.get("https://example.com/uapi/test", headers={"tr_id": "T"})
+        assert time.monotonic() - started >= 0.2
+
+@pytest.mark.asyncio
+async def test_replay_original_timing_keeps_request_spacing(tmp_path):
+    archive = TransportArchive(tmp_path)
+    for path in ("/uapi/first", "/uapi/second"):
+        archive.record(httpx.Request("GET", f"https://example.com{path}"), httpx.Response(200, content=b"{}"), 0.0)
+        await asyncio.sleep(0.3)
+    # 이어서 기록해도 요청 시각은 앞선 기록 이후로 이어짐
+    resumed = TransportArchive(tmp_path)
+    resumed.record(httpx.Request("GET", "https://example.com/uapi/third"), httpx.Response(200, content=b"{}"), 0.0)
+    ats = [json.loads(line)["at"] for line in (tmp_path / "index.jsonl").read_text().splitlines()]
+    assert ats == sorted(ats) and ats[1] - ats[0] >= 0.3
+
+    async with httpx.AsyncClient(transport=RecordReplayTransport(TransportArchive(tmp_path), "replay")) as client:
+        await client.get("https://example.com/uapi/first")
+        started = time.monotonic()
+        await client.get("https://example.com/uapi/second")
+        assert time.monotonic() - started >= 0.25
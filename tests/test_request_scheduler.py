@@ -0,0 +1,87 @@
+# tests/test_request_scheduler.py
+import asyncio
+
+import httpx
+import pytest
+
+from kis_mcp_server_adk.server import (
+    ORDER_PATH,
+    STOCK_HISTORY_PATH,
+    STOCK_PRICE_PATH,
+    RequestScheduler,
+    SchedulerDeadlineExceeded,
+    ScheduledTransport,
+)
+
+def make_scheduler(max_concurrency=1):
+    return RequestScheduler(
+        max_concurrency=max_concurrency,
+        class_limits={"order": max_concurrency, "account": max_concurrency,
+                      "quote": max_concurrency, "bulk": max_concurrency},
+        requests_per_second=0,
+        reserved_order_slots=0,
+    )
+
+async def run_in_order(scheduler, requests):
+    """슬롯 하나를 점유한 상태에서 요청을 쌓은 뒤 처리 순서를 기록"""
+    order = []
+    await scheduler.acquire("bulk")
+
+    async def worker(label, priority_class, session):
+        await scheduler.acquire(priority_class, session=session)
+        order.append(label)
+        scheduler.release(priority_class)
+
+    tasks = [asyncio.create_task(worker(*request)) for request in requests]
+    await asyncio.sleep(0)
+    scheduler.release("bulk")
+    await asyncio.gather(*tasks)
+    return order
+
+@pytest.mark.asyncio
+async def test_orders_dispatch_before_quotes_and_bulk():
+    order = await run_in_order(make_scheduler(), [
+        ("bulk", "bulk", None),
+        ("quote", "quote", None),
+        ("order", "order", None),
+        ("account", "account", None),
+    ])
+    assert order == ["order", "account", "quote", "bulk"]
+
+@pytest.mark.asyncio
+async def test_sessions_are_served_round_robin():
+    order = await run_in_order(make_scheduler(), [
+        ("a1", "quote", "a"), ("a2", "quote", "a"), ("a3", "quote", "a"),
+        ("b1", "quote", "b"),
+    ])
+    assert order == ["a1", "b1", "a2", "a3"]
+
+@pytest.mark.asyncio
+async def test_stale_quote_is_dropped():
+    scheduler = make_scheduler()
+    await scheduler.acquire("order")
+    loop = asyncio.get_running_loop()
+    waiter = asyncio.create_task(scheduler.acquire("quote", deadline=loop.time() + 0.01))
+    await asyncio.sleep(0.05)
+    scheduler.release("order")
+    with pytest.raises(SchedulerDeadlineExceeded):
+        await waiter
+    assert scheduler.stats()["quote"]["dropped"] == 1
+
+@pytest.mark.asyncio
+async def test_transport_classifies_by_path():
+    seen = []
+    scheduler = make_scheduler(max_concurrency=4)
+    original_acquire = scheduler.acquire
+
+    async def recording_acquire(priority_class, deadline=None, session=None):
+        seen.append(priority_class)
+        await original_acquire(priority_class, deadline, session)
+
+    scheduler.acquire = recording_acquire
+    transport = ScheduledTransport(scheduler, httpx.MockTransport(lambda request: httpx.Response(200, json={})))
+    async with httpx.AsyncClient(transport=transport, base_url="https://kis.test") as client:
+        for path in (ORDER_PATH, STOCK_PRICE_PATH, STOCK_HISTORY_PATH):
+            await client.get(path)
+    assert seen == ["order", "quote", "bulk"]
+    assert scheduler.running == 0
@@ -0,0 +1,95 @@
+# tests/test_screener.py
+import json
+
+import httpx
+import pytest
+
+from kis_mcp_server_adk import server
+from kis_mcp_server_adk.server import MemoryCacheBackend, SharedCache, load_universe, parse_screen_filters
+
+def test_parse_screen_filters():
+    assert parse_screen_filters(["prdy_ctrt > 3", "ACML_VOL >= 1000000"]) == [
+        ("prdy_ctrt", ">", 3.0),
+        ("acml_vol", ">=", 1000000.0),
+    ]
+
+@pytest.mark.parametrize("expression", ["prdy_ctrt >", "__import__('os') > 1", "prdy_ctrt => 3"])
+def test_invalid_filters_are_rejected(expression):
+    with pytest.raises(ValueError):
+        parse_screen_filters([expression])
+
+def test_load_named_universe(tmp_path, monkeypatch):
+    universe_file = tmp_path / "universes.json"
+    universe_file.write_text(json.dumps({"kospi200": ["005930", "000660"]}))
+    monkeypatch.setenv("KIS_UNIVERSE_FILE", str(universe_file))
+    assert load_universe("KOSPI200") == ["005930", "000660"]
+    with pytest.raises(ValueError, match="KOSPI200"):
+        load_universe("KOSDAQ150")
+
+class RecordingContext:
+    """Collects the log and progress notifications a scan streams to the client"""
+
+    def __init__(self):
+        self.logs = []
+        self.progress = []
+
+    async def log(self, level, message, logger_name=None):
+        self.logs.append((logger_name, json.loads(message)))
+
+    async def report_progress(self, progress, total=None):
+        self.progress.append((progress, total))
+
+QUOTES = {
+    "000001": {"stck_prpr": "1000", "prdy_ctrt": "5.2", "acml_vol": "300"},
+    "000002": {"stck_prpr": "2000", "prdy_ctrt": "1.0", "acml_vol": "100"},
+    "000003": {"stck_prpr": "3000", "prdy_ctrt": "", "acml_vol": "200"},
+    "000004": {"stck_prpr": "4000", "prdy_ctrt": "4.0", "acml_vol": "400"},
+    "000005": {"stck_prpr": "5000", "prdy_ctrt": "7.5", "acml_vol": "500"},
+}
+
+@pytest.fixture
+def quote_stub(monkeypatch):
+    """Serve QUOTES through a mock KIS transport and record requested symbols"""
+    requested = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        symbol = request.url.params["fid_input_iscd"]
+        requested.append(symbol)
+        return httpx.Response(200, json={"rt_cd": "0", "output": QUOTES[symbol]})
+
+    async def get_access_token(client):
+        return "token"
+
+    monkeypatch.setenv("KIS_APP_KEY", "key")
+    monkeypatch.setenv("KIS_APP_SECRET", "secret")
+    monkeypatch.setattr(server, "SCREEN_CONCURRENCY", 1)
+    monkeypatch.setattr(server, "shared_cache", SharedCache(MemoryCacheBackend()))
+    monkeypatch.setattr(server, "get_access_token", get_access_token)
+    monkeypatch.setattr(server, "kis_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return requested
+
+@pytest.mark.asyncio
+async def test_scan_streams_matches_and_skips_missing_fields(quote_stub):
+    ctx = RecordingContext()
+    result = await server.screen_stocks(["prdy_ctrt > 3", "hts_avls > 0"], ctx, symbols=["000001"])
+    assert result["matches"] == []
+
+    result = await server.screen_stocks(["prdy_ctrt > 3"], ctx, symbols=list(QUOTES))
+    assert [match["symbol"] for match in result["matches"]] == ["000001", "000004", "000005"]
+    assert result["matches"][0]["prdy_ctrt"] == 5.2
+    assert [message["symbol"] for _, message in ctx.logs] == ["000001", "000004", "000005"]
+    assert {logger for logger, _ in ctx.logs} == {"screen-stocks"}
+    assert ctx.progress[-1] == (5, 5)
+    assert result["scanned"] == 5 and result["stopped_early"] is False
+
+@pytest.mark.asyncio
+async def test_scan_reuses_cached_quotes_and_stops_at_max_results(quote_stub):
+    result = await server.screen_stocks(["prdy_ctrt > 3"], RecordingContext(), symbols=list(QUOTES), max_results=1)
+    assert [match["symbol"] for match in result["matches"]] == ["000001"]
+    assert result["stopped_early"] is True
+    assert result["scanned"] == 1
+    assert quote_stub == ["000001"]
+
+    result = await server.screen_stocks(["prdy_ctrt > 3"], RecordingContext(), symbols=list(QUOTES), max_results=2)
+    assert [match["symbol"] for match in result["matches"]] == ["000001", "000004"]
+    assert quote_stub == ["000001", "000002", "000003", "000004"]
@@ -0,0 +1,186 @@
+# tests/test_shared_cache.py
+import asyncio
+import sqlite3
+
+import httpx
+import pytest
+
+from kis_mcp_server_adk import server
+from kis_mcp_server_adk.server import MemoryCacheBackend, SharedCache, SQLiteCacheBackend
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryCacheBackend(max_entries=2)
+    backend.set("quote", "a", 1, ttl=60)
+    backend.set("quote", "b", 2, ttl=60)
+    backend.get("quote", "a")
+    backend.set("quote", "c", 3, ttl=60)
+    assert backend.get("quote", "b") is None
+    assert backend.get("quote", "a")[0] == 1
+
+def test_expired_entries_are_not_served():
+    cache = SharedCache(MemoryCacheBackend())
+    cache.set("quote", "005930", {"stck_prpr": "71000"}, ttl=-1)
+    assert cache.get("quote", "005930", max_age=60) is None
+
+@pytest.mark.asyncio
+async def test_concurrent_fetches_are_coalesced():
+    cache = SharedCache(MemoryCacheBackend())
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"stck_prpr": "71000"}
+
+    results = await asyncio.gather(*(cache.get_or_fetch("quote", "005930", 1.0, fetch) for _ in range(5)))
+    assert calls == 1
+    assert all(result == {"stck_prpr": "71000"} for result in results)
+    stats = cache.stats()["process"]["quote"]
+    assert stats["coalesced"] == 4
+
+@pytest.mark.asyncio
+async def test_sqlite_backend_shares_values_and_locks_across_processes(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    worker_a = SharedCache(SQLiteCacheBackend(path))
+    worker_b = SharedCache(SQLiteCacheBackend(path))
+
+    # A가 조회 잠금을 잡고 있는 동안 B는 업스트림을 호출하지 않고 A의 결과를 기다림
+    assert worker_a.backend.acquire_lock("quote", "005930", ttl=5)
+
+    async def fetch_b():
+        raise AssertionError("worker B must not call upstream")
+
+    waiter = asyncio.create_task(worker_b.get_or_fetch("quote", "005930", 1.0, fetch_b))
+    await asyncio.sleep(0.1)
+    worker_a.set("quote", "005930", {"stck_prpr": "71000"}, ttl=60)
+    worker_a.backend.release_lock("quote", "005930")
+    assert await waiter == {"stck_prpr": "71000"}
+
+    stats = worker_b.stats()
+    assert stats["backend"] == "SQLiteCacheBackend"
+    assert stats["all_processes"]["quote"]["coalesced"] == 1
+
+@pytest.mark.asyncio
+async def test_stale_values_are_served_while_revalidating():
+    cache = SharedCache(MemoryCacheBackend())
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"version": calls}
+
+    value, age, status = await cache.get_or_revalidate("stock_history", "005930", 0.05, 10, fetch)
+    assert (value, status) == ({"version": 1}, "fetched")
+    value, age, status = await cache.get_or_revalidate("stock_history", "005930", 0.05, 10, fetch)
+    assert (value, status) == ({"version": 1}, "fresh")
+
+    await asyncio.sleep(0.06)
+    results = [await cache.get_or_revalidate("stock_history", "005930", 0.05, 10, fetch) for _ in range(3)]
+    assert all(value == {"version": 1} and status == "stale" and age > 0.05 for value, age, status in results)
+    await asyncio.sleep(0.02)
+    assert calls == 2
+    assert (await cache.get_or_revalidate("stock_history", "005930", 0.05, 10, fetch))[0] == {"version": 2}
+    assert cache.stats()["process"]["stock_history"]["revalidated"] == 1
+
+@pytest.mark.asyncio
+async def test_callers_wait_after_hard_ttl():
+    cache = SharedCache(MemoryCacheBackend())
+    cache.backend._entries[("stock_info", "005930")] = ({"version": 1}, 0.0, float("inf"))
+
+    async def fetch():
+        return {"version": 2}
+
+    value, age, status = await cache.get_or_revalidate("stock_info", "005930", 1, 5, fetch)
+    assert (value, age, status) == ({"version": 2}, 0.0, "fetched")
+
+class LockedBackend(MemoryCacheBackend):
+    """Backend whose lock table is held by another process (or is locked by sqlite)"""
+
+    shared = True
+
+    def __init__(self, error: Exception | None = None):
+        super().__init__()
+        self.error = error
+        self.released = []
+
+    def acquire_lock(self, namespace, key, ttl):
+        if self.error is not None:
+            raise self.error
+        return False
+
+    def release_lock(self, namespace, key):
+        self.released.append((namespace, key))
+
+    def publish_stats(self, stats):
+        raise sqlite3.OperationalError("database is locked")
+
+@pytest.mark.asyncio
+async def test_backend_errors_do_not_escape_into_fetches():
+    backend = LockedBackend(sqlite3.OperationalError("database is locked"))
+    cache = SharedCache(backend)
+
+    async def fetch():
+        return {"stck_prpr": "71000"}
+
+    assert await cache.get_or_fetch("quote", "005930", 1.0, fetch) == {"stck_prpr": "71000"}
+    assert backend.released == []
+    assert "all_processes" in cache.stats()
+
+@pytest.mark.asyncio
+async def test_lock_of_another_process_is_not_released(monkeypatch):
+    monkeypatch.setattr(server, "CACHE_LOCK_TIMEOUT", 0.1)
+    backend = LockedBackend()
+    cache = SharedCache(backend)
+
+    async def fetch():
+        return {"stck_prpr": "71000"}
+
+    assert await cache.get_or_fetch("quote", "005930", 1.0, fetch) == {"stck_prpr": "71000"}
+    assert backend.released == []
+
+class TokenTransport(httpx.AsyncBaseTransport):
+    """Token endpoint whose in-flight responses fail once the owning client is closed"""
+
+    def __init__(self, issued: list):
+        self.issued = issued
+        self.closed = False
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.issued.append(request)
+        await asyncio.sleep(0.05)
+        if self.closed:
+            raise httpx.ConnectError("client closed", request=request)
+        return httpx.Response(200, json={"access_token": "fresh-token"})
+
+    async def aclose(self):
+        self.closed = True
+
+@pytest.mark.asyncio
+async def test_coalesced_token_issuance_outlives_first_caller(tmp_path, monkeypatch):
+    issued = []
+
+    def client():
+        return httpx.AsyncClient(transport=TokenTransport(issued))
+
+    monkeypatch.setenv("KIS_APP_KEY", "key")
+    monkeypatch.setenv("KIS_APP_SECRET", "secret")
+    monkeypatch.setattr(server, "TOKEN_FILE", tmp_path / "token.json")
+    monkeypatch.setattr(server, "shared_cache", SharedCache(MemoryCacheBackend()))
+    monkeypatch.setattr(server, "kis_client", client)
+
+    async def first_caller():
+        async with client() as own:
+            await server.get_access_token(own)
+
+    first = asyncio.create_task(first_caller())
+    await asyncio.sleep(0.01)
+    async with client() as own:
+        second = asyncio.create_task(server.get_access_token(own))
+        await asyncio.sleep(0.01)
+        # 발급을 시작한 호출자의 클라이언트가 먼저 닫혀도 대기 중인 호출자는 토큰을 받음
+        first.cancel()
+        assert await second == "fresh-token"
+    assert len(issued) == 1